@@ -0,0 +1,311 @@
+import os
+import sys
+import atexit
+import signal
+from datetime import timedelta
+
+from flask import Flask, send_from_directory, jsonify
+from flask_jwt_extended import JWTManager
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import text
+
+# Import models first
+from src.models.user import db, User
+from src.models.camera import Camera
+
+# Import routes
+from src.routes.user import user_bp
+from src.routes.auth import auth_bp
+from src.routes.camera import camera_bp
+from src.routes.viam_routes import viam_bp
+from src.routes.recording_routes import recording_bp
+from src.routes.config_routes import config_bp
+from src.routes.event_routes import event_bp
+
+# Import background services (cheap, heavy dependencies are imported when first used)
+from src.services.config_service import get_config_service
+from src.services.event_bus import get_event_bus
+from src.services.session_janitor import get_session_janitor
+from src.services.stats_service import get_stats_service
+from src.services.storage_service import get_storage_accountant, get_storage_manager
+from src.services.retention_service import get_retention_cleaner
+from src.services.segment_journal import get_segment_recovery
+from src.services.tiering_service import get_tiering_service
+from src.services.recording_service import get_recording_service
+from src.services.recording_scheduler import get_recording_scheduler
+from src.services.recording_governor import get_recording_governor
+
+jwt = JWTManager()
+
+
+def env_flag(name, default='true'):
+    return os.environ.get(name, default).lower() == 'true'
+
+
+# Database configuration
+def get_database_uri():
+    """Get database URI from environment, defaulting to the local SQLite file"""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        database_path = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+        return f"sqlite:///{database_path}"
+
+    # SQLAlchemy 2 no longer accepts the legacy postgres:// scheme
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+
+def get_engine_options(database_uri):
+    """Get connection pool options for the configured database"""
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    }
+
+    # SQLite is a single local file, pool sizing only applies to server databases
+    if not database_uri.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30))
+        })
+
+    return options
+
+
+def create_app(config=None):
+    """Create the Flask app, initialize the database and start the background services"""
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'sg-security-ai-secret-key-2025')
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'sg-security-jwt-key-2025')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+    # Embed assigned camera IDs in access tokens so camera endpoints authorize without DB queries
+    app.config['JWT_EMBED_CAMERA_ACL'] = env_flag('JWT_EMBED_CAMERA_ACL', 'false')
+    # Let a fronting web server send recording files (X-Sendfile) instead of the Python worker
+    app.config['USE_X_SENDFILE'] = env_flag('USE_X_SENDFILE', 'false')
+    # Tests and CLI tools can skip the recorders and maintenance threads
+    app.config['START_BACKGROUND_SERVICES'] = env_flag('BACKGROUND_SERVICES_ENABLED')
+
+    # Number of reverse proxies in front of the app whose X-Forwarded-* headers are trusted
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+    if config:
+        app.config.update(config)
+
+    # Behind nginx or a load balancer, take the client address from the proxies' headers
+    if app.config['TRUSTED_PROXY_COUNT']:
+        count = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count, x_host=count)
+
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', get_database_uri())
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', get_engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Initialize extensions
+    db.init_app(app)
+    jwt.init_app(app)
+    CORS(app, origins="*")  # Allow all origins for development
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(camera_bp, url_prefix='/api')
+    app.register_blueprint(viam_bp, url_prefix='/api')
+    app.register_blueprint(recording_bp, url_prefix='/api')
+    app.register_blueprint(config_bp, url_prefix='/api')
+    app.register_blueprint(event_bp, url_prefix='/api')
+    register_core_routes(app)
+
+    # Services read their configuration from the database, so it must exist first
+    init_database(app)
+    get_config_service().init_app(app)
+    get_recording_service().init_app(app)
+
+    # Pick up configuration changes made by other workers or directly in the database, even in
+    # workers that run no background services, so every worker serves the same settings
+    get_config_service().start(app)
+
+    # Every worker streams the push events published by all of them
+    get_event_bus().start(app)
+
+    if app.config['START_BACKGROUND_SERVICES']:
+        start_background_services(app)
+
+    return app
+
+
+def start_background_services(app):
+    """Start the maintenance and recording threads for an app"""
+    recording_service = get_recording_service()
+
+    # Start background maintenance of session tables
+    if env_flag('SESSION_JANITOR_ENABLED'):
+        get_session_janitor().start(app)
+
+    # Repair segments cut off by a crash and close their recordings
+    get_segment_recovery().start(app, recording_service.base_recording_path, recording_service.owner)
+
+    # Keep storage counters in sync with the recordings directory
+    get_storage_accountant().start(app, recording_service.base_recording_path)
+
+    # Enforce retention and storage quotas continuously instead of on demand
+    if env_flag('STORAGE_MANAGER_ENABLED'):
+        get_storage_manager().start(app)
+
+    # Delete expired recordings in batches, resuming an interrupted run
+    if env_flag('RETENTION_CLEANUP_ENABLED'):
+        get_retention_cleaner().start(app, recording_service)
+
+    # Move cold segments to the archive path, if one is configured
+    get_tiering_service().start(app)
+
+    # Resume recordings that were running when the previous process stopped, and hand ours over on shutdown
+    recording_service.start(app)
+    atexit.register(recording_service.release_recordings)
+
+    if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        try:
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            pass  # Not created from the main thread
+
+    # Record enabled cameras from startup, following their schedules and restarting dead recorders
+    if env_flag('RECORDING_SCHEDULER_ENABLED'):
+        get_recording_scheduler().start(app, recording_service)
+
+    # Lower recording fps and resolution under CPU, encoder or disk pressure, restoring it afterwards
+    if env_flag('RECORDING_GOVERNOR_ENABLED'):
+        get_recording_governor().start(app, recording_service)
+
+
+def handle_sigterm(signum, frame):
+    sys.exit(0)  # Runs the atexit handlers, which finish the current segments
+
+
+# JWT error handlers
+@jwt.expired_token_loader
+def expired_token_callback(jwt_header, jwt_payload):
+    return jsonify({'error': 'Token has expired'}), 401
+
+@jwt.invalid_token_loader
+def invalid_token_callback(error):
+    return jsonify({'error': 'Invalid token'}), 401
+
+@jwt.unauthorized_loader
+def missing_token_callback(error):
+    return jsonify({'error': 'Authorization token is required'}), 401
+
+def init_database(app):
+    """Initialize database with default data"""
+    with app.app_context():
+        # Create all tables
+        db.create_all()
+        
+        # Create default super admin user if not exists
+        super_admin = User.query.filter_by(role='super_admin').first()
+        if not super_admin:
+            admin_user = User(
+                username='admin',
+                email='admin@sg-security.local',
+                role='super_admin'
+            )
+            admin_user.set_password('admin123')  # Change this in production!
+            db.session.add(admin_user)
+            
+            print("Created default super admin user:")
+            print("Username: admin")
+            print("Password: admin123")
+            print("Please change the password after first login!")
+        
+        # Create default cameras if not exist
+        cameras_config = [
+            {
+                'id': 'camera-1',
+                'name': 'Camera Principale',
+                'location': 'Ingresso',
+                'resolution': '1920x1080',
+                'fps': 30,
+                'recording_enabled': True,
+                'ai_analysis_enabled': True
+            },
+            {
+                'id': 'camera-2',
+                'name': 'Camera Secondaria',
+                'location': 'Corridoio',
+                'resolution': '1280x720',
+                'fps': 25,
+                'recording_enabled': True,
+                'ai_analysis_enabled': False
+            }
+        ]
+        
+        for camera_config in cameras_config:
+            existing_camera = Camera.query.get(camera_config['id'])
+            if not existing_camera:
+                camera = Camera(**camera_config)
+                db.session.add(camera)
+        
+        db.session.commit()
+
+        # Create default system configuration
+        get_config_service().ensure_defaults()
+
+
+def register_core_routes(app):
+    """Register the info, health check and frontend routes"""
+
+    # API info endpoint
+    @app.route('/api/info', methods=['GET'])
+    def api_info():
+        """Get API information"""
+        return jsonify({
+            'name': 'SG Security AI System',
+            'version': '1.0.0',
+            'description': 'AI-powered video surveillance system with VIAM integration',
+            'endpoints': {
+                'auth': '/api/auth/*',
+                'users': '/api/users/*',
+                'cameras': '/api/cameras/*'
+            }
+        })
+
+    # Health check endpoint
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        """Health check endpoint"""
+        try:
+            # Check database connection
+            db.session.execute(text('SELECT 1'))
+
+            return jsonify({
+                'status': 'healthy',
+                'database': 'connected',
+                'stats': get_stats_service().get_health_stats()
+            })
+        except Exception as e:
+            return jsonify({
+                'status': 'unhealthy',
+                'error': str(e)
+            }), 500
+
+    # Serve frontend files
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
+        else:
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "Frontend not found. Please build the frontend first.", 404
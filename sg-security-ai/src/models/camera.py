@@ -1,9 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import json
 
 # Use the same db instance from user.py
-from src.models.user import db
+from src.models.user import db, BigInt, JSONType
 
 class Camera(db.Model):
     id = db.Column(db.String(50), primary_key=True)  # camera-1, camera-2, etc.
@@ -14,7 +13,11 @@ class Camera(db.Model):
     recording_enabled = db.Column(db.Boolean, default=True)
     ai_analysis_enabled = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
-    viam_config = db.Column(db.Text)  # JSON configuration for VIAM
+    storage_quota_gb = db.Column(db.Float)  # Per-camera recording quota, None for no limit
+    recording_schedule = db.Column(JSONType)  # Weekly recording plan, None to record around the clock
+    recording_priority = db.Column(db.Integer, nullable=False, default=0)  # Higher keeps full quality longer under load
+    viam_config = db.Column(JSONType)  # Configuration for VIAM
+    row_version = db.Column(BigInt, nullable=False, default=0, index=True)  # Cameras collection version of the last change
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime)
 
@@ -23,13 +26,11 @@ class Camera(db.Model):
 
     def get_viam_config(self):
         """Get VIAM configuration as dictionary"""
-        if self.viam_config:
-            return json.loads(self.viam_config)
-        return {}
+        return self.viam_config or {}
 
     def set_viam_config(self, config_dict):
         """Set VIAM configuration from dictionary"""
-        self.viam_config = json.dumps(config_dict)
+        self.viam_config = config_dict
 
     def update_last_seen(self):
         """Update last seen timestamp"""
@@ -45,6 +46,9 @@ class Camera(db.Model):
             'recording_enabled': self.recording_enabled,
             'ai_analysis_enabled': self.ai_analysis_enabled,
             'is_active': self.is_active,
+            'storage_quota_gb': self.storage_quota_gb,
+            'recording_schedule': self.recording_schedule,
+            'recording_priority': self.recording_priority,
             'viam_config': self.get_viam_config(),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_seen': self.last_seen.isoformat() if self.last_seen else None
@@ -54,7 +58,7 @@ class Camera(db.Model):
 class SystemConfig(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(100), unique=True, nullable=False)
-    value = db.Column(db.Text)
+    value = db.Column(JSONType)
     description = db.Column(db.Text)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_by = db.Column(db.Integer)  # Remove foreign key for now
@@ -63,18 +67,12 @@ class SystemConfig(db.Model):
         return f'<SystemConfig {self.key}>'
 
     def get_value(self):
-        """Get value as appropriate type"""
-        try:
-            return json.loads(self.value)
-        except (json.JSONDecodeError, TypeError):
-            return self.value
+        """Get value as stored type"""
+        return self.value
 
     def set_value(self, value):
-        """Set value (converts to JSON if needed)"""
-        if isinstance(value, (dict, list)):
-            self.value = json.dumps(value)
-        else:
-            self.value = str(value)
+        """Set value (any JSON serialisable type)"""
+        self.value = value
 
     def to_dict(self):
         return {
@@ -82,18 +80,23 @@ class SystemConfig(db.Model):
             'key': self.key,
             'value': self.get_value(),
             'description': self.description,
-            'updated_at': self.updated_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'updated_by': self.updated_by
         }
 
 
 class StreamSession(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        db.Index('ix_stream_session_active_camera', 'is_active', 'camera_id'),
+    )
+
+    id = db.Column(BigInt, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)  # Remove foreign key for now
     camera_id = db.Column(db.String(50), nullable=False)  # Remove foreign key for now
     session_id = db.Column(db.String(255), unique=True, nullable=False)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
-    ended_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime, index=True)
+    last_activity_at = db.Column(db.DateTime)  # Heartbeat from long-running streams
     is_active = db.Column(db.Boolean, default=True)
 
     def __repr__(self):
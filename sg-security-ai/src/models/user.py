@@ -1,41 +1,69 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
-import bcrypt
-import json
+
+from src.services.password_service import get_password_service
 
 db = SQLAlchemy()
 
+# SQLite only autoincrements INTEGER primary keys, server databases get BIGINT
+BigInt = db.BigInteger().with_variant(db.Integer(), 'sqlite')
+
+# Native JSON column, stored as JSONB on PostgreSQL
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.Enum('super_admin', 'admin', 'user', name='user_roles'), nullable=False, default='user')
+    role = db.Column(db.Enum('super_admin', 'admin', 'user', name='user_roles', native_enum=False, create_constraint=True),
+                     nullable=False, default='user')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
-    assigned_cameras = db.Column(db.Text)  # JSON array of camera IDs
+    acl_version = db.Column(db.Integer, nullable=False, default=1)  # Bumped when role, status or cameras change
+    row_version = db.Column(BigInt, nullable=False, default=0, index=True)  # Users collection version of the last change
+
+    camera_assignments = db.relationship('UserCamera', lazy='selectin', cascade='all, delete-orphan',
+                                         backref='user')
 
     def __repr__(self):
         return f'<User {self.username}>'
 
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = get_password_service().hash_password(password)
 
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return get_password_service().verify_password(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        """Check if the stored hash uses a different bcrypt cost than configured"""
+        return get_password_service().needs_rehash(self.password_hash)
 
     def get_assigned_cameras(self):
         """Get list of assigned camera IDs"""
-        if self.assigned_cameras:
-            return json.loads(self.assigned_cameras)
-        return []
+        return [assignment.camera_id for assignment in self.camera_assignments]
 
     def set_assigned_cameras(self, camera_ids):
         """Set assigned camera IDs"""
-        self.assigned_cameras = json.dumps(camera_ids)
+        camera_ids = set(camera_ids or [])
+        
+        # Keep existing rows so unchanged assignments are not deleted and re-inserted
+        for assignment in list(self.camera_assignments):
+            if assignment.camera_id not in camera_ids:
+                self.camera_assignments.remove(assignment)
+            else:
+                camera_ids.discard(assignment.camera_id)
+        
+        for camera_id in sorted(camera_ids):
+            self.camera_assignments.append(UserCamera(camera_id=camera_id))
+
+    def bump_acl_version(self):
+        """Invalidate access tokens carrying an older camera ACL"""
+        self.acl_version = (self.acl_version or 0) + 1
 
     def has_camera_access(self, camera_id):
         """Check if user has access to specific camera"""
@@ -74,11 +102,21 @@ class User(db.Model):
         return data
 
 
+class UserCamera(db.Model):
+    """Camera assigned to a regular user"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    camera_id = db.Column(db.String(50), db.ForeignKey('camera.id', ondelete='CASCADE'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserCamera {self.user_id}:{self.camera_id}>'
+
+
 class UserSession(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(BigInt, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     session_token = db.Column(db.String(255), unique=True, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('sessions', lazy=True))
@@ -101,46 +139,169 @@ class UserSession(db.Model):
 
 
 class Recording(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(BigInt, primary_key=True)
     camera_id = db.Column(db.String(50), nullable=False)
-    filename = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(500), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
-    end_time = db.Column(db.DateTime, nullable=False)
-    file_size = db.Column(db.BigInteger, nullable=False)
-    duration = db.Column(db.Integer, nullable=False)  # in seconds
+    user_id = db.Column(db.Integer)  # User who started the recording
+    filename = db.Column(db.String(255), nullable=False, default='')
+    file_path = db.Column(db.String(500), nullable=False, default='')
+    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    end_time = db.Column(db.DateTime)
+    file_size = db.Column(db.BigInteger, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)  # in seconds
     resolution = db.Column(db.String(20))
     fps = db.Column(db.Integer)
+    recording_type = db.Column(db.String(20), default='continuous')  # manual, continuous
     has_ai_analysis = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    recording_metadata = db.Column('metadata', JSONType)  # 'metadata' is reserved by SQLAlchemy
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    ended_at = db.Column(db.DateTime)
 
     def __repr__(self):
         return f'<Recording {self.filename}>'
 
+    def get_metadata(self):
+        """Get recording metadata as dictionary"""
+        return self.recording_metadata or {}
+
+    def set_metadata(self, metadata_dict):
+        """Set recording metadata from dictionary"""
+        self.recording_metadata = metadata_dict
+
     def to_dict(self):
         return {
             'id': self.id,
             'camera_id': self.camera_id,
+            'user_id': self.user_id,
             'filename': self.filename,
             'file_path': self.file_path,
-            'start_time': self.start_time.isoformat(),
-            'end_time': self.end_time.isoformat(),
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
             'file_size': self.file_size,
             'duration': self.duration,
             'resolution': self.resolution,
             'fps': self.fps,
+            'recording_type': self.recording_type,
             'has_ai_analysis': self.has_ai_analysis,
-            'created_at': self.created_at.isoformat()
+            'metadata': self.get_metadata(),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None
+        }
+
+
+class RecordingSegment(db.Model):
+    """One video file of a recording, indexed by camera and time for seeking"""
+    __tablename__ = 'recording_segment'
+    __table_args__ = (
+        db.Index('ix_recording_segment_camera_start', 'camera_id', 'start_time'),
+    )
+
+    id = db.Column(BigInt, primary_key=True)
+    recording_id = db.Column(BigInt, db.ForeignKey('recording.id', ondelete='CASCADE'), nullable=False, index=True)
+    camera_id = db.Column(db.String(50), nullable=False)
+    segment_number = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False, index=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False, default=0)
+    frame_count = db.Column(db.Integer, nullable=False, default=0)
+    fps = db.Column(db.Float)
+    thumbnail_index = db.Column(JSONType)  # Layout and offsets of the thumbnail sprite
+    storage_tier = db.Column(db.String(20), nullable=False, default='hot', index=True)  # hot, archiving, archive, failed
+    archive_claimed_at = db.Column(db.DateTime)  # When a tiering thread claimed the segment for archiving
+    segment_metadata = db.Column('metadata', JSONType)  # Recording quality and why it was degraded
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    recording = db.relationship('Recording', backref=db.backref(
+        'segments', lazy=True, order_by='RecordingSegment.segment_number', passive_deletes=True
+    ))
+
+    def __repr__(self):
+        return f'<RecordingSegment {self.filename}>'
+
+    def get_duration(self):
+        """Get segment duration in seconds"""
+        return max((self.end_time - self.start_time).total_seconds(), 0)
+
+    def get_offsets(self, start, end):
+        """Get the part of this segment within [start, end) as time and approximate byte offsets"""
+        clip_start = max(start, self.start_time)
+        clip_end = min(end, self.end_time)
+        duration = self.get_duration()
+        start_seconds = (clip_start - self.start_time).total_seconds()
+        end_seconds = (clip_end - self.start_time).total_seconds()
+
+        # Byte offsets assume a constant bitrate, players should seek by time
+        def byte_offset(seconds):
+            return int(self.file_size * seconds / duration) if duration > 0 else 0
+
+        return {
+            'start_offset_seconds': start_seconds,
+            'end_offset_seconds': end_seconds,
+            'start_frame': int(start_seconds * self.fps) if self.fps else None,
+            'end_frame': int(end_seconds * self.fps) if self.fps else None,
+            'approx_start_byte': byte_offset(start_seconds),
+            'approx_end_byte': byte_offset(end_seconds)
+        }
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'recording_id': self.recording_id,
+            'camera_id': self.camera_id,
+            'segment_number': self.segment_number,
+            'filename': self.filename,
+            'file_path': self.file_path,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'duration': self.get_duration(),
+            'file_size': self.file_size,
+            'frame_count': self.frame_count,
+            'fps': self.fps,
+            'has_thumbnails': bool(self.thumbnail_index),
+            'storage_tier': self.storage_tier,
+            'metadata': self.segment_metadata or {}
+        }
+
+
+class RecorderIntent(db.Model):
+    """A recording that should be running, so it can be resumed after a restart or crash"""
+    __tablename__ = 'recorder_intent'
+
+    camera_id = db.Column(db.String(50), primary_key=True)
+    recording_id = db.Column(BigInt, db.ForeignKey('recording.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer)
+    duration_minutes = db.Column(db.Integer)
+    fps = db.Column(db.Float, nullable=False)
+    scheduled = db.Column(db.Boolean, nullable=False, default=False)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    owner = db.Column(db.String(255))  # host:pid of the process recording it
+    heartbeat_at = db.Column(db.DateTime, index=True)  # None once released for another process to resume
+
+    def __repr__(self):
+        return f'<RecorderIntent {self.camera_id}:{self.recording_id}>'
+
+    def to_dict(self):
+        return {
+            'camera_id': self.camera_id,
+            'recording_id': self.recording_id,
+            'user_id': self.user_id,
+            'duration_minutes': self.duration_minutes,
+            'fps': self.fps,
+            'scheduled': self.scheduled,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'owner': self.owner,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
         }
 
 
 class AIEvent(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    recording_id = db.Column(db.Integer, db.ForeignKey('recording.id'), nullable=False)
+    id = db.Column(BigInt, primary_key=True)
+    recording_id = db.Column(BigInt, db.ForeignKey('recording.id'), nullable=False, index=True)
     event_type = db.Column(db.String(50), nullable=False)
     confidence = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False)
-    bounding_box = db.Column(db.Text)  # JSON format
+    bounding_box = db.Column(JSONType)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -151,13 +312,11 @@ class AIEvent(db.Model):
 
     def get_bounding_box(self):
         """Get bounding box as dictionary"""
-        if self.bounding_box:
-            return json.loads(self.bounding_box)
-        return None
+        return self.bounding_box
 
     def set_bounding_box(self, bbox_dict):
         """Set bounding box from dictionary"""
-        self.bounding_box = json.dumps(bbox_dict)
+        self.bounding_box = bbox_dict
 
     def to_dict(self):
         return {
@@ -171,3 +330,45 @@ class AIEvent(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+
+class CollectionVersion(db.Model):
+    """Change counter of a listed collection (cameras, users), bumped once per writing transaction"""
+    __tablename__ = 'collection_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(BigInt, nullable=False, default=0)
+    pruned_version = db.Column(BigInt, nullable=False, default=0)  # Deltas from before this are no longer complete
+
+    def __repr__(self):
+        return f'<CollectionVersion {self.name}:{self.version}>'
+
+
+class Tombstone(db.Model):
+    """A deleted row, so delta listings can tell clients to drop it"""
+    __tablename__ = 'tombstone'
+    __table_args__ = (
+        db.Index('ix_tombstone_collection_version', 'collection', 'version'),
+    )
+
+    id = db.Column(BigInt, primary_key=True)
+    collection = db.Column(db.String(50), nullable=False)
+    item_id = db.Column(db.String(50), nullable=False)
+    version = db.Column(BigInt, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Tombstone {self.collection}:{self.item_id}>'
+
+
+class PushEvent(db.Model):
+    """A published push event, read back by the event bus of every worker"""
+    __tablename__ = 'push_event'
+
+    id = db.Column(BigInt, primary_key=True)  # Also the SSE event ID, so replay works across workers
+    event_type = db.Column(db.String(30), nullable=False)
+    camera_id = db.Column(db.String(50))
+    data = db.Column(JSONType)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<PushEvent {self.id}:{self.event_type}>'
@@ -1,8 +1,14 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import create_access_token, jwt_required
 from datetime import datetime, timedelta
 from src.models.user import User, UserSession, db
+from src.services.access_service import MEDIA_URL_TTL_SECONDS, get_access_service, get_current_user_id, sign_media_url
+from src.services.password_service import PasswordServiceBusy
+from src.services.rate_limit_service import get_login_throttle
 import uuid
+from urllib.parse import parse_qsl, urlsplit
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -23,12 +29,40 @@ def login():
             (User.username == username) | (User.email == username)
         ).first()
         
-        if not user or not user.check_password(password):
+        # Throttle by client IP (behind proxies as resolved by TRUSTED_PROXY_COUNT) and by target account
+        throttle = get_login_throttle()
+        ip_address = request.remote_addr or 'unknown'
+        account_key = throttle.account_key(user.id if user else None, username)
+        retry_after = throttle.check(ip_address, account_key)
+        if retry_after:
+            response = jsonify({'error': 'Too many login attempts, try again later'})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        throttle.record_attempt(ip_address)
+        
+        try:
+            password_valid = user is not None and user.check_password(password)
+        except PasswordServiceBusy:
+            response = jsonify({'error': 'Login service busy, try again shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        if not password_valid:
+            throttle.record_failure(account_key)
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        throttle.record_success(account_key)
+        
         if not user.is_active:
             return jsonify({'error': 'Account is disabled'}), 401
         
+        # Upgrade hashes made with an outdated bcrypt cost
+        if user.password_needs_rehash():
+            try:
+                user.set_password(password)
+            except PasswordServiceBusy:
+                pass  # Retried on the next login
+        
         # Update last login
         user.last_login = datetime.utcnow()
         
@@ -37,8 +71,10 @@ def login():
             'role': user.role,
             'user_id': user.id
         }
+        if current_app.config.get('JWT_EMBED_CAMERA_ACL'):
+            additional_claims.update(get_access_service().build_acl_claims(user))
         access_token = create_access_token(
-            identity=user.id,
+            identity=str(user.id),
             additional_claims=additional_claims,
             expires_delta=timedelta(hours=24)
         )
@@ -70,7 +106,7 @@ def login():
 def logout():
     """User logout endpoint"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         
         # Get session token from request
         data = request.get_json() or {}
@@ -102,7 +138,7 @@ def logout():
 def refresh():
     """Refresh JWT token"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         user = User.query.get(user_id)
         
         if not user or not user.is_active:
@@ -113,8 +149,10 @@ def refresh():
             'role': user.role,
             'user_id': user.id
         }
+        if current_app.config.get('JWT_EMBED_CAMERA_ACL'):
+            additional_claims.update(get_access_service().build_acl_claims(user))
         access_token = create_access_token(
-            identity=user.id,
+            identity=str(user.id),
             additional_claims=additional_claims,
             expires_delta=timedelta(hours=24)
         )
@@ -128,12 +166,40 @@ def refresh():
         return jsonify({'error': str(e)}), 500
 
 
+@auth_bp.route('/auth/media-url', methods=['POST'])
+@jwt_required()
+def create_media_url():
+    """Sign a short-lived URL for a player or EventSource, which cannot send the Authorization header"""
+    try:
+        data = request.get_json()
+        url = data.get('url') if isinstance(data, dict) else None
+        if not isinstance(url, str) or not url:
+            return jsonify({'error': 'url is required'}), 400
+        
+        parts = urlsplit(url)
+        try:
+            endpoint, _ = current_app.url_map.bind('').match(parts.path, method='GET')
+        except HTTPException:
+            return jsonify({'error': 'Unknown URL'}), 400
+        if not getattr(current_app.view_functions[endpoint], 'media_url', False):
+            return jsonify({'error': 'Signed URLs are not available for this endpoint'}), 400
+        
+        # Access to the resource itself is checked when the URL is used
+        args = MultiDict(parse_qsl(parts.query, keep_blank_values=True))
+        return jsonify({
+            'url': sign_media_url(get_current_user_id(), parts.path, args),
+            'expires_in': MEDIA_URL_TTL_SECONDS
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @auth_bp.route('/auth/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     """Get current user profile"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         user = User.query.get(user_id)
         
         if not user:
@@ -150,7 +216,7 @@ def get_profile():
 def update_profile():
     """Update current user profile"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         user = User.query.get(user_id)
         
         if not user:
@@ -190,7 +256,7 @@ def update_profile():
 def get_sessions():
     """Get user's active sessions"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         
         sessions = UserSession.query.filter_by(user_id=user_id).all()
         
@@ -219,7 +285,7 @@ def get_sessions():
 def delete_session(session_token):
     """Delete specific session"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         
         session = UserSession.query.filter_by(
             user_id=user_id,
@@ -1,59 +1,59 @@
 from flask import Blueprint, jsonify, request, Response
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from src.models.user import User
+from flask_jwt_extended import jwt_required
+from src.models.user import UserCamera
 from src.models.camera import Camera, StreamSession, db
+from src.services.access_service import (
+    get_access_service, get_current_access, get_current_user_id, check_camera_access, require_role
+)
+from src.services.stats_service import get_stats_service
+from src.services.sync_service import (
+    acl_fingerprint, get_collection_state, get_deleted_ids, listing_response, make_sync_token,
+    not_modified_response, parse_sync_token
+)
+from src.services.recording_scheduler import get_recording_scheduler
+from src.services.camera_service import (
+    bulk_delete_cameras, bulk_save_cameras, revoke_camera_assignments, validate_camera_data
+)
 from datetime import datetime
 import uuid
 import json
 
 camera_bp = Blueprint('camera', __name__)
 
-def require_role(allowed_roles):
-    """Decorator to require specific roles"""
-    def decorator(f):
-        def wrapper(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            
-            if user_role not in allowed_roles:
-                return jsonify({'error': 'Insufficient permissions'}), 403
-            
-            return f(*args, **kwargs)
-        wrapper.__name__ = f.__name__
-        return wrapper
-    return decorator
-
-
-def check_camera_access(user, camera_id):
-    """Check if user has access to specific camera"""
-    if user.role in ['super_admin', 'admin']:
-        return True
-    return camera_id in user.get_assigned_cameras()
-
-
 @camera_bp.route('/cameras', methods=['GET'])
 @jwt_required()
 def get_cameras():
     """Get list of cameras accessible to user"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
+        # Clients polling with If-None-Match or ?since= get a 304 or only the changes
+        version, pruned_version = get_collection_state('cameras')
+        scope = None if user.is_admin else acl_fingerprint(user.camera_ids)
+        token = make_sync_token(version, scope)
+        if request.if_none_match.contains(f'cameras-{token}'):
+            return not_modified_response(f'cameras-{token}')
+        since = parse_sync_token(request.args.get('since'), scope, pruned_version)
+        
         # Get cameras based on user role
         if user.role in ['super_admin', 'admin']:
-            cameras = Camera.query.all()
+            query = Camera.query
         else:
             # Regular users only see assigned cameras
-            assigned_camera_ids = user.get_assigned_cameras()
-            cameras = Camera.query.filter(Camera.id.in_(assigned_camera_ids)).all()
+            query = Camera.query.join(UserCamera, UserCamera.camera_id == Camera.id).filter(
+                UserCamera.user_id == user.id
+            )
         
-        return jsonify({
-            'cameras': [camera.to_dict() for camera in cameras],
-            'total': len(cameras)
-        })
+        if since is None:
+            return listing_response('cameras', query.all(), None, token)
+        
+        # Assignment changes alter the scope and force a full listing, so users only miss deletions here
+        cameras = query.filter(Camera.row_version > since).all()
+        deleted = get_deleted_ids('cameras', since) if user.is_admin else []
+        return listing_response('cameras', cameras, deleted, token)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -67,35 +67,24 @@ def create_camera():
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['id', 'name']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'{field} is required'}), 400
+        try:
+            values = validate_camera_data(data, creating=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Check if camera ID already exists
-        existing_camera = Camera.query.get(data['id'])
+        existing_camera = Camera.query.get(values['id'])
         if existing_camera:
             return jsonify({'error': 'Camera ID already exists'}), 400
         
         # Create new camera
-        camera = Camera(
-            id=data['id'],
-            name=data['name'],
-            location=data.get('location', ''),
-            resolution=data.get('resolution', '1920x1080'),
-            fps=data.get('fps', 30),
-            recording_enabled=data.get('recording_enabled', True),
-            ai_analysis_enabled=data.get('ai_analysis_enabled', False)
-        )
-        
-        # Set VIAM configuration if provided
-        if 'viam_config' in data:
-            camera.set_viam_config(data['viam_config'])
+        camera = Camera(**values)
         
         db.session.add(camera)
         db.session.commit()
         
+        get_recording_scheduler().request_run()
+        
         return jsonify({
             'message': 'Camera created successfully',
             'camera': camera.to_dict()
@@ -110,8 +99,7 @@ def create_camera():
 def get_camera(camera_id):
     """Get specific camera details"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -142,33 +130,20 @@ def update_camera(camera_id):
         
         data = request.get_json()
         
-        # Update camera fields
-        if 'name' in data:
-            camera.name = data['name']
-        
-        if 'location' in data:
-            camera.location = data['location']
-        
-        if 'resolution' in data:
-            camera.resolution = data['resolution']
-        
-        if 'fps' in data:
-            camera.fps = int(data['fps'])
+        try:
+            values = validate_camera_data(data, creating=False)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if 'recording_enabled' in data:
-            camera.recording_enabled = bool(data['recording_enabled'])
-        
-        if 'ai_analysis_enabled' in data:
-            camera.ai_analysis_enabled = bool(data['ai_analysis_enabled'])
-        
-        if 'is_active' in data:
-            camera.is_active = bool(data['is_active'])
-        
-        if 'viam_config' in data:
-            camera.set_viam_config(data['viam_config'])
+        # Update camera fields
+        for field, value in values.items():
+            setattr(camera, field, value)
         
         db.session.commit()
         
+        # Start, stop or re-rate the camera's recorder now rather than on the next pass
+        get_recording_scheduler().request_run()
+        
         return jsonify({
             'message': 'Camera updated successfully',
             'camera': camera.to_dict()
@@ -188,26 +163,108 @@ def delete_camera(camera_id):
         if not camera:
             return jsonify({'error': 'Camera not found'}), 404
         
-        # Delete related stream sessions
+        # Delete related stream sessions and user assignments
         StreamSession.query.filter_by(camera_id=camera_id).delete()
+        revoke_camera_assignments([camera_id])
         
         # Delete camera
         db.session.delete(camera)
         db.session.commit()
         
+        get_access_service().invalidate_all()
+        get_recording_scheduler().request_run()
+        
         return jsonify({'message': 'Camera deleted successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@camera_bp.route('/cameras/bulk', methods=['POST'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def bulk_create_cameras():
+    """Create many cameras in one transaction, updating existing ones with upsert (Admin+ only)"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            result = bulk_save_cameras(
+                data.get('cameras'),
+                on_existing='update' if data.get('upsert') else 'error',
+                atomic=data.get('atomic', True)
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result['created'] or result['updated']:
+            get_recording_scheduler().request_run()
+        
+        return jsonify(result), _bulk_status(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@camera_bp.route('/cameras/bulk', methods=['PUT'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def bulk_update_cameras():
+    """Update many existing cameras in one transaction (Admin+ only)"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            result = bulk_save_cameras(data.get('cameras'), on_existing='update', on_missing='error',
+                                       atomic=data.get('atomic', True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result['updated']:
+            get_recording_scheduler().request_run()
+        
+        return jsonify(result), _bulk_status(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@camera_bp.route('/cameras/bulk', methods=['DELETE'])
+@jwt_required()
+@require_role(['super_admin'])
+def bulk_delete_cameras_route():
+    """Delete many cameras in one transaction (Super Admin only)"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            result = bulk_delete_cameras(data.get('ids'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result['deleted']:
+            get_access_service().invalidate_all()
+            get_recording_scheduler().request_run()
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _bulk_status(result):
+    """400 for a rejected batch, 207 when only some items were applied"""
+    if not result['applied']:
+        return 400
+    return 207 if result['failed'] else 200
+
+
 @camera_bp.route('/cameras/<camera_id>/stream', methods=['GET'])
 @jwt_required()
 def get_camera_stream(camera_id):
     """Get camera stream (placeholder for VIAM integration)"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -226,7 +283,7 @@ def get_camera_stream(camera_id):
         # Create stream session
         session_id = str(uuid.uuid4())
         stream_session = StreamSession(
-            user_id=user_id,
+            user_id=user.id,
             camera_id=camera_id,
             session_id=session_id
         )
@@ -255,7 +312,7 @@ def get_camera_stream(camera_id):
 def end_camera_stream(camera_id, session_id):
     """End camera stream session"""
     try:
-        user_id = get_jwt_identity()
+        user_id = get_current_user_id()
         
         stream_session = StreamSession.query.filter_by(
             user_id=user_id,
@@ -281,8 +338,7 @@ def end_camera_stream(camera_id, session_id):
 def get_camera_snapshot(camera_id):
     """Get camera snapshot (placeholder for VIAM integration)"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -318,8 +374,7 @@ def get_camera_snapshot(camera_id):
 def get_camera_status(camera_id):
     """Get camera status and health"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -367,14 +422,7 @@ def get_camera_status(camera_id):
 def get_camera_stats():
     """Get camera statistics (Admin+ only)"""
     try:
-        stats = {
-            'total_cameras': Camera.query.count(),
-            'active_cameras': Camera.query.filter_by(is_active=True).count(),
-            'inactive_cameras': Camera.query.filter_by(is_active=False).count(),
-            'recording_enabled': Camera.query.filter_by(recording_enabled=True).count(),
-            'ai_enabled': Camera.query.filter_by(ai_analysis_enabled=True).count(),
-            'active_streams': StreamSession.query.filter_by(is_active=True).count()
-        }
+        stats = get_stats_service().get_camera_stats()
         
         return jsonify({'stats': stats})
         
@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+
+from src.services.config_service import CONFIG_OPTIONS, get_config_service
+from src.services.access_service import get_current_user_id, require_role
+
+config_bp = Blueprint('config', __name__)
+
+@config_bp.route('/config', methods=['GET'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def get_config():
+    """Get the current system configuration (admin only)"""
+    try:
+        config_service = get_config_service()
+        values = config_service.get_all()
+
+        return jsonify({
+            'config': {key: values[key] for key in CONFIG_OPTIONS},
+            'options': {
+                key: {'type': value_type.__name__, 'default': default, 'description': description}
+                for key, (value_type, default, description, _) in CONFIG_OPTIONS.items()
+            },
+            'status': config_service.get_status()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@config_bp.route('/config', methods=['PUT'])
+@jwt_required()
+@require_role(['super_admin'])
+def update_config():
+    """Update system settings, applied by every worker within seconds (super admin only)"""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not data:
+            return jsonify({'error': 'Expected an object of settings to update'}), 400
+
+        try:
+            updated = get_config_service().set_values(data, get_current_user_id())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({
+            'message': 'Configuration updated successfully',
+            'config': updated,
+            'status': get_config_service().get_status()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
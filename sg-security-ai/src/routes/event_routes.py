@@ -0,0 +1,80 @@
+import time
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from src.services.event_bus import EVENT_TYPES, EventBusFull, format_sse, get_event_bus
+from src.services.access_service import get_access_service, get_current_access, media_auth_required
+from src.services.recording_service import get_recording_service
+
+event_bp = Blueprint('events', __name__)
+
+@event_bp.route('/events', methods=['GET'])
+@media_auth_required
+def stream_events():
+    """Push camera status, recorder and AI events for the user's cameras as server-sent events"""
+    try:
+        user = get_current_access()
+
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        # Optional filters: ?camera_id=a,b and ?types=camera_status,recording,ai_event
+        cameras = set(request.args['camera_id'].split(',')) if request.args.get('camera_id') else None
+        types = set(request.args['types'].split(',')) if request.args.get('types') else None
+        if types is not None and not types <= set(EVENT_TYPES):
+            return jsonify({'error': f'types must be among {", ".join(EVENT_TYPES)}'}), 400
+
+        bus = get_event_bus()
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            subscription = bus.subscribe(user.is_admin, user.camera_ids, cameras, types, last_event_id)
+        except EventBusFull as e:
+            return jsonify({'error': str(e)}), 503
+
+        # State at connect time, so clients do not wait for the next change to draw the cameras
+        snapshot = {
+            'cameras': {camera_id: status for camera_id, status in bus.get_camera_states().items()
+                        if subscription.accepts({'type': 'camera_status', 'camera_id': camera_id})},
+            'recordings': [recording for recording in get_recording_service().get_all_active_recordings()
+                           if subscription.accepts({'type': 'recording', 'camera_id': recording['camera_id']})]
+        }
+        snapshot_time = datetime.utcnow().isoformat()
+
+        app = current_app._get_current_object()
+        user_id = user.id
+
+        def generate():
+            try:
+                yield f'retry: {bus.retry_ms}\n\n'
+                yield format_sse({'type': 'snapshot', 'camera_id': None,
+                                  'data': snapshot, 'timestamp': snapshot_time})
+                last_acl_check = time.monotonic()
+                while True:
+                    # Follow camera assignment changes and end the stream for disabled users, busy or idle
+                    if time.monotonic() - last_acl_check >= bus.acl_refresh_seconds:
+                        last_acl_check = time.monotonic()
+                        with app.app_context():
+                            access = get_access_service().get_user_access(user_id)
+                        if not access or not access.is_active:
+                            return
+                        subscription.is_admin, subscription.camera_ids = access.is_admin, access.camera_ids
+
+                    event = subscription.get(min(bus.heartbeat_seconds, bus.acl_refresh_seconds))
+                    if event is None:
+                        yield ': keepalive\n\n'
+                    elif subscription.accepts(event):  # Queued events of a camera unassigned since are dropped
+                        yield format_sse(event)
+            finally:
+                bus.unsubscribe(subscription)
+
+        response = Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}  # No proxy buffering
+        )
+        response.call_on_close(lambda: bus.unsubscribe(subscription))
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
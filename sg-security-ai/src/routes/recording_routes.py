@@ -1,42 +1,26 @@
-from flask import Blueprint, jsonify, request, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, Response, jsonify, request, send_file
+from flask_jwt_extended import jwt_required
 import os
 from datetime import datetime
 
-from src.models.user import User, Recording, db
+from src.models.user import User, Recording, RecordingSegment, db
 from src.models.camera import Camera
 from src.services.recording_service import get_recording_service
+from src.services.storage_service import get_accountant_for, get_storage_accountant, remove_thumbnails, thumbnail_path_for
+from src.services.retention_service import get_retention_cleaner
+from src.services.recording_scheduler import get_recording_scheduler
+from src.services.recording_governor import get_recording_governor
+from src.services.export_service import get_export_service, ExportError
+from src.services.access_service import get_current_access, check_camera_access, media_auth_required, require_role
 
 recording_bp = Blueprint('recording', __name__)
 
-def require_role(allowed_roles):
-    """Decorator to require specific roles"""
-    def decorator(f):
-        def wrapper(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            
-            if user_role not in allowed_roles:
-                return jsonify({'error': 'Insufficient permissions'}), 403
-            
-            return f(*args, **kwargs)
-        wrapper.__name__ = f.__name__
-        return wrapper
-    return decorator
-
-def check_camera_access(user, camera_id):
-    """Check if user has access to specific camera"""
-    if user.role in ['super_admin', 'admin']:
-        return True
-    return camera_id in user.get_assigned_cameras()
-
 @recording_bp.route('/recordings', methods=['GET'])
 @jwt_required()
 def get_recordings():
     """Get recordings list with filtering and pagination"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -54,9 +38,8 @@ def get_recordings():
         
         # Filter by camera access for non-admin users
         if user.role not in ['super_admin', 'admin']:
-            assigned_cameras = user.get_assigned_cameras()
-            if assigned_cameras:
-                query = query.filter(Recording.camera_id.in_(assigned_cameras))
+            if user.camera_ids:
+                query = query.filter(Recording.camera_id.in_(user.camera_ids))
             else:
                 # User has no camera access
                 return jsonify({
@@ -139,8 +122,7 @@ def get_recordings():
 def start_recording():
     """Start recording for a camera"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -168,7 +150,7 @@ def start_recording():
         
         # Start recording
         recording_service = get_recording_service()
-        result = recording_service.start_recording(camera_id, user_id, duration_minutes)
+        result = recording_service.start_recording(camera_id, user.id, duration_minutes)
         
         if result['success']:
             return jsonify(result)
@@ -183,8 +165,7 @@ def start_recording():
 def stop_recording():
     """Stop recording for a camera"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -219,8 +200,7 @@ def stop_recording():
 def get_active_recordings():
     """Get list of active recordings"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -230,10 +210,9 @@ def get_active_recordings():
         
         # Filter by user access
         if user.role not in ['super_admin', 'admin']:
-            assigned_cameras = user.get_assigned_cameras()
             active_recordings = [
                 rec for rec in active_recordings 
-                if rec['camera_id'] in assigned_cameras
+                if rec['camera_id'] in user.camera_ids
             ]
         
         # Add camera names
@@ -272,8 +251,7 @@ def get_recording_statistics():
 def get_recording_details(recording_id):
     """Get details of a specific recording"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -315,13 +293,12 @@ def get_recording_details(recording_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@recording_bp.route('/recordings/<int:recording_id>/download', methods=['GET'])
+@recording_bp.route('/recordings/<int:recording_id>/segments', methods=['GET'])
 @jwt_required()
-def download_recording(recording_id):
-    """Download a recording file"""
+def get_recording_segments(recording_id):
+    """Get the segments of a recording"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -335,17 +312,273 @@ def download_recording(recording_id):
             if not check_camera_access(user, recording.camera_id):
                 return jsonify({'error': 'Access denied to this recording'}), 403
         
+        segments = [segment.to_dict() for segment in recording.segments]
+        
+        return jsonify({
+            'segments': segments,
+            'total': len(segments)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/segments', methods=['GET'])
+@jwt_required()
+def find_segments():
+    """Find the segments of a camera covering a time range"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        camera_id = request.args.get('camera_id')
+        if not camera_id:
+            return jsonify({'error': 'camera_id is required'}), 400
+        
+        if not check_camera_access(user, camera_id):
+            return jsonify({'error': 'Access denied to this camera'}), 403
+        
+        try:
+            start = datetime.fromisoformat(request.args['start'])
+            end = datetime.fromisoformat(request.args['end'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'start and end are required in ISO format'}), 400
+        
+        if end <= start:
+            return jsonify({'error': 'end must be after start'}), 400
+        
+        segments = get_recording_service().find_segments(camera_id, start, end)
+        
+        return jsonify({
+            'camera_id': camera_id,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'segments': segments,
+            'total': len(segments)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def send_video(file_path, download_name, as_attachment):
+    """Send a video file with Range, If-Range and ETag support"""
+    response = send_file(
+        file_path,
+        mimetype='video/mp4',
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        max_age=3600
+    )
+    
+    # Finalized segments never change, but they are not public
+    response.cache_control.private = True
+    return response
+
+def recording_file_response(recording_id, as_attachment):
+    """Serve the file of a recording after checking access"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        recording = Recording.query.get(recording_id)
+        if not recording:
+            return jsonify({'error': 'Recording not found'}), 404
+        
+        # Check access
+        if user.role not in ['super_admin', 'admin']:
+            if not check_camera_access(user, recording.camera_id):
+                return jsonify({'error': 'Access denied to this recording'}), 403
+        
+        # file_path only names the first segment, longer recordings are joined on the fly
+        segments = recording.segments
+        if len(segments) > 1:
+            return joined_recording_response(recording, as_attachment)
+        file_path = segments[0].file_path if segments else recording.file_path
+        
         # Check if file exists
-        if not recording.file_path or not os.path.exists(recording.file_path):
+        if not file_path or not os.path.exists(file_path):
             return jsonify({'error': 'Recording file not found'}), 404
         
-        # Send file
-        return send_file(
-            recording.file_path,
-            as_attachment=True,
-            download_name=recording.filename or f"recording_{recording_id}.mp4",
-            mimetype='video/mp4'
+        return send_video(
+            file_path,
+            recording.filename or f"recording_{recording_id}.mp4",
+            as_attachment
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def joined_recording_response(recording, as_attachment):
+    """Stream all segments of a recording as one MP4 (no Range support)"""
+    try:
+        export = get_export_service().create_recording_export(recording)
+    except ExportError as e:
+        if e.status_code == 429:
+            return jsonify({'error': str(e)}), 429
+        # Never pass the first segment off as the whole recording
+        return jsonify({
+            'error': f'{e} - fetch the segments individually',
+            'segments_url': f'/api/recordings/{recording.id}/segments',
+            'segments': [segment.to_dict() for segment in recording.segments]
+        }), 409
+    
+    disposition = 'attachment' if as_attachment else 'inline'
+    response = Response(
+        export.iter_chunks(),
+        mimetype='video/mp4',
+        headers={'Content-Disposition': f'{disposition}; filename={export.filename}'}
+    )
+    response.call_on_close(export.close)
+    return response
+
+def segment_file_response(segment_id, as_attachment):
+    """Serve a segment file after checking access"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        segment = RecordingSegment.query.get(segment_id)
+        if not segment:
+            return jsonify({'error': 'Segment not found'}), 404
+        
+        if not check_camera_access(user, segment.camera_id):
+            return jsonify({'error': 'Access denied to this recording'}), 403
+        
+        if not os.path.exists(segment.file_path):
+            return jsonify({'error': 'Segment file not found'}), 404
+        
+        return send_video(segment.file_path, segment.filename, as_attachment)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/<int:recording_id>/download', methods=['GET'])
+@jwt_required()
+def download_recording(recording_id):
+    """Download a recording file"""
+    return recording_file_response(recording_id, as_attachment=True)
+
+# <video> elements cannot set headers, so playback also accepts a signed ?token= URL (POST /api/auth/media-url)
+@recording_bp.route('/recordings/<int:recording_id>/play', methods=['GET'])
+@media_auth_required
+def play_recording(recording_id):
+    """Stream a recording inline for the browser player"""
+    return recording_file_response(recording_id, as_attachment=False)
+
+@recording_bp.route('/recordings/segments/<int:segment_id>/download', methods=['GET'])
+@jwt_required()
+def download_segment(segment_id):
+    """Download a segment file"""
+    return segment_file_response(segment_id, as_attachment=True)
+
+@recording_bp.route('/recordings/segments/<int:segment_id>/play', methods=['GET'])
+@media_auth_required
+def play_segment(segment_id):
+    """Stream a segment inline for the browser player"""
+    return segment_file_response(segment_id, as_attachment=False)
+
+@recording_bp.route('/recordings/segments/<int:segment_id>/thumbnails', methods=['GET'])
+@jwt_required()
+def get_segment_thumbnails(segment_id):
+    """Get the thumbnail index of a segment for timeline scrubbing"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        segment = RecordingSegment.query.get(segment_id)
+        if not segment:
+            return jsonify({'error': 'Segment not found'}), 404
+        
+        if not check_camera_access(user, segment.camera_id):
+            return jsonify({'error': 'Access denied to this recording'}), 403
+        
+        if not segment.thumbnail_index:
+            return jsonify({'error': 'No thumbnails for this segment'}), 404
+        
+        return jsonify({
+            'segment_id': segment.id,
+            'start_time': segment.start_time.isoformat(),
+            'thumbnails': segment.thumbnail_index
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/segments/<int:segment_id>/sprite.jpg', methods=['GET'])
+@media_auth_required
+def get_segment_sprite(segment_id):
+    """Get the thumbnail sprite image of a segment"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        segment = RecordingSegment.query.get(segment_id)
+        if not segment:
+            return jsonify({'error': 'Segment not found'}), 404
+        
+        if not check_camera_access(user, segment.camera_id):
+            return jsonify({'error': 'Access denied to this recording'}), 403
+        
+        sprite_path = thumbnail_path_for(segment.file_path)
+        if not segment.thumbnail_index or not os.path.exists(sprite_path):
+            return jsonify({'error': 'No thumbnails for this segment'}), 404
+        
+        response = send_file(sprite_path, mimetype='image/jpeg', conditional=True, etag=True, max_age=86400)
+        response.cache_control.private = True
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/export', methods=['GET'])
+@media_auth_required
+def export_clip():
+    """Export a time range of a camera as one MP4, streamed while it is built"""
+    try:
+        user = get_current_access()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        camera_id = request.args.get('camera_id')
+        if not camera_id:
+            return jsonify({'error': 'camera_id is required'}), 400
+        
+        if not check_camera_access(user, camera_id):
+            return jsonify({'error': 'Access denied to this camera'}), 403
+        
+        try:
+            start = datetime.fromisoformat(request.args['start'])
+            end = datetime.fromisoformat(request.args['end'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'start and end are required in ISO format'}), 400
+        
+        if end <= start:
+            return jsonify({'error': 'end must be after start'}), 400
+        
+        try:
+            export = get_export_service().create_export(camera_id, start, end)
+        except ExportError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        
+        response = Response(
+            export.iter_chunks(),
+            mimetype='video/mp4',
+            headers={'Content-Disposition': f'attachment; filename={export.filename}'}
         )
+        response.call_on_close(export.close)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -355,8 +588,7 @@ def download_recording(recording_id):
 def delete_recording(recording_id):
     """Delete a recording"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -366,19 +598,32 @@ def delete_recording(recording_id):
             return jsonify({'error': 'Recording not found'}), 404
         
         # Check permissions (only super admin or recording owner can delete)
-        if user.role != 'super_admin' and recording.user_id != user_id:
+        if user.role != 'super_admin' and recording.user_id != user.id:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Delete file if it exists
-        if recording.file_path and os.path.exists(recording.file_path):
-            try:
-                os.remove(recording.file_path)
-            except Exception as e:
-                return jsonify({'error': f'Failed to delete file: {str(e)}'}), 500
-        
-        # Delete database record
+        storage = get_storage_accountant()
+        
+        # Delete segment files that still exist
+        file_paths = {segment.file_path for segment in recording.segments}
+        if recording.file_path:
+            file_paths.add(recording.file_path)
+        
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                try:
+                    file_size = os.path.getsize(file_path)
+                    os.remove(file_path)
+                    remove_thumbnails(file_path)
+                    get_accountant_for(file_path).release_segment(recording.camera_id, file_size, file_path)
+                except Exception as e:
+                    return jsonify({'error': f'Failed to delete file: {str(e)}'}), 500
+        
+        # Delete database records
+        for segment in recording.segments:
+            db.session.delete(segment)
         db.session.delete(recording)
         db.session.commit()
+        storage.record_duration(recording.camera_id, -(recording.duration or 0))
         
         return jsonify({'message': 'Recording deleted successfully'})
         
@@ -389,12 +634,40 @@ def delete_recording(recording_id):
 @jwt_required()
 @require_role(['super_admin'])
 def cleanup_old_recordings():
-    """Clean up old recordings based on retention policy"""
+    """Clean up old recordings based on retention policy (runs in the background)"""
     try:
         recording_service = get_recording_service()
         result = recording_service.cleanup_old_recordings()
         
-        return jsonify(result)
+        if result['success']:
+            return jsonify(result), 202
+        # 503 when this worker has no cleaner thread (RETENTION_CLEANUP_ENABLED or background services off)
+        return jsonify(result), 409 if get_retention_cleaner().is_running() else 503
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/cleanup/status', methods=['GET'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def get_cleanup_status():
+    """Get progress of the current or last retention cleanup"""
+    try:
+        return jsonify({'progress': get_retention_cleaner().get_progress()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recording_bp.route('/recordings/scheduler/status', methods=['GET'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def get_scheduler_status():
+    """Get the result of the last recording scheduler and quality governor passes"""
+    try:
+        return jsonify({
+            'last_run': get_recording_scheduler().last_result,
+            'governor': get_recording_governor().last_result
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
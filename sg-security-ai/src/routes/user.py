@@ -1,47 +1,50 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import selectinload
 from src.models.user import User, db
+from src.services.access_service import get_access_service, get_current_access, get_current_user_id, require_role
+from src.services.stats_service import get_stats_service
+from src.services.password_service import PasswordServiceBusy
+from src.services.sync_service import (
+    get_collection_state, get_deleted_ids, listing_response, make_sync_token, not_modified_response, parse_sync_token
+)
+from src.services.user_service import bulk_import_users, bulk_set_camera_assignments, parse_users_csv
 
 user_bp = Blueprint('user', __name__)
 
-def require_role(allowed_roles):
-    """Decorator to require specific roles"""
-    def decorator(f):
-        def wrapper(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            
-            if user_role not in allowed_roles:
-                return jsonify({'error': 'Insufficient permissions'}), 403
-            
-            return f(*args, **kwargs)
-        wrapper.__name__ = f.__name__
-        return wrapper
-    return decorator
-
-
 @user_bp.route('/users', methods=['GET'])
 @jwt_required()
 @require_role(['super_admin', 'admin'])
 def get_users():
     """Get list of users (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Super admin can see all users, admin can see non-super-admin users
-        if current_user.role == 'super_admin':
-            users = User.query.all()
-        else:  # admin
-            users = User.query.filter(User.role != 'super_admin').all()
-        
-        return jsonify({
-            'users': [user.to_dict() for user in users],
-            'total': len(users)
-        })
+        # Clients polling with If-None-Match or ?since= get a 304 or only the changes
+        version, pruned_version = get_collection_state('users')
+        scope = None if current_user.role == 'super_admin' else 'admin'
+        token = make_sync_token(version, scope)
+        if request.if_none_match.contains(f'users-{token}'):
+            return not_modified_response(f'users-{token}')
+        since = parse_sync_token(request.args.get('since'), scope, pruned_version)
+        
+        query = User.query.options(selectinload(User.camera_assignments))
+        if since is None:
+            # Super admin can see all users, admin can see non-super-admin users
+            if current_user.role != 'super_admin':
+                query = query.filter(User.role != 'super_admin')
+            return listing_response('users', query.all(), None, token)
+        
+        users = query.filter(User.row_version > since).all()
+        deleted = get_deleted_ids('users', since)
+        if current_user.role != 'super_admin':
+            # Users promoted to super admin disappear from an admin's listing
+            deleted += [str(user.id) for user in users if user.role == 'super_admin']
+            users = [user for user in users if user.role != 'super_admin']
+        return listing_response('users', users, deleted, token)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -53,8 +56,7 @@ def get_users():
 def create_user():
     """Create new user (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -116,14 +118,98 @@ def create_user():
         return jsonify({'error': str(e)}), 500
 
 
+@user_bp.route('/users/bulk', methods=['POST'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def bulk_import_users_route():
+    """Import many users from JSON or CSV in one transaction (Admin+ only)"""
+    try:
+        current_user = get_current_access()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # JSON body {"users": [...]}, a text/csv body or a CSV file upload
+        upload = request.files.get('file')
+        if upload or request.mimetype == 'text/csv':
+            content = upload.read() if upload else request.get_data()
+            try:
+                users = parse_users_csv(content.decode('utf-8-sig'))
+            except (UnicodeDecodeError, ValueError) as e:
+                return jsonify({'error': f'Invalid CSV: {e}'}), 400
+            atomic = request.args.get('atomic', 'true').lower() == 'true'
+        else:
+            data = request.get_json() or {}
+            users = data.get('users')
+            atomic = data.get('atomic', True)
+        
+        try:
+            result = bulk_import_users(users, current_user.role, atomic=atomic)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except PasswordServiceBusy:
+            response = jsonify({'error': 'Password service busy, try again shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        if not result['applied']:
+            return jsonify(result), 400
+        return jsonify(result), 207 if result['failed'] else 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@user_bp.route('/users/cameras/assign', methods=['POST'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def bulk_assign_cameras():
+    """Assign a set of cameras to a group of users in one transaction (Admin+ only)"""
+    return _bulk_camera_assignment(assign=True)
+
+
+@user_bp.route('/users/cameras/unassign', methods=['POST'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def bulk_unassign_cameras():
+    """Remove a set of cameras from a group of users in one transaction (Admin+ only)"""
+    return _bulk_camera_assignment(assign=False)
+
+
+def _bulk_camera_assignment(assign):
+    try:
+        current_user = get_current_access()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        data = request.get_json() or {}
+        
+        try:
+            result = bulk_set_camera_assignments(data.get('user_ids'), data.get('camera_ids'),
+                                                 current_user.role, assign=assign)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 403
+        
+        access_service = get_access_service()
+        for user_id in result['changed_user_ids']:
+            access_service.invalidate_user(user_id)
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 @jwt_required()
 @require_role(['super_admin', 'admin'])
 def get_user(user_id):
     """Get specific user details (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'Current user not found'}), 404
@@ -148,8 +234,7 @@ def get_user(user_id):
 def update_user(user_id):
     """Update user (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'Current user not found'}), 404
@@ -163,7 +248,7 @@ def update_user(user_id):
             return jsonify({'error': 'Access denied'}), 403
         
         # Users cannot modify themselves through this endpoint
-        if user_id == current_user_id:
+        if user_id == current_user.id:
             return jsonify({'error': 'Use profile endpoint to modify your own account'}), 400
         
         data = request.get_json()
@@ -214,8 +299,14 @@ def update_user(user_id):
         if 'assigned_cameras' in data:
             user.set_assigned_cameras(data['assigned_cameras'])
         
+        # Tokens with an embedded camera ACL must be re-validated against the database
+        if any(field in data for field in ('role', 'is_active', 'assigned_cameras')):
+            user.bump_acl_version()
+        
         db.session.commit()
         
+        get_access_service().invalidate_user(user_id)
+        
         return jsonify({
             'message': 'User updated successfully',
             'user': user.to_dict()
@@ -231,7 +322,7 @@ def update_user(user_id):
 def delete_user(user_id):
     """Delete user (Super Admin only)"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = get_current_user_id()
         
         # Cannot delete yourself
         if user_id == current_user_id:
@@ -249,6 +340,8 @@ def delete_user(user_id):
         db.session.delete(user)
         db.session.commit()
         
+        get_access_service().invalidate_user(user_id)
+        
         return jsonify({'message': 'User deleted successfully'})
         
     except Exception as e:
@@ -261,14 +354,13 @@ def delete_user(user_id):
 def toggle_user_status(user_id):
     """Toggle user active status (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'Current user not found'}), 404
         
         # Cannot toggle yourself
-        if user_id == current_user_id:
+        if user_id == current_user.id:
             return jsonify({'error': 'Cannot toggle your own status'}), 400
         
         user = User.query.get(user_id)
@@ -280,6 +372,7 @@ def toggle_user_status(user_id):
             return jsonify({'error': 'Access denied'}), 403
         
         user.is_active = not user.is_active
+        user.bump_acl_version()
         
         # If deactivating user, remove their sessions
         if not user.is_active:
@@ -288,6 +381,8 @@ def toggle_user_status(user_id):
         
         db.session.commit()
         
+        get_access_service().invalidate_user(user_id)
+        
         status = 'activated' if user.is_active else 'deactivated'
         return jsonify({
             'message': f'User {status} successfully',
@@ -304,36 +399,15 @@ def toggle_user_status(user_id):
 def get_user_stats():
     """Get user statistics (Admin+ only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_access()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get user counts by role
-        if current_user.role == 'super_admin':
-            stats = {
-                'total_users': User.query.count(),
-                'super_admins': User.query.filter_by(role='super_admin').count(),
-                'admins': User.query.filter_by(role='admin').count(),
-                'users': User.query.filter_by(role='user').count(),
-                'active_users': User.query.filter_by(is_active=True).count(),
-                'inactive_users': User.query.filter_by(is_active=False).count()
-            }
-        else:  # admin
-            stats = {
-                'total_users': User.query.filter(User.role != 'super_admin').count(),
-                'admins': User.query.filter_by(role='admin').count(),
-                'users': User.query.filter_by(role='user').count(),
-                'active_users': User.query.filter(
-                    User.is_active == True,
-                    User.role != 'super_admin'
-                ).count(),
-                'inactive_users': User.query.filter(
-                    User.is_active == False,
-                    User.role != 'super_admin'
-                ).count()
-            }
+        # Admins cannot see super admin accounts
+        stats = get_stats_service().get_user_stats(
+            include_super_admins=current_user.role == 'super_admin'
+        )
         
         return jsonify({'stats': stats})
         
@@ -1,35 +1,22 @@
-from flask import Blueprint, jsonify, request, Response
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from flask_jwt_extended import jwt_required
 import asyncio
 import json
+import time
 from datetime import datetime
 
 from src.models.user import User
 from src.models.camera import Camera, StreamSession, db
 from src.services.viam_service import get_viam_service, ensure_viam_connection
+from src.services.access_service import get_current_access, check_camera_access, require_role
+from src.services.session_janitor import touch_stream_session, close_stream_session
+from src.services.camera_service import bulk_save_cameras
+from src.services.recording_scheduler import get_recording_scheduler
 
-viam_bp = Blueprint('viam', __name__)
-
-def require_role(allowed_roles):
-    """Decorator to require specific roles"""
-    def decorator(f):
-        def wrapper(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            
-            if user_role not in allowed_roles:
-                return jsonify({'error': 'Insufficient permissions'}), 403
-            
-            return f(*args, **kwargs)
-        wrapper.__name__ = f.__name__
-        return wrapper
-    return decorator
+# Seconds between activity updates for open MJPEG streams
+STREAM_HEARTBEAT_SECONDS = 60
 
-def check_camera_access(user, camera_id):
-    """Check if user has access to specific camera"""
-    if user.role in ['super_admin', 'admin']:
-        return True
-    return camera_id in user.get_assigned_cameras()
+viam_bp = Blueprint('viam', __name__)
 
 @viam_bp.route('/viam/status', methods=['GET'])
 @jwt_required()
@@ -65,6 +52,64 @@ def connect_viam():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@viam_bp.route('/viam/cameras/import', methods=['POST'])
+@jwt_required()
+@require_role(['super_admin', 'admin'])
+def import_viam_cameras():
+    """Create cameras for the robot's camera components in one transaction"""
+    try:
+        data = request.get_json(silent=True) or {}
+        defaults = data.get('defaults') or {}
+        if not isinstance(defaults, dict):
+            return jsonify({'error': 'defaults must be an object'}), 400
+        
+        async def _list_cameras():
+            if not await ensure_viam_connection():
+                return None
+            return get_viam_service().list_camera_resources()
+        
+        # Run async function in event loop
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        resources = loop.run_until_complete(_list_cameras())
+        loop.close()
+        
+        if resources is None:
+            return jsonify({'error': 'Failed to connect to VIAM robot'}), 500
+        if not resources:
+            return jsonify({'results': [], 'created': 0, 'updated': 0, 'failed': 0, 'applied': True})
+        
+        # New cameras are named after their component, existing ones keep their name
+        names = [resource['name'] for resource in resources]
+        existing = {camera_id for camera_id, in db.session.query(Camera.id).filter(Camera.id.in_(names))}
+        cameras = []
+        for resource in resources:
+            camera = {
+                **defaults,
+                'id': resource['name'],
+                'viam_config': {'resource_name': resource['name'], 'namespace': resource['namespace']}
+            }
+            if resource['name'] not in existing:
+                camera.setdefault('name', resource['name'])
+            cameras.append(camera)
+        
+        # Existing cameras keep their settings unless asked to overwrite them
+        try:
+            result = bulk_save_cameras(cameras, on_existing='update' if data.get('update_existing') else 'skip',
+                                       atomic=data.get('atomic', True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result['created'] or result['updated']:
+            get_recording_scheduler().request_run()
+        
+        if not result['applied']:
+            return jsonify(result), 400
+        return jsonify(result), 207 if result['failed'] else 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @viam_bp.route('/viam/disconnect', methods=['POST'])
 @jwt_required()
 @require_role(['super_admin', 'admin'])
@@ -128,8 +173,7 @@ def get_all_cameras_viam_status():
 def get_camera_viam_status(camera_id):
     """Get VIAM status for specific camera"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -158,8 +202,7 @@ def get_camera_viam_status(camera_id):
 def get_camera_image(camera_id):
     """Get image from VIAM camera"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -213,8 +256,7 @@ def get_camera_image(camera_id):
 def detect_objects_in_camera(camera_id):
     """Detect objects in camera image using VIAM vision service"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -252,8 +294,7 @@ def detect_objects_in_camera(camera_id):
 def run_ml_inference_on_camera(camera_id):
     """Run ML model inference on camera image"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -290,8 +331,7 @@ def run_ml_inference_on_camera(camera_id):
 def stream_camera_mjpeg(camera_id):
     """Stream camera images as MJPEG"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -302,6 +342,7 @@ def stream_camera_mjpeg(camera_id):
         
         def generate_mjpeg():
             """Generator function for MJPEG streaming"""
+            last_heartbeat = time.monotonic()
             try:
                 while True:
                     async def _get_frame():
@@ -319,17 +360,23 @@ def stream_camera_mjpeg(camera_id):
                                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
                     else:
                         # Send placeholder frame if camera is not available
-                        import time
                         time.sleep(1)
+                    
+                    if time.monotonic() - last_heartbeat >= STREAM_HEARTBEAT_SECONDS:
+                        touch_stream_session(session_id)
+                        last_heartbeat = time.monotonic()
                         
             except Exception as e:
                 print(f"Error in MJPEG stream: {e}")
                 return
+            finally:
+                # Runs on client disconnect (generator close) as well as on errors
+                close_stream_session(session_id)
         
         # Create stream session
-        session_id = f"{user_id}_{camera_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        session_id = f"{user.id}_{camera_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
         stream_session = StreamSession(
-            user_id=user_id,
+            user_id=user.id,
             camera_id=camera_id,
             session_id=session_id
         )
@@ -337,7 +384,7 @@ def stream_camera_mjpeg(camera_id):
         db.session.commit()
         
         return Response(
-            generate_mjpeg(),
+            stream_with_context(generate_mjpeg()),
             mimetype='multipart/x-mixed-replace; boundary=frame',
             headers={
                 'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -383,8 +430,7 @@ def get_active_stream_sessions():
 def end_stream_session(session_id):
     """End a streaming session"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -396,7 +442,7 @@ def end_stream_session(session_id):
             return jsonify({'error': 'Session not found'}), 404
         
         # Check if user owns the session or is admin
-        if session.user_id != user_id and user.role not in ['super_admin', 'admin']:
+        if session.user_id != user.id and not user.is_admin:
             return jsonify({'error': 'Access denied to this session'}), 403
         
         # End the session
@@ -417,8 +463,7 @@ def end_stream_session(session_id):
 def take_camera_snapshot(camera_id):
     """Take a snapshot from camera and save it"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_access()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -0,0 +1,217 @@
+import os
+import logging
+from functools import wraps
+from typing import Any, Dict, FrozenSet, Optional
+from urllib.parse import urlencode
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from src.models.user import User, db
+from src.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ROLES = ('super_admin', 'admin')
+
+MEDIA_URL_TTL_SECONDS = int(os.getenv('MEDIA_URL_TTL_SECONDS', 600))
+
+
+class UserAccess:
+    """Snapshot of a user's identity and camera permissions"""
+
+    __slots__ = ('id', 'role', 'is_active', 'camera_ids')
+
+    def __init__(self, id: int, role: str, is_active: bool, camera_ids: FrozenSet[str]):
+        self.id = id
+        self.role = role
+        self.is_active = is_active
+        self.camera_ids = camera_ids
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserAccess':
+        return cls(
+            id=user.id,
+            role=user.role,
+            is_active=user.is_active,
+            camera_ids=frozenset(user.get_assigned_cameras())
+        )
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in ADMIN_ROLES
+
+    def has_camera_access(self, camera_id: str) -> bool:
+        """Check if user has access to specific camera"""
+        return self.is_admin or camera_id in self.camera_ids
+
+    def get_assigned_cameras(self):
+        """Get list of assigned camera IDs"""
+        return sorted(self.camera_ids)
+
+
+class AccessService:
+    """Resolves users and their camera permissions with a short-lived cache"""
+
+    def __init__(self):
+        self.cache_ttl_seconds = float(os.getenv('ACCESS_CACHE_TTL_SECONDS', 30))
+        self.max_claim_cameras = int(os.getenv('JWT_CAMERA_ACL_MAX_CAMERAS', 100))
+        self._cache = TTLCache(self.cache_ttl_seconds)
+        
+        # user_id -> current acl_version, or None when the user is deleted or disabled
+        self._acl_versions = TTLCache(self.cache_ttl_seconds)
+
+    def get_user_access(self, user_id: int) -> Optional[UserAccess]:
+        """Get access snapshot for a user, loading it from the database on a miss"""
+        access = self._cache.get(user_id)
+        if access is not None:
+            return access
+
+        user = User.query.get(user_id)
+        if not user:
+            return None
+
+        access = UserAccess.from_user(user)
+        self._cache.set(user_id, access)
+        self._acl_versions.set(user_id, user.acl_version if user.is_active else None)
+        return access
+
+    def build_acl_claims(self, user: User) -> Dict[str, Any]:
+        """Build compact camera ACL claims for an access token"""
+        camera_ids = [] if user.role in ADMIN_ROLES else sorted(user.get_assigned_cameras())
+        if len(camera_ids) > self.max_claim_cameras:
+            # Too large for a header, fall back to database lookups
+            return {}
+
+        return {
+            'cams': camera_ids,
+            'acl_v': user.acl_version
+        }
+
+    def get_access_from_claims(self, user_id: int, claims: Dict[str, Any]) -> Optional[UserAccess]:
+        """Get access snapshot from token claims if the embedded ACL is still current"""
+        if 'acl_v' not in claims or claims['acl_v'] != self.get_acl_version(user_id):
+            return None
+
+        return UserAccess(
+            id=user_id,
+            role=claims.get('role'),
+            is_active=True,
+            camera_ids=frozenset(claims.get('cams', []))
+        )
+
+    def get_acl_version(self, user_id: int) -> Optional[int]:
+        """Get the user's current ACL version, None if the user is revoked"""
+        missing = object()
+        version = self._acl_versions.get(user_id, missing)
+        if version is missing:
+            row = db.session.query(User.acl_version, User.is_active).filter(User.id == user_id).first()
+            version = row.acl_version if row and row.is_active else None
+            self._acl_versions.set(user_id, version)
+        return version
+
+    def invalidate_user(self, user_id: int):
+        """Drop cached permissions after a user is modified"""
+        self._cache.invalidate(user_id)
+        self._acl_versions.invalidate(user_id)
+
+    def invalidate_all(self):
+        """Drop all cached permissions (e.g. after a camera is deleted)"""
+        self._cache.clear()
+        self._acl_versions.clear()
+
+
+# Global access service instance
+access_service = AccessService()
+
+def get_access_service() -> AccessService:
+    """Get the global access service instance"""
+    return access_service
+
+
+# Helpers for use in Flask routes
+def get_current_user_id() -> int:
+    """Get the authenticated user ID from the JWT"""
+    return int(get_jwt_identity())
+
+def get_current_access() -> Optional[UserAccess]:
+    """Get the authenticated user's access snapshot, resolved once per request"""
+    if 'current_access' not in g:
+        user_id = get_current_user_id()
+        
+        # Tokens with a current embedded ACL need no database lookup
+        access = access_service.get_access_from_claims(user_id, get_jwt())
+        if access is None:
+            access = access_service.get_user_access(user_id)
+        
+        # Disabled accounts are treated as revoked
+        g.current_access = access if access and access.is_active else None
+    return g.current_access
+
+def check_camera_access(user, camera_id: str) -> bool:
+    """Check if user has access to specific camera"""
+    return user.has_camera_access(camera_id)
+
+def require_role(allowed_roles):
+    """Decorator to require specific roles"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            claims = get_jwt()
+            user_role = claims.get('role')
+
+            if user_role not in allowed_roles:
+                return jsonify({'error': 'Insufficient permissions'}), 403
+
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Signed media URLs: <video> and EventSource cannot send headers, and the access token must not end up in URLs
+def media_scope(path: str, args) -> str:
+    """Canonical form of a media URL, the resource a signed token is valid for"""
+    params = sorted((key, value) for key, value in args.items(multi=True) if key != 'token')
+    return f'{path}?{urlencode(params)}' if params else path
+
+
+def _media_serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='media-url')
+
+
+def sign_media_url(user_id: int, path: str, args) -> str:
+    """Sign a media URL for one user and one resource, valid for MEDIA_URL_TTL_SECONDS"""
+    token = _media_serializer().dumps({'uid': user_id, 'scope': media_scope(path, args)})
+    params = [(key, value) for key, value in args.items(multi=True) if key != 'token'] + [('token', token)]
+    return f'{path}?{urlencode(params)}'
+
+
+def verify_media_token(token: str) -> Optional[int]:
+    """Get the user a signed token was issued to, if it is valid for the current request"""
+    try:
+        payload = _media_serializer().loads(token, max_age=MEDIA_URL_TTL_SECONDS)
+    except BadSignature:  # Includes expired signatures
+        return None
+    if payload.get('scope') != media_scope(request.path, request.args):
+        return None
+    return payload.get('uid')
+
+
+def media_auth_required(f):
+    """Accept the Authorization header, or a signed ?token= issued for exactly this URL"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        token = request.args.get('token')
+        if token is None:
+            verify_jwt_in_request()
+            return f(*args, **kwargs)
+
+        user_id = verify_media_token(token)
+        if user_id is None:
+            return jsonify({'error': 'Invalid or expired media URL'}), 401
+        access = access_service.get_user_access(user_id)
+        g.current_access = access if access and access.is_active else None
+        return f(*args, **kwargs)
+
+    wrapper.media_url = True  # Lets POST /auth/media-url sign links to this endpoint
+    return wrapper
@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry expiry"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Store value for the given key"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict_expired()
+                if len(self._entries) >= self.max_entries:
+                    # Drop the entry closest to expiry
+                    oldest_key = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest_key]
+
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any], ttl_seconds: Optional[float] = None) -> Any:
+        """Get cached value, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, ttl_seconds)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Remove a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: Tuple):
+        """Remove all tuple keys starting with the given prefix"""
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self):
+        """Drop expired entries (caller holds the lock)"""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,215 @@
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, update
+
+from src.models.user import User, UserCamera, db
+from src.models.camera import Camera, StreamSession
+from src.services.recording_scheduler import validate_schedule
+from src.services.sync_service import bump_collection, record_deletions
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_ITEMS = int(os.getenv('CAMERA_BULK_MAX_ITEMS', 1000))
+
+# Column values for fields a new camera does not specify
+CAMERA_DEFAULTS = {
+    'location': '',
+    'resolution': '1920x1080',
+    'fps': 30,
+    'recording_enabled': True,
+    'ai_analysis_enabled': False,
+    'is_active': True,
+    'storage_quota_gb': None,
+    'recording_schedule': None,
+    'recording_priority': 0,
+    'viam_config': None
+}
+
+
+def _string(data: Dict[str, Any], field: str, max_length: int) -> str:
+    value = data[field]
+    if not isinstance(value, str) or len(value) > max_length:
+        raise ValueError(f'{field} must be a string of at most {max_length} characters')
+    return value
+
+
+def _integer(data: Dict[str, Any], field: str) -> int:
+    try:
+        return int(data[field])
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be an integer')
+
+
+def validate_camera_data(data: Dict[str, Any], creating: bool) -> Dict[str, Any]:
+    """Validate camera fields from a request into column values, raising ValueError if one is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('Camera must be an object')
+
+    values: Dict[str, Any] = {}
+    if creating:
+        for field in ('id', 'name'):
+            if not data.get(field):
+                raise ValueError(f'{field} is required')
+        values['id'] = _string(data, 'id', 50)
+
+    if 'name' in data:
+        if not data['name']:
+            raise ValueError('name is required')
+        values['name'] = _string(data, 'name', 100)
+    if 'location' in data:
+        values['location'] = _string(data, 'location', 200) if data['location'] is not None else ''
+    if 'resolution' in data:
+        values['resolution'] = _string(data, 'resolution', 20)
+    if 'fps' in data:
+        values['fps'] = _integer(data, 'fps')
+        if values['fps'] <= 0:
+            raise ValueError('fps must be positive')
+    for field in ('recording_enabled', 'ai_analysis_enabled', 'is_active'):
+        if field in data:
+            values[field] = bool(data[field])
+    if 'storage_quota_gb' in data:
+        quota = data['storage_quota_gb']
+        try:
+            values['storage_quota_gb'] = float(quota) if quota is not None else None
+        except (TypeError, ValueError):
+            raise ValueError('storage_quota_gb must be a number')
+    if 'recording_priority' in data:
+        values['recording_priority'] = _integer(data, 'recording_priority')
+    if 'recording_schedule' in data:
+        values['recording_schedule'] = validate_schedule(data['recording_schedule'])
+    if 'viam_config' in data:
+        if data['viam_config'] is not None and not isinstance(data['viam_config'], dict):
+            raise ValueError('viam_config must be an object')
+        values['viam_config'] = data['viam_config']
+
+    if creating:
+        values = {**CAMERA_DEFAULTS, **values}
+    return values
+
+
+def bulk_save_cameras(items: List[Dict[str, Any]], on_existing: str = 'error', on_missing: str = 'create',
+                      atomic: bool = True) -> Dict[str, Any]:
+    """Create and update many cameras in one transaction with per-item results
+
+    on_existing is 'error', 'update' or 'skip' and on_missing 'create' or 'error'. With atomic, one
+    invalid item rejects the whole batch.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('cameras must be a non-empty list')
+    if len(items) > BULK_MAX_ITEMS:
+        raise ValueError(f'At most {BULK_MAX_ITEMS} cameras per request')
+
+    ids = [item.get('id') for item in items if isinstance(item, dict) and isinstance(item.get('id'), str)]
+    existing = {camera_id for camera_id, in db.session.query(Camera.id).filter(Camera.id.in_(ids))} if ids else set()
+
+    results = []
+    inserts, updates = [], []
+    seen = set()
+    now = datetime.utcnow()
+    for index, item in enumerate(items):
+        camera_id = item.get('id') if isinstance(item, dict) else None
+        result = {'index': index, 'id': camera_id}
+        results.append(result)
+        try:
+            if not camera_id or not isinstance(camera_id, str):
+                raise ValueError('id is required')
+            if camera_id in seen:
+                raise ValueError('Camera ID appears more than once in the batch')
+            seen.add(camera_id)
+
+            if camera_id in existing:
+                if on_existing == 'error':
+                    raise ValueError('Camera ID already exists')
+                if on_existing == 'skip':
+                    result['status'] = 'skipped'
+                    continue
+                values = validate_camera_data(item, creating=False)
+                values['id'] = camera_id
+                updates.append(values)
+                result['status'] = 'updated'
+            else:
+                if on_missing == 'error':
+                    raise ValueError('Camera not found')
+                values = validate_camera_data(item, creating=True)
+                values['created_at'] = now
+                inserts.append(values)
+                result['status'] = 'created'
+        except ValueError as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    if failed and atomic:
+        for result in results:
+            if result['status'] in ('created', 'updated'):
+                result['status'] = 'rejected'
+        return {'results': results, 'created': 0, 'updated': 0, 'failed': failed, 'applied': False}
+
+    try:
+        if inserts or updates:
+            version = bump_collection(db.session, 'cameras')
+            for values in inserts + updates:
+                values['row_version'] = version
+        if inserts:
+            db.session.execute(insert(Camera), inserts)
+        # Rows with only an id are valid but leave nothing to update
+        changes = [values for values in updates if len(values) > 2]
+        if changes:
+            db.session.execute(update(Camera), changes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Bulk camera save: {len(inserts)} created, {len(updates)} updated, {failed} failed")
+    return {
+        'results': results,
+        'created': len(inserts),
+        'updated': len(updates),
+        'failed': failed,
+        'applied': True
+    }
+
+
+def revoke_camera_assignments(camera_ids) -> None:
+    """Remove the cameras' user assignments and bump those users' ACL version, so tokens embedding them expire"""
+    user_ids = {user_id for user_id, in db.session.query(UserCamera.user_id).filter(
+        UserCamera.camera_id.in_(camera_ids)
+    )}
+    if user_ids:
+        db.session.execute(
+            update(User).where(User.id.in_(user_ids)).values(
+                acl_version=User.acl_version + 1, row_version=bump_collection(db.session, 'users')
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    UserCamera.query.filter(UserCamera.camera_id.in_(camera_ids)).delete(synchronize_session=False)
+
+
+def bulk_delete_cameras(camera_ids: List[str]) -> Dict[str, Any]:
+    """Delete many cameras with their stream sessions and user assignments in one transaction"""
+    if not isinstance(camera_ids, list) or not camera_ids:
+        raise ValueError('ids must be a non-empty list')
+    if len(camera_ids) > BULK_MAX_ITEMS:
+        raise ValueError(f'At most {BULK_MAX_ITEMS} cameras per request')
+
+    requested = [camera_id for camera_id in camera_ids if isinstance(camera_id, str)]
+    existing = {camera_id for camera_id, in db.session.query(Camera.id).filter(Camera.id.in_(requested))}
+
+    try:
+        if existing:
+            record_deletions(db.session, 'cameras', existing)
+            StreamSession.query.filter(StreamSession.camera_id.in_(existing)).delete(synchronize_session=False)
+            revoke_camera_assignments(existing)
+            Camera.query.filter(Camera.id.in_(existing)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    results = [{'id': camera_id, 'status': 'deleted' if camera_id in existing else 'not_found'}
+               for camera_id in camera_ids]
+    return {'results': results, 'deleted': len(existing), 'not_found': len(results) - len(existing)}
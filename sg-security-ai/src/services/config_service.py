@@ -0,0 +1,217 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.models.user import db
+from src.models.camera import SystemConfig
+
+logger = logging.getLogger(__name__)
+
+# Bumped in the same transaction as every change made through the config service
+VERSION_KEY = 'config_version'
+
+# Typed settings: key -> (type, default, description, check). Other SystemConfig rows are read as stored
+CONFIG_OPTIONS: Dict[str, Tuple[type, Any, str, Callable[[Any], bool]]] = {
+    'recording_path': (str, '/home/ubuntu/recordings/', 'Base path for video recordings',
+                       lambda value: bool(value.strip())),
+    'max_recording_size_gb': (int, 100, 'Maximum storage size for recordings in GB',
+                              lambda value: value > 0),
+    'retention_days': (int, 30, 'Number of days to keep recordings',
+                       lambda value: value > 0),
+    'ai_confidence_threshold': (float, 0.8, 'Minimum confidence threshold for AI detections',
+                                lambda value: 0 <= value <= 1)
+}
+
+# Read once at startup: the storage index, journal recovery and eviction all cover a single recording root
+RESTART_REQUIRED = {'recording_path'}
+
+
+def coerce_config_value(key: str, value: Any) -> Any:
+    """Convert a value to its setting's type, raising ValueError if it is invalid"""
+    if key not in CONFIG_OPTIONS:
+        return value
+
+    value_type, _, _, check = CONFIG_OPTIONS[key]
+    # Numbers must be JSON numbers, not strings or booleans
+    valid = (isinstance(value, str) if value_type is str
+             else isinstance(value, (int, float)) and not isinstance(value, bool)
+             and (value_type is float or value == int(value)))
+    if not valid:
+        expected = {str: 'a string', int: 'an integer', float: 'a number'}[value_type]
+        raise ValueError(f'{key} must be {expected}')
+    value = value_type(value)
+
+    if not check(value):
+        raise ValueError(f'Invalid value for {key}: {value}')
+    return value
+
+
+class ConfigService:
+    """In-memory copy of SystemConfig, reloaded within seconds of a change by any process"""
+
+    def __init__(self):
+        self.poll_interval_seconds = float(os.getenv('CONFIG_POLL_SECONDS', 2))
+
+        self.app = None
+        self.version: Optional[int] = None  # Version of the loaded values, None before the first load
+        self.loaded_at: Optional[datetime] = None
+        self._values: Dict[str, Any] = {key: option[1] for key, option in CONFIG_OPTIONS.items()}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def init_app(self, app):
+        """Load the configuration once so reads never have to query the database"""
+        self.app = app
+        with app.app_context():
+            self.load()
+
+    def start(self, app):
+        """Poll the version counter in the background and reload on changes"""
+        self.app = app
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='config-poller', daemon=True)
+        self._thread.start()
+        logger.info(f"Started config poller, interval={self.poll_interval_seconds}s")
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _worker(self):
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Error polling configuration: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a config value from memory (no database access, safe in per-frame loops)"""
+        return self._values.get(key, default)
+
+    def get_all(self) -> Dict[str, Any]:
+        """Get a copy of every loaded config value"""
+        return dict(self._values)
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener with the changed keys and their new values after every reload that changes something"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def refresh(self) -> bool:
+        """Reload if another process or request changed the configuration (requires an app context)"""
+        version = db.session.query(SystemConfig.value).filter_by(key=VERSION_KEY).scalar()
+        if version == self.version:
+            return False
+        self.load()
+        return True
+
+    def load(self) -> Dict[str, Any]:
+        """Read every SystemConfig row, notify listeners and return the changed values (requires an app context)"""
+        with self._lock:
+            version = None
+            values = {key: option[1] for key, option in CONFIG_OPTIONS.items()}
+            for config in SystemConfig.query.all():
+                if config.key == VERSION_KEY:
+                    version = config.get_value()
+                    continue
+                try:
+                    values[config.key] = coerce_config_value(config.key, config.get_value())
+                except ValueError as e:
+                    logger.warning(f"Ignoring stored config value: {e}")
+
+            changed = {key: value for key, value in values.items()
+                       if key not in self._values or self._values[key] != value}
+            first_load = self.loaded_at is None
+
+            # Readers never lock, they see either the old or the new dict
+            self._values = values
+            self.version = version
+            self.loaded_at = datetime.utcnow()
+
+        if changed and not first_load:
+            logger.info(f"Configuration changed (version {version}): {sorted(changed)}")
+            for listener in list(self._listeners):
+                try:
+                    listener(changed)
+                except Exception as e:
+                    logger.error(f"Error applying configuration change: {e}")
+        return changed
+
+    def set_values(self, values: Dict[str, Any], user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Validate and store settings, bump the version and reload (requires an app context)"""
+        unknown = [key for key in values if key not in CONFIG_OPTIONS]
+        if unknown:
+            raise ValueError(f"Unknown config key '{unknown[0]}'")
+        values = {key: coerce_config_value(key, value) for key, value in values.items()}
+        for key in RESTART_REQUIRED & values.keys():
+            if values[key] != self._values.get(key):
+                raise ValueError(f'{key} cannot be changed while the server is running, '
+                                 'update it in the database and restart')
+
+        now = datetime.utcnow()
+        try:
+            # The row lock keeps concurrent writers from handing out the same version
+            version_row = SystemConfig.query.filter_by(key=VERSION_KEY).with_for_update().first()
+            if not version_row:
+                version_row = SystemConfig(key=VERSION_KEY, description='Bumped on every configuration change')
+                db.session.add(version_row)
+
+            existing = {config.key: config for config in SystemConfig.query.filter(
+                SystemConfig.key.in_(list(values))
+            )}
+            for key, value in values.items():
+                config = existing.get(key)
+                if not config:
+                    config = SystemConfig(key=key, description=CONFIG_OPTIONS[key][2])
+                    db.session.add(config)
+                config.set_value(value)
+                config.updated_at = now
+                config.updated_by = user_id
+
+            version_row.set_value((version_row.get_value() or 0) + 1)
+            version_row.updated_at = now
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.load()
+        return {key: self._values[key] for key in values}
+
+    def ensure_defaults(self):
+        """Create rows for typed settings that are missing from the database (requires an app context)"""
+        existing = {key for key, in db.session.query(SystemConfig.key)}
+        for key in CONFIG_OPTIONS:
+            if key not in existing:
+                _, default, description, _ = CONFIG_OPTIONS[key]
+                db.session.add(SystemConfig(key=key, value=default, description=description))
+        db.session.commit()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get the loaded version and when it was read"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'poll_interval_seconds': self.poll_interval_seconds,
+            'polling': bool(self._thread and self._thread.is_alive())
+        }
+
+
+# Global config service instance
+config_service = ConfigService()
+
+def get_config_service() -> ConfigService:
+    """Get the global config service instance"""
+    return config_service
@@ -0,0 +1,309 @@
+import os
+import json
+import queue
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Optional, Set
+
+from sqlalchemy import delete, event, func, insert, or_, select
+
+from src.models.user import AIEvent, PushEvent, Recording, db
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('camera_status', 'recording', 'ai_event')
+
+
+class EventBusFull(Exception):
+    """Raised when the subscriber limit is reached"""
+
+
+class Subscription:
+    """One connected client: a bounded queue of events it is allowed to see"""
+
+    def __init__(self, is_admin: bool, camera_ids: FrozenSet[str], cameras: Optional[Set[str]],
+                 types: Optional[Set[str]], max_queue: int):
+        self.is_admin = is_admin
+        self.camera_ids = camera_ids  # The user's camera ACL, refreshed while connected
+        self.cameras = cameras  # Optional filter requested by the client
+        self.types = types
+        self.dropped = 0
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(max_queue)
+
+    def accepts(self, event: Dict[str, Any]) -> bool:
+        camera_id = event['camera_id']
+        if self.types is not None and event['type'] not in self.types:
+            return False
+        if self.cameras is not None and camera_id not in self.cameras:
+            return False
+        return self.is_admin or camera_id in self.camera_ids
+
+    def put(self, event: Dict[str, Any]):
+        """Queue an event, dropping the oldest one if the client is not keeping up"""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Fan-out of camera, recorder and AI events to push subscribers, shared by all workers through the database"""
+
+    def __init__(self):
+        self.max_subscribers = int(os.getenv('EVENT_MAX_SUBSCRIBERS', 200))
+        self.max_queue = int(os.getenv('EVENT_QUEUE_SIZE', 100))
+        self.heartbeat_seconds = float(os.getenv('EVENT_HEARTBEAT_SECONDS', 15))
+        self.retry_ms = int(os.getenv('EVENT_RETRY_MS', 3000))  # Client reconnect delay
+        self.acl_refresh_seconds = float(os.getenv('EVENT_ACL_REFRESH_SECONDS', 15))
+        self.offline_failures = int(os.getenv('CAMERA_OFFLINE_FAILURES', 3))  # Failed frames before offline
+        self.poll_interval_seconds = float(os.getenv('EVENT_POLL_SECONDS', 0.5))
+        self.retention_seconds = float(os.getenv('EVENT_RETENTION_SECONDS', 3600))
+        # IDs can commit out of order on server databases, a skipped ID is looked for again this long
+        self.gap_seconds = float(os.getenv('EVENT_GAP_SECONDS', 5))
+
+        self.app = None
+        self._engine = None  # Set by start(), until then events stay within this process
+        self._last_id = 0
+        self._missing: Dict[int, float] = {}  # Skipped event ID -> monotonic deadline
+        self._published = 0
+        self._history: deque = deque(maxlen=int(os.getenv('EVENT_HISTORY_SIZE', 500)))  # Replay buffer
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+        self._camera_states: Dict[str, str] = {}  # From the camera_status events of every worker
+        self._camera_online: Dict[str, bool] = {}  # As last reported by this process
+        self._camera_failures: Dict[str, int] = {}
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._next_prune = 0.0
+
+    def start(self, app):
+        """Load recent events and deliver the events every worker publishes from now on"""
+        self.app = app
+        with app.app_context():
+            self._engine = db.engine
+            if self._thread and self._thread.is_alive():
+                return
+            self._load_recent()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='event-bus', daemon=True)
+        self._thread.start()
+        logger.info(f"Started event bus, poll interval={self.poll_interval_seconds}s")
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _worker(self):
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            try:
+                self.poll()
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + 60
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Error polling push events: {e}")
+
+    def _load_recent(self):
+        """Fill the replay buffer and the camera states, without delivering anything"""
+        table = PushEvent.__table__
+        latest_status = select(func.max(table.c.id)).where(
+            table.c.event_type == 'camera_status'
+        ).group_by(table.c.camera_id)
+        with self._engine.connect() as connection:
+            rows = connection.execute(select(table).order_by(table.c.id.desc()).limit(self._history.maxlen)).all()
+            states = connection.execute(select(table.c.camera_id, table.c.data).where(table.c.id.in_(latest_status)))
+
+            with self._lock:
+                self._history.clear()
+                self._history.extend(self._to_event(row) for row in reversed(rows))
+                self._last_id = rows[0].id if rows else 0
+                self._camera_states = {camera_id: data['status'] for camera_id, data in states}
+
+    def poll(self) -> int:
+        """Deliver the events published since the last poll, by any worker"""
+        table = PushEvent.__table__
+        with self._lock:
+            now = time.monotonic()
+            self._missing = {event_id: deadline for event_id, deadline in self._missing.items() if deadline > now}
+            condition = table.c.id > self._last_id
+            if self._missing:
+                condition = or_(condition, table.c.id.in_(list(self._missing)))
+
+        with self._engine.connect() as connection:
+            rows = connection.execute(select(table).where(condition).order_by(table.c.id).limit(1000)).all()
+
+        for row in rows:
+            with self._lock:
+                if self._missing.pop(row.id, None) is None:
+                    if row.id - self._last_id - 1 <= 1000:  # Larger jumps are sequence gaps, not open transactions
+                        deadline = time.monotonic() + self.gap_seconds
+                        self._missing.update((event_id, deadline) for event_id in range(self._last_id + 1, row.id))
+                    self._last_id = max(self._last_id, row.id)
+            self._deliver(self._to_event(row))
+        return len(rows)
+
+    def prune(self):
+        """Delete expired events, keeping the last status of every camera for new workers"""
+        table = PushEvent.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        latest_status = select(func.max(table.c.id)).where(
+            table.c.event_type == 'camera_status'
+        ).group_by(table.c.camera_id)
+        with self._engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.created_at < cutoff, table.c.id.not_in(latest_status)))
+
+    @staticmethod
+    def _to_event(row) -> Dict[str, Any]:
+        return {
+            'id': str(row.id),
+            'sequence': row.id,
+            'type': row.event_type,
+            'camera_id': row.camera_id,
+            'data': row.data,
+            'timestamp': row.created_at.isoformat()
+        }
+
+    def subscribe(self, is_admin: bool, camera_ids: FrozenSet[str], cameras: Optional[Set[str]] = None,
+                  types: Optional[Set[str]] = None, last_event_id: Optional[str] = None) -> Subscription:
+        """Register a subscriber, queueing the events it missed since last_event_id if they are still held"""
+        subscription = Subscription(is_admin, camera_ids, cameras, types, self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise EventBusFull('Too many event subscribers')
+            self._subscribers.add(subscription)
+
+            # IDs come from the shared table, so a client may reconnect to any worker
+            if last_event_id and last_event_id.isdigit():
+                for missed in self._history:
+                    if missed['sequence'] > int(last_event_id) and subscription.accepts(missed):
+                        subscription.put(missed)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, camera_id: str, data: Dict[str, Any]):
+        """Publish an event to the subscribers of every worker (never blocks on slow subscribers)"""
+        data = json.loads(json.dumps(data, default=str))
+        self._published += 1
+        if self._engine is None:
+            # Not started (tests, CLI tools): no other worker to reach and nothing to replay
+            self._deliver({'id': None, 'sequence': 0, 'type': event_type, 'camera_id': camera_id,
+                           'data': data, 'timestamp': datetime.utcnow().isoformat()})
+            return
+
+        with self._engine.begin() as connection:
+            connection.execute(insert(PushEvent.__table__).values(
+                event_type=event_type, camera_id=camera_id, data=data, created_at=datetime.utcnow()
+            ))
+
+    def _deliver(self, event: Dict[str, Any]):
+        """Queue an event for every local subscriber allowed to see the camera"""
+        with self._lock:
+            if event['id'] is not None:
+                self._history.append(event)
+            if event['type'] == 'camera_status':
+                self._camera_states[event['camera_id']] = event['data']['status']
+            subscribers = [subscription for subscription in self._subscribers if subscription.accepts(event)]
+
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def report_camera_frame(self, camera_id: str, ok: bool):
+        """Track a camera's frame fetches and publish when it goes online or offline"""
+        with self._lock:
+            if ok:
+                self._camera_failures[camera_id] = 0
+                online = True
+            else:
+                failures = self._camera_failures.get(camera_id, 0) + 1
+                self._camera_failures[camera_id] = failures
+                if failures < self.offline_failures and camera_id in self._camera_online:
+                    return
+                online = False
+            if self._camera_online.get(camera_id) == online:
+                return
+            self._camera_online[camera_id] = online
+
+        self.publish('camera_status', camera_id, {'status': 'online' if online else 'offline'})
+
+    def get_camera_states(self) -> Dict[str, str]:
+        """Last known status of every camera, as reported by any worker"""
+        with self._lock:
+            return dict(self._camera_states)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self._published,
+                'last_event_id': self._last_id,
+                'dropped': sum(subscription.dropped for subscription in self._subscribers)
+            }
+
+
+# AIEvents are published once their transaction commits, wherever they are created
+_PENDING_KEY = 'pending_ai_events'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_ai_events(session, flush_context):
+    events = [obj for obj in session.new if isinstance(obj, AIEvent)]
+    if not events:
+        return
+    cameras = dict(session.execute(
+        select(Recording.id, Recording.camera_id).where(Recording.id.in_({obj.recording_id for obj in events}))
+    ).all())
+    session.info.setdefault(_PENDING_KEY, []).extend(
+        (cameras.get(obj.recording_id), obj.to_dict()) for obj in events
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_ai_events(session):
+    for camera_id, data in session.info.pop(_PENDING_KEY, []):
+        if camera_id:
+            event_bus.publish('ai_event', camera_id, data)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_ai_events(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Global event bus instance
+event_bus = EventBus()
+
+def get_event_bus() -> EventBus:
+    """Get the global event bus instance"""
+    return event_bus
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an event as a server-sent events message"""
+    payload = {key: event[key] for key in ('camera_id', 'data', 'timestamp')}
+    message = f"event: {event['type']}\ndata: {json.dumps(payload, default=str)}\n\n"
+    # An empty id would reset the client's Last-Event-ID, so events that cannot be replayed have none
+    return f"id: {event['id']}\n{message}" if event.get('id') else message
@@ -0,0 +1,215 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.services.recording_service import get_recording_service
+
+logger = logging.getLogger(__name__)
+
+
+class ExportError(Exception):
+    """Raised when a clip cannot be exported, with the HTTP status to report"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def segment_format(segment: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+    """Resolution and writer frame rate of a segment, as recorded when it was written or archived"""
+    metadata = segment.get('metadata') or {}
+    fps = metadata.get('fps')
+    return metadata.get('resolution'), round(fps, 2) if fps else None
+
+
+class ClipExport:
+    """A running export, streamed from ffmpeg's stdout"""
+
+    def __init__(self, service: 'ExportService', camera_id: str, start: datetime, end: datetime,
+                 segments: List[Dict[str, Any]], name: Optional[str] = None,
+                 output_format: Optional[Tuple[int, int, float]] = None):
+        self.service = service
+        self.name = name
+        self.output_format = output_format  # (width, height, fps) to re-encode to, None to stream copy
+        self.camera_id = camera_id
+        self.start = start
+        self.end = end
+        self.segments = segments
+        self.process: Optional[subprocess.Popen] = None
+        self.list_path: Optional[str] = None
+        self.stderr_file = None
+        self._closed = False
+
+    @property
+    def filename(self) -> str:
+        if self.name:
+            return self.name
+        return f"{self.camera_id}_{self.start.strftime('%Y%m%d_%H%M%S')}_{self.end.strftime('%Y%m%d_%H%M%S')}.mp4"
+
+    def _write_concat_list(self) -> str:
+        """Write an ffmpeg concat list that trims the first and last segment"""
+        fd, path = tempfile.mkstemp(prefix='export_', suffix='.txt', dir=self.service.temp_path)
+        with os.fdopen(fd, 'w') as f:
+            f.write('ffconcat version 1.0\n')
+            for segment in self.segments:
+                escaped = segment['file_path'].replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+                if segment['start_offset_seconds'] > 0:
+                    f.write(f"inpoint {segment['start_offset_seconds']:.3f}\n")
+                if segment['end_offset_seconds'] < segment['duration']:
+                    f.write(f"outpoint {segment['end_offset_seconds']:.3f}\n")
+        return path
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Run ffmpeg and yield the fragmented MP4 as it is produced"""
+        self.list_path = self._write_concat_list()
+        command = [
+            self.service.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-f', 'concat', '-safe', '0', '-i', self.list_path,
+            *self._codec_arguments(),
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-f', 'mp4', 'pipe:1'
+        ]
+        # ffmpeg's errors go to a file: a full stderr pipe nobody reads would block it, and this request with it
+        self.stderr_file = tempfile.TemporaryFile(dir=self.service.temp_path)
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=self.stderr_file)
+
+        try:
+            while True:
+                chunk = self.process.stdout.read(self.service.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+            if self.process.wait() != 0:
+                self.stderr_file.seek(0)
+                error = self.stderr_file.read().decode('utf-8', 'replace').strip()[-4000:]
+                logger.error(f"ffmpeg export of {self.camera_id} failed: {error}")
+        finally:
+            self.close()
+
+    def _codec_arguments(self) -> List[str]:
+        if self.output_format is None:
+            return ['-c', 'copy']  # Stream copy, cuts land on the nearest preceding keyframe
+
+        # Segments differ in size or rate (quality degradation, archive tier), scale all to one format
+        width, height, fps = self.output_format
+        video_filter = (f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+                        f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,fps={fps:g}')
+        return ['-vf', video_filter, '-c:v', 'libx264', '-preset', self.service.reencode_preset,
+                '-pix_fmt', 'yuv420p', '-an']
+
+    def close(self):
+        """Stop ffmpeg and release the export slot (safe to call more than once)"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.stderr_file:
+            self.stderr_file.close()
+        if self.list_path:
+            try:
+                os.remove(self.list_path)
+            except OSError:
+                pass
+        self.service._slots.release()
+
+
+class ExportService:
+    """Exports time-range clips by concatenating segments with ffmpeg, re-encoding only mixed formats"""
+
+    def __init__(self):
+        self.ffmpeg_path = os.getenv('FFMPEG_PATH', 'ffmpeg')
+        self.max_duration_seconds = int(os.getenv('EXPORT_MAX_DURATION_SECONDS', 4 * 3600))
+        self.max_concurrent = int(os.getenv('EXPORT_MAX_CONCURRENT', 2))
+        self.chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 256 * 1024))
+        self.reencode_preset = os.getenv('EXPORT_REENCODE_PRESET', 'veryfast')
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+
+    @property
+    def temp_path(self) -> str:
+        return os.path.join(get_recording_service().base_recording_path, 'temp')
+
+    def is_available(self) -> bool:
+        """Check if the ffmpeg binary is installed"""
+        return shutil.which(self.ffmpeg_path) is not None
+
+    def create_export(self, camera_id: str, start: datetime, end: datetime) -> ClipExport:
+        """Resolve the segments of a clip and reserve an export slot"""
+        if (end - start).total_seconds() > self.max_duration_seconds:
+            raise ExportError(f'Clips are limited to {self.max_duration_seconds} seconds')
+
+        if not self.is_available():
+            raise ExportError('Clip export requires ffmpeg to be installed', 503)
+
+        segments = [
+            segment for segment in get_recording_service().find_segments(camera_id, start, end)
+            if os.path.exists(segment['file_path'])
+        ]
+        if not segments:
+            raise ExportError('No recordings found for this time range', 404)
+
+        return self._reserve(camera_id, start, end, segments)
+
+    def create_recording_export(self, recording) -> ClipExport:
+        """Join every segment of a recording into one MP4, without the clip duration limit"""
+        if not self.is_available():
+            raise ExportError('Joining recording segments requires ffmpeg to be installed', 503)
+
+        segments = []
+        for segment in recording.segments:
+            if not os.path.exists(segment.file_path):
+                raise ExportError(f'Segment {segment.segment_number} of this recording is missing', 404)
+            data = segment.to_dict()
+            data.update(segment.get_offsets(segment.start_time, segment.end_time))
+            segments.append(data)
+        if not segments:
+            raise ExportError('Recording has no segments', 404)
+
+        start = recording.segments[0].start_time
+        end = recording.segments[-1].end_time
+        return self._reserve(recording.camera_id, start, end, segments,
+                             recording.filename or f'recording_{recording.id}.mp4')
+
+    def _output_format(self, start: datetime, end: datetime,
+                       segments: List[Dict[str, Any]]) -> Optional[Tuple[int, int, float]]:
+        """Format to re-encode to when the segments cannot be stream copied together, None if they can"""
+        formats = {segment_format(segment) for segment in segments}
+        if len(formats) == 1:
+            return None
+
+        # Re-encoding costs CPU for the whole clip, so it is bounded like clip exports even for recordings
+        if (end - start).total_seconds() > self.max_duration_seconds:
+            raise ExportError('These segments were recorded at different resolutions or frame rates and are '
+                              f'too long to re-encode (limit {self.max_duration_seconds} seconds)', 409)
+
+        sizes = [tuple(int(value) for value in resolution.split('x')) for resolution, _ in formats if resolution]
+        if not sizes:
+            raise ExportError('The resolution of these segments is unknown, they cannot be joined', 409)
+        width, height = max(sizes)
+        fps = max((fps for _, fps in formats if fps), default=10)
+        return width - width % 2, height - height % 2, fps  # libx264 needs even dimensions
+
+    def _reserve(self, camera_id: str, start: datetime, end: datetime, segments: List[Dict[str, Any]],
+                 name: Optional[str] = None) -> ClipExport:
+        output_format = self._output_format(start, end, segments)
+        if not self._slots.acquire(blocking=False):
+            raise ExportError('Too many exports in progress, try again later', 429)
+
+        return ClipExport(self, camera_id, start, end, segments, name, output_format)
+
+
+# Global export service instance
+export_service = ExportService()
+
+def get_export_service() -> ExportService:
+    """Get the global export service instance"""
+    return export_service
@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many hashing requests are already queued"""
+
+
+def _pool_context():
+    """Start pool workers from a clean process instead of forking the threaded app"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# Worker functions run in the process pool, so they must stay importable without Flask
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check_password(password: bytes, password_hash: bytes) -> bool:
+    return bcrypt.checkpw(password, password_hash)
+
+
+class PasswordService:
+    """Runs bcrypt hashing in a bounded process pool off the request threads"""
+
+    def __init__(self):
+        self.bcrypt_rounds = int(os.getenv('BCRYPT_ROUNDS', 12))
+        self.max_workers = int(os.getenv('PASSWORD_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_queue = int(os.getenv('PASSWORD_QUEUE_LIMIT', 32))
+        self.queue_timeout_seconds = float(os.getenv('PASSWORD_QUEUE_TIMEOUT_SECONDS', 0.5))
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, self.max_workers) + self.max_queue)
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Create the process pool on first use (PASSWORD_WORKERS=0 runs inline)"""
+        if self.max_workers <= 0:
+            return None
+
+        with self._executor_lock:
+            if self._executor is None:
+                # Forked children could inherit locks held by the recorder and poller threads
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context())
+                logger.info(f"Started password hashing pool with {self.max_workers} workers")
+            return self._executor
+
+    def _run(self, fn, *args):
+        """Run a hashing function in the pool, rejecting work beyond the queue limit"""
+        if not self._slots.acquire(timeout=self.queue_timeout_seconds):
+            raise PasswordServiceBusy('Too many password operations in progress')
+
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return fn(*args)
+            return executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash_password(self, password: str) -> str:
+        """Hash a password with the configured bcrypt cost"""
+        return self._run(_hash_password, password.encode('utf-8'), self.bcrypt_rounds).decode('utf-8')
+
+    def hash_passwords(self, passwords: List[str]) -> List[str]:
+        """Hash many passwords in parallel across the pool, in order"""
+        if not self._slots.acquire(timeout=self.queue_timeout_seconds):
+            raise PasswordServiceBusy('Too many password operations in progress')
+
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return [_hash_password(password.encode('utf-8'), self.bcrypt_rounds).decode('utf-8')
+                        for password in passwords]
+
+            # Submit one job per worker at a time so logins queue behind a few hashes, not the whole batch
+            hashes: List[str] = []
+            for start in range(0, len(passwords), self.max_workers):
+                futures = [
+                    executor.submit(_hash_password, password.encode('utf-8'), self.bcrypt_rounds)
+                    for password in passwords[start:start + self.max_workers]
+                ]
+                hashes.extend(future.result().decode('utf-8') for future in futures)
+            return hashes
+        finally:
+            self._slots.release()
+
+    def verify_password(self, password: str, password_hash: str) -> bool:
+        """Check a password against a bcrypt hash"""
+        return self._run(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Check if a hash was made with a different cost than configured"""
+        try:
+            # Hash format: $2b$<rounds>$<salt+hash>
+            return int(password_hash.split('$')[2]) != self.bcrypt_rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global password service instance
+password_service = PasswordService()
+
+def get_password_service() -> PasswordService:
+    """Get the global password service instance"""
+    return password_service
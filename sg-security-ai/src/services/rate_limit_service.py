@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+
+class RateLimiter:
+    """Sliding-window counter of events per key"""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._events: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, key: Hashable, now: float) -> Deque[float]:
+        """Drop events outside the window (caller holds the lock)"""
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+
+        while events and events[0] <= now - self.window_seconds:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def retry_after(self, key: Hashable) -> Optional[int]:
+        """Seconds until the key may be used again, None if under the limit"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._prune(key, now)
+            if len(events) < self.limit:
+                return None
+            return max(1, int(events[0] + self.window_seconds - now) + 1)
+
+    def hit(self, key: Hashable):
+        """Record an event for the key"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(key, now)
+            self._events.setdefault(key, deque()).append(now)
+
+    def reset(self, key: Hashable):
+        """Forget all events for the key"""
+        with self._lock:
+            self._events.pop(key, None)
+
+
+class LoginThrottle:
+    """Per-IP and per-account limits for login attempts"""
+
+    def __init__(self):
+        self.ip_limiter = RateLimiter(
+            limit=int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 20)),
+            window_seconds=float(os.getenv('LOGIN_RATE_WINDOW_SECONDS', 60))
+        )
+        self.account_limiter = RateLimiter(
+            limit=int(os.getenv('LOGIN_MAX_FAILURES_PER_ACCOUNT', 5)),
+            window_seconds=float(os.getenv('LOGIN_FAILURE_WINDOW_SECONDS', 900))
+        )
+
+    @staticmethod
+    def account_key(user_id: Optional[int], identifier: str) -> str:
+        """Key failures by account, so its username and email share one budget, or by the normalized identifier"""
+        return f'user:{user_id}' if user_id is not None else f'name:{identifier.strip().lower()}'
+
+    def check(self, ip_address: str, account_key: str) -> Optional[int]:
+        """Get Retry-After seconds if the IP or account is throttled"""
+        ip_retry = self.ip_limiter.retry_after(ip_address)
+        account_retry = self.account_limiter.retry_after(account_key)
+        return max(ip_retry or 0, account_retry or 0) or None
+
+    def record_attempt(self, ip_address: str):
+        """Count a login attempt from an IP"""
+        self.ip_limiter.hit(ip_address)
+
+    def record_failure(self, account_key: str):
+        """Count a failed login for an account"""
+        self.account_limiter.hit(account_key)
+
+    def record_success(self, account_key: str):
+        """Clear failed logins for an account"""
+        self.account_limiter.reset(account_key)
+
+
+# Global login throttle instance
+login_throttle = LoginThrottle()
+
+def get_login_throttle() -> LoginThrottle:
+    """Get the global login throttle instance"""
+    return login_throttle
@@ -0,0 +1,135 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from src.models.camera import Camera
+from src.services.recording_service import QUALITY_LEVELS
+from src.services.storage_service import get_storage_accountant
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingGovernor:
+    """Lowers recording fps and resolution under CPU, encoder or disk pressure, lowest priority cameras first"""
+
+    def __init__(self):
+        self.interval_seconds = float(os.getenv('RECORDING_GOVERNOR_INTERVAL_SECONDS', 10))
+        self.cpu_high = float(os.getenv('RECORDING_CPU_HIGH', 0.9))  # Load average per core
+        self.cpu_low = float(os.getenv('RECORDING_CPU_LOW', 0.6))
+        self.load_high = float(os.getenv('RECORDING_LOAD_HIGH', 1.0))  # Share of the frame interval spent working
+        self.load_low = float(os.getenv('RECORDING_LOAD_LOW', 0.7))
+
+        self.app = None
+        self.recording_service = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, app, recording_service):
+        """Start watching recording pressure in the background"""
+        self.app = app
+        self.recording_service = recording_service
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='recording-governor', daemon=True)
+        self._thread.start()
+        logger.info(f"Started recording governor, interval={self.interval_seconds}s")
+
+    def stop(self):
+        """Stop the governor thread (recordings keep their current quality)"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _worker(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Error in recording governor: {e}")
+
+    def _cpu_load(self) -> Optional[float]:
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return None  # Not available on this platform
+
+    def get_pressure(self) -> Dict[str, Any]:
+        """Measure CPU load, the busiest recorder's load and free disk space"""
+        service = self.recording_service
+        free_bytes = get_storage_accountant().get_free_bytes(service.base_recording_path)
+        loads = [session['load'] for session in list(service.recording_sessions.values())]
+        return {
+            'cpu': self._cpu_load(),
+            'encoder': max(loads, default=0.0),
+            'free_gb': free_bytes / (1024**3),
+            'required_free_gb': service.get_required_free_gb()
+        }
+
+    def run_once(self) -> Dict[str, Any]:
+        """Take one degradation step up or down and spread it over cameras by priority (requires an app context)"""
+        service = self.recording_service
+        sessions = dict(service.recording_sessions)
+        pressure = self.get_pressure()
+
+        reasons = []
+        if pressure['cpu'] is not None and pressure['cpu'] > self.cpu_high:
+            reasons.append('cpu')
+        if pressure['encoder'] > self.load_high:
+            reasons.append('encoder')
+        if pressure['free_gb'] < pressure['required_free_gb']:
+            reasons.append('disk')
+
+        # Hysteresis: restore quality only once every signal is comfortably below its limit
+        relieved = (not reasons
+                    and (pressure['cpu'] is None or pressure['cpu'] < self.cpu_low)
+                    and pressure['encoder'] < self.load_low
+                    and pressure['free_gb'] > pressure['required_free_gb'] * 1.2)
+
+        current = sum(session['quality_level'] for session in sessions.values())
+        max_level = len(QUALITY_LEVELS) - 1
+        if reasons:
+            steps = min(current + 1, max_level * len(sessions))
+        elif relieved:
+            steps = max(current - 1, 0)
+        else:
+            steps = current
+
+        if steps != current:
+            # Lowest priority cameras are degraded first and restored last
+            priorities = dict(Camera.query.with_entities(Camera.id, Camera.recording_priority).filter(
+                Camera.id.in_(list(sessions))
+            ).all())
+            reason = ','.join(reasons) or None
+            remaining = steps
+            for camera_id in sorted(sessions, key=lambda camera_id: (priorities.get(camera_id) or 0, camera_id)):
+                level = min(remaining, max_level)
+                remaining -= level
+                previous = sessions[camera_id]['quality_level']
+                service.set_recording_quality(
+                    camera_id, level, reason if level > previous else sessions[camera_id]['quality_reason']
+                )
+
+        self.last_result = {
+            'pressure': pressure,
+            'reasons': reasons,
+            'degradation_steps': steps,
+            'levels': {camera_id: session['quality_level'] for camera_id, session in sessions.items()},
+            'ran_at': datetime.utcnow().isoformat()
+        }
+        return self.last_result
+
+
+# Global recording governor instance
+recording_governor = RecordingGovernor()
+
+def get_recording_governor() -> RecordingGovernor:
+    """Get the global recording governor instance"""
+    return recording_governor
@@ -0,0 +1,214 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from src.models.camera import Camera
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_time(value: Any) -> int:
+    """Parse 'HH:MM' into minutes since midnight ('24:00' ends a window at midnight)"""
+    try:
+        hours, minutes = (int(part) for part in str(value).split(':'))
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    return hours * 60 + minutes
+
+
+def _parse_fps(value: Any, field: str) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0 or value > 60:
+        raise ValueError(f'{field} must be a number between 0 and 60')
+    return value
+
+
+# A schedule lists weekly windows, each recorded at its own fps (or the default), and the fps
+# for the rest of the week (None to not record outside the windows). Days are 0 (Monday) to 6,
+# a window that ends before it starts runs past midnight:
+#   {"timezone": "Europe/Rome", "off_hours_fps": 2,
+#    "windows": [{"days": [0, 1, 2, 3, 4], "start": "08:00", "end": "18:00", "fps": 10}]}
+def validate_schedule(schedule: Any) -> Optional[Dict[str, Any]]:
+    """Validate and normalize a camera's recording schedule, raising ValueError if it is malformed"""
+    if schedule is None:
+        return None
+    if not isinstance(schedule, dict):
+        raise ValueError('recording_schedule must be an object')
+
+    timezone = schedule.get('timezone')
+    if timezone:
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone '{timezone}'")
+
+    windows = schedule.get('windows') or []
+    if not isinstance(windows, list):
+        raise ValueError('recording_schedule.windows must be a list')
+
+    normalized = []
+    for window in windows:
+        if not isinstance(window, dict):
+            raise ValueError('Each schedule window must be an object')
+        days = window.get('days', list(range(7)))
+        if (not isinstance(days, list) or not days
+                or any(isinstance(day, bool) or day not in range(7) for day in days)):
+            raise ValueError('Window days must be a list of weekdays from 0 (Monday) to 6')
+        start, end = _parse_time(window.get('start')), _parse_time(window.get('end'))
+        if start == end:
+            raise ValueError('Window start and end must differ')
+        normalized.append({
+            'days': sorted(set(days)),
+            'start': window['start'],
+            'end': window['end'],
+            'fps': _parse_fps(window.get('fps'), 'Window fps')
+        })
+
+    return {
+        'timezone': timezone or None,
+        'windows': normalized,
+        'off_hours_fps': _parse_fps(schedule.get('off_hours_fps'), 'off_hours_fps')
+    }
+
+
+def planned_fps(schedule: Optional[Dict[str, Any]], now: datetime, default_fps: float) -> Optional[float]:
+    """Get the fps a schedule asks for at a UTC time, or None if the camera should not record"""
+    if not schedule:
+        return default_fps
+
+    if schedule.get('timezone'):
+        now = now.replace(tzinfo=ZoneInfo('UTC')).astimezone(ZoneInfo(schedule['timezone']))
+    weekday = now.weekday()
+    minute = now.hour * 60 + now.minute
+
+    for window in schedule.get('windows') or []:
+        start, end = _parse_time(window['start']), _parse_time(window['end'])
+        if start < end:
+            active = weekday in window['days'] and start <= minute < end
+        else:
+            # Runs past midnight, so the early hours belong to the previous day's window
+            active = ((weekday in window['days'] and minute >= start)
+                      or ((weekday - 1) % 7 in window['days'] and minute < end))
+        if active:
+            return window.get('fps') or default_fps
+
+    return schedule.get('off_hours_fps')
+
+
+class RecordingScheduler:
+    """Keeps recorders running for enabled cameras according to their schedules"""
+
+    def __init__(self):
+        self.interval_seconds = float(os.getenv('RECORDING_SCHEDULER_INTERVAL_SECONDS', 30))
+        self.stall_seconds = float(os.getenv('RECORDING_STALL_SECONDS', 120))
+
+        self.app = None
+        self.recording_service = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def start(self, app, recording_service):
+        """Start recorders for enabled cameras now, then follow their schedules"""
+        self.app = app
+        self.recording_service = recording_service
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='recording-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Started recording scheduler, interval={self.interval_seconds}s")
+
+    def stop(self):
+        """Stop the scheduler thread (running recordings are left alone)"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def request_run(self):
+        """Apply changed camera settings without waiting for the next pass"""
+        self._wake_event.set()
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Error in recording scheduler: {e}")
+
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+
+    def run_once(self) -> Dict[str, Any]:
+        """Start, stop, restart or re-rate recorders to match the plans (requires an app context)"""
+        with self._lock:
+            service = self.recording_service
+            now = datetime.utcnow()
+            result = {'started': 0, 'stopped': 0, 'restarted': 0, 'rate_changed': 0, 'failed': 0, 'remote': 0}
+
+            cameras = Camera.query.filter(Camera.is_active == True, Camera.recording_enabled == True).all()
+            plans = {camera.id: planned_fps(camera.recording_schedule, now, service.recording_fps)
+                     for camera in cameras}
+            # Recorded by another worker, which runs its own scheduler
+            remote = set(service.get_remote_recordings())
+
+            # Scheduled recordings of cameras that were disabled, removed or are off schedule
+            for camera_id, session in list(service.recording_sessions.items()):
+                if session['scheduled'] and plans.get(camera_id) is None:
+                    service.stop_recording(camera_id)
+                    result['stopped'] += 1
+
+            for camera_id, fps in plans.items():
+                session = service.recording_sessions.get(camera_id)
+
+                if session and not service.is_recorder_alive(camera_id, self.stall_seconds):
+                    logger.warning(f"Recorder for camera {camera_id} died or stalled, restarting it")
+                    service.stop_recording(camera_id)
+                    session = None
+                    result['restarted'] += 1
+
+                if fps is None:
+                    continue
+
+                if session is None and camera_id in remote:
+                    result['remote'] += 1
+                elif session is None:
+                    started = service.start_recording(camera_id, None, fps=fps, scheduled=True)
+                    if started['success']:
+                        result['started'] += 1
+                    elif started.get('already_recording'):
+                        result['remote'] += 1  # Another worker's scheduler started it first
+                    else:
+                        result['failed'] += 1
+                        logger.error(f"Could not start scheduled recording for camera {camera_id}: "
+                                     f"{started['error']}")
+                elif session['scheduled'] and session['fps'] != fps:
+                    service.set_recording_fps(camera_id, fps)
+                    result['rate_changed'] += 1
+
+            result['ran_at'] = now.isoformat()
+            self.last_result = result
+            if any(result[key] for key in ('started', 'stopped', 'restarted', 'rate_changed', 'failed')):
+                logger.info(f"Recording scheduler: {result}")
+            return result
+
+
+# Global recording scheduler instance
+recording_scheduler = RecordingScheduler()
+
+def get_recording_scheduler() -> RecordingScheduler:
+    """Get the global recording scheduler instance"""
+    return recording_scheduler
@@ -1,23 +1,37 @@
 import os
+import socket
 import asyncio
 import threading
 import time
+import uuid
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import json
-import cv2
-import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
 from pathlib import Path
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
 
 from src.services.viam_service import get_viam_service
-from src.models.user import Recording, db
-from src.models.camera import Camera, SystemConfig
+from src.services.stats_service import get_stats_service
+from src.services.storage_service import get_storage_accountant, get_storage_manager, thumbnail_path_for
+from src.services.retention_service import get_retention_cleaner
+from src.services.segment_journal import SegmentJournal
+from src.models.user import Recording, RecordingSegment, RecorderIntent, db
+from src.models.camera import Camera
+from src.services.config_service import get_config_service
+from src.services.event_bus import get_event_bus
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+
+# Degradation steps under load as (fps factor, resolution scale), from full quality down
+QUALITY_LEVELS = [(1.0, 1.0), (0.5, 1.0), (0.5, 0.5), (0.25, 0.5)]
+
 class RecordingService:
     """Service for managing local video recordings"""
     
@@ -32,12 +46,28 @@ class RecordingService:
         self.retention_days = 30
         self.recording_fps = 10  # FPS for recordings
         self.segment_duration_minutes = 30  # Split recordings into segments
+        self.thumbnail_interval_seconds = float(os.getenv('THUMBNAIL_INTERVAL_SECONDS', 10))
+        self.thumbnail_width = int(os.getenv('THUMBNAIL_WIDTH', 160))
+        self.thumbnail_columns = 10  # Thumbnails per row in a segment's sprite
+        self.journal_enabled = os.getenv('SEGMENT_JOURNAL_ENABLED', 'true').lower() == 'true'
+        self.journal_fsync_seconds = float(os.getenv('SEGMENT_JOURNAL_FSYNC_SECONDS', 2))
+        self.hard_min_free_mb = float(os.getenv('RECORDING_HARD_MIN_FREE_MB', 512))  # Below this, refuse to record
+        self.intent_heartbeat_seconds = float(os.getenv('RECORDER_HEARTBEAT_SECONDS', 3))
+        self.intent_stale_seconds = float(os.getenv('RECORDER_STALE_SECONDS', 10))
+        self.resume_interval_seconds = float(os.getenv('RECORDER_RESUME_INTERVAL_SECONDS', 2))
+        # host:pid alone repeats when a container restarts, the boot token makes the owner unique
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
         
-        # Ensure recording directories exist
+        self.app = None
+        self._resume_thread: Optional[threading.Thread] = None
+        self._resume_stop_event = threading.Event()
+    
+    def init_app(self, app):
+        """Apply the stored configuration, follow its changes and create the recording directories"""
+        config = get_config_service()
+        self._apply_configuration(config.get_all())
+        config.subscribe(self._on_configuration_change)
         self._setup_recording_directories()
-        
-        # Load configuration from database
-        self._load_configuration()
     
     def _setup_recording_directories(self):
         """Create necessary recording directories"""
@@ -46,6 +76,7 @@ class RecordingService:
                 self.base_recording_path,
                 os.path.join(self.base_recording_path, 'videos'),
                 os.path.join(self.base_recording_path, 'snapshots'),
+                os.path.join(self.base_recording_path, 'thumbnails'),
                 os.path.join(self.base_recording_path, 'temp'),
                 os.path.join(self.base_recording_path, 'ai_events')
             ]
@@ -57,37 +88,38 @@ class RecordingService:
         except Exception as e:
             logger.error(f"Error setting up recording directories: {e}")
     
-    def _load_configuration(self):
-        """Load configuration from database"""
-        try:
-            # Get recording path
-            path_config = SystemConfig.query.filter_by(key='recording_path').first()
-            if path_config:
-                self.base_recording_path = path_config.get_value()
-            
-            # Get max size
-            size_config = SystemConfig.query.filter_by(key='max_recording_size_gb').first()
-            if size_config:
-                self.max_recording_size_gb = int(size_config.get_value())
-            
-            # Get retention days
-            retention_config = SystemConfig.query.filter_by(key='retention_days').first()
-            if retention_config:
-                self.retention_days = int(retention_config.get_value())
-                
-            logger.info(f"Loaded recording configuration: path={self.base_recording_path}, "
-                       f"max_size={self.max_recording_size_gb}GB, retention={self.retention_days}days")
-                       
-        except Exception as e:
-            logger.error(f"Error loading recording configuration: {e}")
+    def _apply_configuration(self, values: Dict[str, Any]):
+        """Apply recording settings from the config service"""
+        if 'recording_path' in values:
+            self.base_recording_path = values['recording_path']
+        if 'max_recording_size_gb' in values:
+            self.max_recording_size_gb = values['max_recording_size_gb']
+        if 'retention_days' in values:
+            self.retention_days = values['retention_days']
+
+        logger.info(f"Loaded recording configuration: path={self.base_recording_path}, "
+                   f"max_size={self.max_recording_size_gb}GB, retention={self.retention_days}days")
     
-    def start_recording(self, camera_id: str, user_id: int, duration_minutes: Optional[int] = None) -> Dict[str, Any]:
-        """Start recording from a camera"""
+    def _on_configuration_change(self, changed: Dict[str, Any]):
+        """Follow configuration changes without a restart"""
+        if 'recording_path' in changed:
+            # Changed directly in the database, the storage index and recovery still cover the old root
+            logger.warning(f"recording_path changed to {changed['recording_path']}, "
+                           f"recording to {self.base_recording_path} until restart")
+            changed = {key: value for key, value in changed.items() if key != 'recording_path'}
+        if not changed.keys() & {'max_recording_size_gb', 'retention_days'}:
+            return
+        self._apply_configuration(changed)
+    
+    def start_recording(self, camera_id: str, user_id: Optional[int], duration_minutes: Optional[int] = None,
+                        fps: Optional[float] = None, scheduled: bool = False) -> Dict[str, Any]:
+        """Start recording from a camera (scheduled recordings have no user and follow the scheduler's fps)"""
         try:
-            # Check if already recording
-            if camera_id in self.recording_sessions:
+            # Check if already recording, here or by another process
+            if camera_id in self.recording_sessions or RecorderIntent.query.get(camera_id):
                 return {
                     'success': False,
+                    'already_recording': True,
                     'error': f'Camera {camera_id} is already being recorded'
                 }
             
@@ -105,12 +137,18 @@ class RecordingService:
                     'error': f'Recording is disabled for camera {camera_id}'
                 }
             
-            # Check available space
+            # Check available space, recording at the lowest quality rather than not at all when low
+            quality_level, quality_reason = 0, None
             if not self._check_available_space():
-                return {
-                    'success': False,
-                    'error': 'Insufficient storage space for recording'
-                }
+                free_mb = get_storage_accountant().get_free_bytes(self.base_recording_path) / (1024**2)
+                if free_mb < self.hard_min_free_mb:
+                    return {
+                        'success': False,
+                        'error': 'Insufficient storage space for recording'
+                    }
+                quality_level, quality_reason = len(QUALITY_LEVELS) - 1, 'disk'
+            
+            fps = fps or self.recording_fps
             
             # Create recording session
             session_id = f"{camera_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
@@ -123,42 +161,49 @@ class RecordingService:
                 file_path='',  # Will be set when recording starts
                 duration=0,
                 file_size=0,
+                fps=max(1, round(fps)),
                 recording_type='manual' if duration_minutes else 'continuous',
-                metadata=json.dumps({
+                recording_metadata={
                     'session_id': session_id,
                     'requested_duration': duration_minutes,
-                    'fps': self.recording_fps
-                })
+                    'fps': fps,
+                    'scheduled': scheduled
+                }
             )
             
             db.session.add(recording)
+            db.session.flush()
+            
+            # Persist the intent so a restart resumes this recording
+            start_time = datetime.utcnow()
+            db.session.add(RecorderIntent(
+                camera_id=camera_id,
+                recording_id=recording.id,
+                user_id=user_id,
+                duration_minutes=duration_minutes,
+                fps=fps,
+                scheduled=scheduled,
+                started_at=start_time,
+                owner=self.owner,
+                heartbeat_at=start_time
+            ))
             db.session.commit()
             
-            # Setup recording session
-            self.recording_sessions[camera_id] = {
+            self._launch_recorder(camera_id, {
                 'session_id': session_id,
                 'recording_id': recording.id,
                 'camera_id': camera_id,
                 'user_id': user_id,
-                'start_time': datetime.utcnow(),
+                'start_time': start_time,
                 'duration_minutes': duration_minutes,
+                'fps': fps,
+                'scheduled': scheduled,
+                'quality_level': quality_level,
+                'quality_reason': quality_reason,
                 'current_segment': 1,
                 'total_frames': 0,
                 'total_size_bytes': 0
-            }
-            
-            # Create stop event
-            self.stop_events[camera_id] = threading.Event()
-            
-            # Start recording thread
-            recording_thread = threading.Thread(
-                target=self._recording_worker,
-                args=(camera_id,),
-                daemon=True
-            )
-            
-            self.recording_threads[camera_id] = recording_thread
-            recording_thread.start()
+            })
             
             logger.info(f"Started recording for camera {camera_id}, session {session_id}")
             
@@ -169,13 +214,215 @@ class RecordingService:
                 'message': f'Recording started for camera {camera_id}'
             }
             
+        except IntegrityError:
+            # Another process inserted the camera's intent since the check above
+            db.session.rollback()
+            return {
+                'success': False,
+                'already_recording': True,
+                'error': f'Camera {camera_id} is already being recorded'
+            }
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error starting recording for camera {camera_id}: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def _launch_recorder(self, camera_id: str, session: Dict):
+        """Register a recording session and start its worker thread"""
+        session.update({
+            'rotate_segment': False,
+            'released': False,  # Set when the process hands the recording over instead of ending it
+            'heartbeat': time.monotonic(),
+            'load': 0.0  # Smoothed share of the frame interval spent capturing and encoding
+        })
+        self.recording_sessions[camera_id] = session
+        
+        # Create stop event
+        self.stop_events[camera_id] = threading.Event()
+        
+        # Start recording thread (it needs the app to write segments to the database)
+        recording_thread = threading.Thread(
+            target=self._recording_worker,
+            args=(current_app._get_current_object(), camera_id),
+            daemon=True
+        )
+        
+        self.recording_threads[camera_id] = recording_thread
+        recording_thread.start()
+        self._publish_state(camera_id, session, 'started')
+    
+    def start(self, app):
+        """Resume persisted recordings, then keep picking up ones released or abandoned by other processes"""
+        self.app = app
+        if self._resume_thread and self._resume_thread.is_alive():
+            return
+        
+        self._resume_stop_event.clear()
+        self._resume_thread = threading.Thread(target=self._resume_worker, name='recorder-resume', daemon=True)
+        self._resume_thread.start()
+    
+    def _resume_worker(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.resume_recordings()
+            except Exception as e:
+                logger.error(f"Error resuming recordings: {e}")
+            
+            if self._resume_stop_event.wait(self.resume_interval_seconds):
+                break
+    
+    def release_recordings(self, timeout: float = 10):
+        """Finish the current segments and hand every recording over to the next process (on shutdown)"""
+        self._resume_stop_event.set()
+        sessions = list(self.recording_sessions.items())
+        for camera_id, session in sessions:
+            session['released'] = True
+            if camera_id in self.stop_events:
+                self.stop_events[camera_id].set()
+        
+        deadline = time.monotonic() + timeout
+        for camera_id, _ in sessions:
+            thread = self.recording_threads.get(camera_id)
+            if thread:
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        
+        if sessions:
+            logger.info(f"Released {len(sessions)} recordings for resumption")
+    
+    def resume_recordings(self) -> int:
+        """Claim and resume recordings whose process released them or stopped heartbeating (requires an app context)"""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.intent_stale_seconds)
+        intents = RecorderIntent.query.filter(
+            db.or_(RecorderIntent.heartbeat_at.is_(None), RecorderIntent.heartbeat_at < stale_before)
+        ).all()
+        
+        resumed = 0
+        for intent in intents:
+            if intent.camera_id in self.recording_sessions:
+                continue  # Ours, the scheduler restarts it if the thread hung
+            
+            # Claim it only if nobody else did since it was read
+            claimed = RecorderIntent.query.filter(
+                RecorderIntent.camera_id == intent.camera_id,
+                RecorderIntent.heartbeat_at.is_(None) if intent.heartbeat_at is None
+                else RecorderIntent.heartbeat_at == intent.heartbeat_at
+            ).update({'owner': self.owner, 'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if claimed != 1:
+                continue
+            
+            db.session.refresh(intent)
+            if self._resume_recording(intent):
+                resumed += 1
+        
+        return resumed
+    
+    def get_remote_recordings(self) -> List[str]:
+        """Get cameras another process is recording, judged by a fresh heartbeat (requires an app context)"""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.intent_stale_seconds)
+        return [camera_id for camera_id, in db.session.query(RecorderIntent.camera_id).filter(
+            RecorderIntent.heartbeat_at >= stale_before,
+            db.or_(RecorderIntent.owner.is_(None), RecorderIntent.owner != self.owner)
+        )]
+    
+    def _resume_recording(self, intent: RecorderIntent) -> bool:
+        """Continue a claimed recording with new segments of the same Recording"""
+        camera_id = intent.camera_id
+        recording = Recording.query.get(intent.recording_id)
+        camera = Camera.query.get(camera_id)
+        totals = db.session.query(
+            db.func.coalesce(db.func.sum(RecordingSegment.frame_count), 0),
+            db.func.coalesce(db.func.sum(RecordingSegment.file_size), 0)
+        ).filter(RecordingSegment.recording_id == intent.recording_id).one()
+        
+        session = {
+            'session_id': (recording.get_metadata().get('session_id') if recording else None) or f'{camera_id}_resumed',
+            'recording_id': intent.recording_id,
+            'camera_id': camera_id,
+            'user_id': intent.user_id,
+            'start_time': intent.started_at,
+            'duration_minutes': intent.duration_minutes,
+            'fps': intent.fps,
+            'scheduled': intent.scheduled,
+            'quality_level': 0,
+            'quality_reason': None,
+            'current_segment': self._next_segment_number(intent.recording_id),
+            'total_frames': totals[0],
+            'total_size_bytes': totals[1]
+        }
+        
+        expired = (intent.duration_minutes and
+                   datetime.utcnow() >= intent.started_at + timedelta(minutes=intent.duration_minutes))
+        if recording is None or recording.ended_at or expired or not camera or not camera.recording_enabled:
+            # Nothing left to record, close it as if it had stopped normally
+            if recording and not recording.ended_at:
+                self._finalize_recording_session(camera_id, session)
+            else:
+                self._delete_intent(camera_id, intent.recording_id)
+            return False
+        
+        metadata = dict(recording.get_metadata())
+        metadata['resumed_at'] = metadata.get('resumed_at', []) + [datetime.utcnow().isoformat()]
+        recording.set_metadata(metadata)
+        db.session.commit()
+        
+        self._launch_recorder(camera_id, session)
+        logger.info(f"Resumed recording {intent.recording_id} for camera {camera_id} "
+                    f"at segment {session['current_segment']}")
+        return True
+    
+    def _next_segment_number(self, recording_id: int) -> int:
+        """Number continuation segments after indexed ones and any still waiting in a journal"""
+        last = db.session.query(db.func.max(RecordingSegment.segment_number)).filter(
+            RecordingSegment.recording_id == recording_id
+        ).scalar() or 0
+        
+        for metadata in SegmentJournal.list_metadata(os.path.join(self.base_recording_path, 'temp')):
+            if metadata.get('recording_id') == recording_id:
+                last = max(last, metadata.get('segment_number') or 0)
+        
+        return last + 1
+    
+    def _heartbeat_intent(self, camera_id: str, session: Dict) -> bool:
+        """Refresh this process's claim on a recording, returning False if another process took it over"""
+        try:
+            intent = RecorderIntent.query.get(camera_id)
+            if intent is None or intent.recording_id != session['recording_id']:
+                return True  # Stopped explicitly, the stop event ends the loop
+            if intent.owner != self.owner:
+                return False
+            intent.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error updating recorder heartbeat for camera {camera_id}: {e}")
+        return True
+    
+    def _release_intent(self, camera_id: str, recording_id: int):
+        """Leave a recording's intent for the next process to resume"""
+        try:
+            RecorderIntent.query.filter_by(camera_id=camera_id, recording_id=recording_id, owner=self.owner).update(
+                {'heartbeat_at': None}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error releasing recording of camera {camera_id}: {e}")
+    
+    def _delete_intent(self, camera_id: str, recording_id: int):
+        try:
+            RecorderIntent.query.filter_by(camera_id=camera_id, recording_id=recording_id).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error deleting recorder intent of camera {camera_id}: {e}")
+    
     def stop_recording(self, camera_id: str) -> Dict[str, Any]:
         """Stop recording for a camera"""
         try:
@@ -185,19 +432,22 @@ class RecordingService:
                     'error': f'No active recording for camera {camera_id}'
                 }
             
+            session = self.recording_sessions[camera_id]
+            
             # Signal stop
             if camera_id in self.stop_events:
                 self.stop_events[camera_id].set()
             
             # Wait for thread to finish
-            if camera_id in self.recording_threads:
-                self.recording_threads[camera_id].join(timeout=10)
+            thread = self.recording_threads.get(camera_id)
+            if thread:
+                thread.join(timeout=10)
             
-            session = self.recording_sessions.get(camera_id, {})
             session_id = session.get('session_id', 'unknown')
             
-            # Clean up
-            self._cleanup_recording_session(camera_id)
+            # Clean up (an explicit stop is not resumed after a restart)
+            self._delete_intent(camera_id, session['recording_id'])
+            self._cleanup_recording_session(camera_id, session)
             
             logger.info(f"Stopped recording for camera {camera_id}, session {session_id}")
             
@@ -214,39 +464,120 @@ class RecordingService:
                 'error': str(e)
             }
     
-    def _recording_worker(self, camera_id: str):
-        """Worker thread for recording video from camera"""
+    def set_recording_fps(self, camera_id: str, fps: float) -> bool:
+        """Change the frame rate of an active recording, starting a new segment at the new rate"""
+        session = self.recording_sessions.get(camera_id)
+        if not session:
+            return False
+        if session['fps'] != fps:
+            session['fps'] = fps
+            session['rotate_segment'] = True  # A segment's writer has a fixed frame rate
+            self._publish_state(camera_id, session, 'updated')
+        return True
+    
+    def set_recording_quality(self, camera_id: str, level: int, reason: Optional[str] = None) -> bool:
+        """Degrade or restore an active recording to a QUALITY_LEVELS step, starting a new segment"""
         session = self.recording_sessions.get(camera_id)
         if not session:
+            return False
+        level = max(0, min(level, len(QUALITY_LEVELS) - 1))
+        if session['quality_level'] != level:
+            logger.info(f"Recording quality of camera {camera_id}: level {session['quality_level']} -> {level}"
+                        f"{f' ({reason})' if reason else ''}")
+            session['quality_level'] = level
+            session['quality_reason'] = reason if level else None
+            session['rotate_segment'] = True  # A segment's writer has a fixed frame rate and size
+            self._publish_state(camera_id, session, 'updated')
+        return True
+    
+    def get_recording_quality(self, session: Dict) -> Dict[str, Any]:
+        """Get the effective frame rate and scale of a recording session"""
+        fps_factor, scale = QUALITY_LEVELS[session['quality_level']]
+        return {
+            'fps': session['fps'] * fps_factor,
+            'scale': scale,
+            'planned_fps': session['fps'],
+            'quality_level': session['quality_level'],
+            'quality_reason': session['quality_reason']
+        }
+    
+    def is_recorder_alive(self, camera_id: str, stall_seconds: float) -> bool:
+        """Check that a recording's thread is running and has not hung on a frame"""
+        session = self.recording_sessions.get(camera_id)
+        thread = self.recording_threads.get(camera_id)
+        if not session or not thread or not thread.is_alive():
+            return False
+        return time.monotonic() - session['heartbeat'] < stall_seconds
+    
+    def _recording_worker(self, app, camera_id: str):
+        """Worker thread for recording video from camera"""
+        with app.app_context():
+            self._record(camera_id)
+    
+    def _record(self, camera_id: str):
+        """Record segments until stopped (runs in the worker thread)"""
+        session = self.recording_sessions.get(camera_id)
+        stop_event = self.stop_events.get(camera_id)
+        if not session or not stop_event:
             return
         
         try:
+            # Imported here so only processes that record pay for OpenCV
+            import cv2
+            import numpy as np
+            
             viam_service = get_viam_service()
             
-            # Create video writer
+            # The writer is opened on the first frame, so it matches the camera's resolution
             video_writer = None
             current_filename = None
             current_filepath = None
+            journal = None
+            quality = self.get_recording_quality(session)
             segment_start_time = datetime.utcnow()
             
             frame_count = 0
             total_size = 0
+            thumbnails = []  # (offset seconds, small frame) for the current segment
+            next_thumbnail_at = 0.0
+            next_intent_heartbeat = 0.0
             
-            while not self.stop_events[camera_id].is_set():
+            while not stop_event.is_set():
                 try:
+                    iteration_started = time.monotonic()
+                    session['heartbeat'] = iteration_started
+                    
+                    if iteration_started >= next_intent_heartbeat:
+                        next_intent_heartbeat = iteration_started + self.intent_heartbeat_seconds
+                        if not self._heartbeat_intent(camera_id, session):
+                            logger.warning(f"Recording of camera {camera_id} was taken over by another process")
+                            session['released'] = True
+                            break
+                    
                     # Check if we need to start a new segment
-                    if (video_writer is None or 
+                    if (current_filepath is None or session['rotate_segment'] or
                         (datetime.utcnow() - segment_start_time).total_seconds() > self.segment_duration_minutes * 60):
+                        session['rotate_segment'] = False
                         
                         # Close previous writer
-                        if video_writer:
-                            video_writer.release()
-                            self._finalize_recording_segment(camera_id, current_filepath, frame_count, total_size)
+                        if current_filepath:
+                            if video_writer:
+                                video_writer.release()
+                            self._finalize_recording_segment(camera_id, session, current_filepath, frame_count,
+                                                             total_size, segment_start_time, thumbnails, quality)
+                            if journal:
+                                journal.discard()
                         
-                        # Create new segment
-                        current_filename, current_filepath, video_writer = self._create_new_segment(camera_id, session)
+                        # Create new segment at the current quality
+                        quality = self.get_recording_quality(session)
+                        current_filename, current_filepath = self._create_new_segment(camera_id, session)
+                        video_writer = None
+                        journal = self._open_journal(camera_id, session, current_filepath, quality)
                         segment_start_time = datetime.utcnow()
                         frame_count = 0
+                        total_size = 0
+                        thumbnails = []
+                        next_thumbnail_at = 0.0
                     
                     # Get frame from camera
                     loop = asyncio.new_event_loop()
@@ -254,12 +585,28 @@ class RecordingService:
                     frame_bytes = loop.run_until_complete(viam_service.get_camera_image(camera_id, 'JPEG'))
                     loop.close()
                     
-                    if frame_bytes and video_writer:
+                    if frame_bytes:
                         # Convert bytes to OpenCV image
                         nparr = np.frombuffer(frame_bytes, np.uint8)
                         frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                         
                         if frame is not None:
+                            if quality['scale'] != 1:
+                                frame = cv2.resize(frame, None, fx=quality['scale'], fy=quality['scale'],
+                                                   interpolation=cv2.INTER_AREA)
+                            
+                            if video_writer is None:
+                                video_writer = self._open_video_writer(current_filepath, quality['fps'], frame)
+                                quality['resolution'] = f"{frame.shape[1]}x{frame.shape[0]}"
+                            elif quality['resolution'] != f"{frame.shape[1]}x{frame.shape[0]}":
+                                # The camera changed resolution mid-segment
+                                width, height = (int(value) for value in quality['resolution'].split('x'))
+                                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                            
+                            # Journal first, the MP4 is unreadable until the writer is released
+                            if journal:
+                                journal.append(datetime.utcnow(), frame_bytes)
+                            
                             # Write frame to video
                             video_writer.write(frame)
                             frame_count += 1
@@ -268,6 +615,12 @@ class RecordingService:
                             # Update session stats
                             session['total_frames'] += 1
                             session['total_size_bytes'] += len(frame_bytes)
+                            
+                            # Keep a small copy of the decoded frame every few seconds
+                            offset = (datetime.utcnow() - segment_start_time).total_seconds()
+                            if offset >= next_thumbnail_at:
+                                thumbnails.append((offset, self._make_thumbnail(frame)))
+                                next_thumbnail_at = offset + self.thumbnail_interval_seconds
                     
                     # Check duration limit
                     if session.get('duration_minutes'):
@@ -275,71 +628,184 @@ class RecordingService:
                         if elapsed_minutes >= session['duration_minutes']:
                             break
                     
-                    # Sleep to maintain FPS
-                    time.sleep(1.0 / self.recording_fps)
+                    # Sleep for the rest of the frame interval, a load above 1 means frames are being dropped
+                    interval = 1.0 / quality['fps']
+                    work = time.monotonic() - iteration_started
+                    session['load'] = 0.9 * session['load'] + 0.1 * (work / interval)
+                    stop_event.wait(max(0.0, interval - work))
                     
                 except Exception as e:
                     logger.error(f"Error in recording loop for camera {camera_id}: {e}")
                     time.sleep(1)
             
             # Finalize last segment
-            if video_writer:
-                video_writer.release()
-                self._finalize_recording_segment(camera_id, current_filepath, frame_count, total_size)
-            
-            # Update recording record
-            self._finalize_recording_session(camera_id)
+            if current_filepath:
+                if video_writer:
+                    video_writer.release()
+                self._finalize_recording_segment(camera_id, session, current_filepath, frame_count,
+                                                 total_size, segment_start_time, thumbnails, quality)
+                if journal:
+                    journal.discard()
+            
+            # Update recording record, unless another process continues it
+            if session['released']:
+                self._release_intent(camera_id, session['recording_id'])
+            else:
+                self._finalize_recording_session(camera_id, session)
             
         except Exception as e:
             logger.error(f"Error in recording worker for camera {camera_id}: {e}")
         finally:
-            self._cleanup_recording_session(camera_id)
+            self._cleanup_recording_session(camera_id, session)
     
     def _create_new_segment(self, camera_id: str, session: Dict) -> tuple:
-        """Create a new video segment"""
+        """Reserve the file of a new video segment"""
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        segment_num = session['current_segment']
+        
+        filename = f"{camera_id}_segment_{segment_num:03d}_{timestamp}.mp4"
+        filepath = os.path.join(self.base_recording_path, 'videos', filename)
+        
+        get_storage_accountant().open_segment(filepath)
+        session['current_segment'] += 1
+        
+        logger.info(f"Created new recording segment: {filename}")
+        
+        return filename, filepath
+    
+    def _open_video_writer(self, filepath: str, fps: float, frame: 'np.ndarray') -> 'cv2.VideoWriter':
+        """Create the video writer of a segment, sized to its first frame"""
+        import cv2
+        
+        height, width = frame.shape[:2]
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        video_writer = cv2.VideoWriter(filepath, fourcc, fps, (width, height))
+        
+        if not video_writer.isOpened():
+            raise Exception(f"Could not create video writer for {filepath}")
+        
+        return video_writer
+    
+    def _open_journal(self, camera_id: str, session: Dict, filepath: str,
+                      quality: Dict[str, Any]) -> Optional[SegmentJournal]:
+        """Start the crash recovery journal of a new segment"""
+        if not self.journal_enabled:
+            return None
+        
         try:
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            segment_num = session['current_segment']
-            
-            filename = f"{camera_id}_segment_{segment_num:03d}_{timestamp}.mp4"
-            filepath = os.path.join(self.base_recording_path, 'videos', filename)
-            
-            # Create video writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            video_writer = cv2.VideoWriter(filepath, fourcc, self.recording_fps, (1920, 1080))
-            
-            if not video_writer.isOpened():
-                raise Exception(f"Could not create video writer for {filepath}")
-            
-            session['current_segment'] += 1
-            
-            logger.info(f"Created new recording segment: {filename}")
-            
-            return filename, filepath, video_writer
-            
+            return SegmentJournal(os.path.join(self.base_recording_path, 'temp'), {
+                'camera_id': camera_id,
+                'recording_id': session['recording_id'],
+                'segment_number': session['current_segment'] - 1,
+                'file_path': filepath,
+                'fps': quality['fps'],
+                'quality': quality,
+                'owner': self.owner  # Recovery leaves journals alone while this owner heartbeats
+            }, self.journal_fsync_seconds)
         except Exception as e:
-            logger.error(f"Error creating new segment for camera {camera_id}: {e}")
-            raise
+            logger.error(f"Error opening journal for {filepath}, recording without it: {e}")
+            return None
     
-    def _finalize_recording_segment(self, camera_id: str, filepath: str, frame_count: int, size_bytes: int):
-        """Finalize a recording segment"""
+    def _make_thumbnail(self, frame: 'np.ndarray') -> 'np.ndarray':
+        """Scale a frame down to thumbnail width"""
+        import cv2
+        
+        height, width = frame.shape[:2]
+        thumbnail_height = max(1, int(height * self.thumbnail_width / width))
+        return cv2.resize(frame, (self.thumbnail_width, thumbnail_height), interpolation=cv2.INTER_AREA)
+    
+    def _write_thumbnail_sprite(self, filepath: str, thumbnails: List[tuple]) -> Optional[Dict[str, Any]]:
+        """Tile a segment's thumbnails into one JPEG sprite and return its index"""
+        if not thumbnails:
+            return None
+        
+        import cv2
+        import numpy as np
+        
+        tile_height, tile_width = thumbnails[0][1].shape[:2]
+        columns = min(self.thumbnail_columns, len(thumbnails))
+        rows = (len(thumbnails) + columns - 1) // columns
+        sprite = np.zeros((rows * tile_height, columns * tile_width, 3), np.uint8)
+        
+        for index, (_, thumbnail) in enumerate(thumbnails):
+            if thumbnail.shape[:2] != (tile_height, tile_width):
+                thumbnail = cv2.resize(thumbnail, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+            row, column = divmod(index, columns)
+            sprite[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = thumbnail
+        
+        sprite_path = thumbnail_path_for(filepath)
+        if not cv2.imwrite(sprite_path, sprite, [cv2.IMWRITE_JPEG_QUALITY, 70]):
+            raise Exception(f"Could not write thumbnail sprite {sprite_path}")
+        
+        return {
+            'sprite': os.path.basename(sprite_path),
+            'width': tile_width,
+            'height': tile_height,
+            'columns': columns,
+            'count': len(thumbnails),
+            'offsets': [round(offset, 1) for offset, _ in thumbnails]
+        }
+    
+    def _finalize_recording_segment(self, camera_id: str, session: Dict, filepath: str, frame_count: int,
+                                    size_bytes: int, start_time: datetime, thumbnails: Optional[List[tuple]] = None,
+                                    quality: Optional[Dict[str, Any]] = None):
+        """Finalize a recording segment and add it to the segment index"""
         try:
             if not os.path.exists(filepath):
+                get_storage_accountant().close_segment(filepath)  # No frame was ever written
                 return
             
             # Get actual file size
             actual_size = os.path.getsize(filepath)
+            end_time = datetime.utcnow()
+            duration_seconds = (end_time - start_time).total_seconds()
+            
+            try:
+                thumbnail_index = self._write_thumbnail_sprite(filepath, thumbnails or [])
+            except Exception as e:
+                # Thumbnails are a convenience, never lose the segment over them
+                logger.error(f"Error writing thumbnails for {filepath}: {e}")
+                thumbnail_index = None
+            
+            filename = os.path.basename(filepath)
+            segment = RecordingSegment(
+                recording_id=session['recording_id'],
+                camera_id=camera_id,
+                segment_number=session['current_segment'] - 1,
+                filename=filename,
+                file_path=filepath,
+                start_time=start_time,
+                end_time=end_time,
+                file_size=actual_size,
+                frame_count=frame_count,
+                fps=frame_count / duration_seconds if duration_seconds > 0 else None,
+                thumbnail_index=thumbnail_index,
+                segment_metadata=quality
+            )
+            db.session.add(segment)
+            
+            # The recording points at its first segment
+            recording = Recording.query.get(session['recording_id'])
+            if recording and not recording.file_path:
+                recording.filename = filename
+                recording.file_path = filepath
+            
+            db.session.commit()
+            
+            get_storage_accountant().record_segment(camera_id, actual_size, filepath)
+            get_storage_manager().request_enforcement()
             
             logger.info(f"Finalized recording segment: {filepath}, "
                        f"frames={frame_count}, size={actual_size} bytes")
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error finalizing recording segment {filepath}: {e}")
     
-    def _finalize_recording_session(self, camera_id: str):
+    def _finalize_recording_session(self, camera_id: str, session: Optional[Dict] = None):
         """Finalize the entire recording session"""
         try:
-            session = self.recording_sessions.get(camera_id)
+            session = session or self.recording_sessions.get(camera_id)
             if not session:
                 return
             
@@ -348,19 +814,26 @@ class RecordingService:
             if recording:
                 duration_seconds = (datetime.utcnow() - session['start_time']).total_seconds()
                 recording.duration = int(duration_seconds)
-                recording.file_size = session['total_size_bytes']
+                recording.file_size = db.session.query(
+                    db.func.coalesce(db.func.sum(RecordingSegment.file_size), 0)
+                ).filter(RecordingSegment.recording_id == recording.id).scalar()
                 recording.ended_at = datetime.utcnow()
+                recording.end_time = recording.ended_at
                 
                 # Update metadata
-                metadata = json.loads(recording.metadata or '{}')
+                metadata = dict(recording.get_metadata())
                 metadata.update({
                     'total_frames': session['total_frames'],
                     'segments': session['current_segment'] - 1,
                     'actual_fps': session['total_frames'] / duration_seconds if duration_seconds > 0 else 0
                 })
-                recording.metadata = json.dumps(metadata)
+                recording.set_metadata(metadata)
                 
+                RecorderIntent.query.filter_by(camera_id=camera_id, recording_id=recording.id).delete(
+                    synchronize_session=False
+                )
                 db.session.commit()
+                get_storage_accountant().record_duration(camera_id, recording.duration)
                 
                 logger.info(f"Finalized recording session for camera {camera_id}, "
                            f"duration={duration_seconds}s, frames={session['total_frames']}")
@@ -368,12 +841,17 @@ class RecordingService:
         except Exception as e:
             logger.error(f"Error finalizing recording session for camera {camera_id}: {e}")
     
-    def _cleanup_recording_session(self, camera_id: str):
+    def _cleanup_recording_session(self, camera_id: str, session: Optional[Dict] = None):
         """Clean up recording session data"""
         try:
+            # A hung thread that was replaced must not remove its successor's session
+            if session is not None and self.recording_sessions.get(camera_id) is not session:
+                return
+            
             # Remove from active sessions
-            if camera_id in self.recording_sessions:
-                del self.recording_sessions[camera_id]
+            session = self.recording_sessions.pop(camera_id, None)
+            if session is not None:
+                self._publish_state(camera_id, session, 'released' if session['released'] else 'stopped')
             
             # Clean up thread references
             if camera_id in self.recording_threads:
@@ -386,17 +864,23 @@ class RecordingService:
         except Exception as e:
             logger.error(f"Error cleaning up recording session for camera {camera_id}: {e}")
     
+    def get_required_free_gb(self) -> float:
+        """Get the free space recording needs at full quality (10% of the max recording size)"""
+        return self.max_recording_size_gb * 0.1
+    
     def _check_available_space(self) -> bool:
         """Check if there's enough space for recording"""
         try:
-            # Get disk usage
-            statvfs = os.statvfs(self.base_recording_path)
-            free_bytes = statvfs.f_frsize * statvfs.f_bavail
-            free_gb = free_bytes / (1024**3)
+            # Free space comes from a statvfs reading cached for a few seconds, not one per call
+            storage = get_storage_accountant()
+            free_gb = storage.get_free_bytes(self.base_recording_path) / (1024**3)
             
-            # Check if we have at least 10% of max recording size available
-            required_gb = self.max_recording_size_gb * 0.1
+            required_gb = self.get_required_free_gb()
             
+            if free_gb < required_gb:
+                # Evict old segments in the background, this recording starts degraded meanwhile
+                get_storage_manager().request_enforcement()
+
             return free_gb >= required_gb
             
         except Exception as e:
@@ -408,53 +892,56 @@ class RecordingService:
         active_recordings = []
         
         for camera_id, session in self.recording_sessions.items():
-            duration_seconds = (datetime.utcnow() - session['start_time']).total_seconds()
-            
-            active_recordings.append({
-                'camera_id': camera_id,
-                'session_id': session['session_id'],
-                'recording_id': session['recording_id'],
-                'user_id': session['user_id'],
-                'start_time': session['start_time'].isoformat(),
-                'duration_seconds': int(duration_seconds),
-                'current_segment': session['current_segment'],
-                'total_frames': session['total_frames'],
-                'total_size_bytes': session['total_size_bytes']
-            })
+            active_recordings.append(self._describe_session(camera_id, session))
         
         return active_recordings
     
+    def get_all_active_recordings(self) -> List[Dict[str, Any]]:
+        """Get active recordings of every process, others' from their recorder intents (requires an app context)"""
+        recordings = self.get_active_recordings()
+        remote = self.get_remote_recordings()
+        if remote:
+            recordings.extend(intent.to_dict() for intent in
+                              RecorderIntent.query.filter(RecorderIntent.camera_id.in_(remote)))
+        return recordings
+    
+    def _describe_session(self, camera_id: str, session: Dict) -> Dict[str, Any]:
+        duration_seconds = (datetime.utcnow() - session['start_time']).total_seconds()
+        return {
+            'camera_id': camera_id,
+            'session_id': session['session_id'],
+            'recording_id': session['recording_id'],
+            'user_id': session['user_id'],
+            'start_time': session['start_time'].isoformat(),
+            'duration_seconds': int(duration_seconds),
+            'fps': session['fps'],
+            'scheduled': session['scheduled'],
+            'quality': self.get_recording_quality(session),
+            'load': round(session['load'], 2),
+            'current_segment': session['current_segment'],
+            'total_frames': session['total_frames'],
+            'total_size_bytes': session['total_size_bytes']
+        }
+    
+    def _publish_state(self, camera_id: str, session: Dict, state: str):
+        """Push a recorder state change (started, updated, stopped or released) to event subscribers"""
+        try:
+            get_event_bus().publish('recording', camera_id, {'state': state, **self._describe_session(camera_id, session)})
+        except Exception as e:
+            logger.error(f"Error publishing recording state of camera {camera_id}: {e}")
+    
     def get_recording_statistics(self) -> Dict[str, Any]:
         """Get recording statistics"""
         try:
-            # Count recordings by type
-            total_recordings = Recording.query.count()
-            manual_recordings = Recording.query.filter_by(recording_type='manual').count()
-            continuous_recordings = Recording.query.filter_by(recording_type='continuous').count()
-            
-            # Calculate total storage used
-            total_size = db.session.query(db.func.sum(Recording.file_size)).scalar() or 0
-            total_duration = db.session.query(db.func.sum(Recording.duration)).scalar() or 0
-            
-            # Get disk usage
-            statvfs = os.statvfs(self.base_recording_path)
-            free_bytes = statvfs.f_frsize * statvfs.f_bavail
-            total_bytes = statvfs.f_frsize * statvfs.f_blocks
-            used_bytes = total_bytes - free_bytes
+            storage = get_storage_accountant()
             
-            return {
-                'total_recordings': total_recordings,
-                'manual_recordings': manual_recordings,
-                'continuous_recordings': continuous_recordings,
+            statistics = dict(get_stats_service().get_recording_totals())
+            statistics.update({
                 'active_recordings': len(self.recording_sessions),
-                'total_recorded_size_bytes': total_size,
-                'total_recorded_duration_seconds': total_duration,
-                'disk_usage': {
-                    'total_bytes': total_bytes,
-                    'used_bytes': used_bytes,
-                    'free_bytes': free_bytes,
-                    'used_percentage': (used_bytes / total_bytes) * 100 if total_bytes > 0 else 0
-                },
+                'total_recorded_size_bytes': storage.get_total_bytes(),
+                'total_recorded_duration_seconds': storage.get_total_duration(),
+                'disk_usage': storage.get_disk_usage(self.base_recording_path),
+                'storage_manager': get_storage_manager().last_result,
                 'configuration': {
                     'base_path': self.base_recording_path,
                     'max_size_gb': self.max_recording_size_gb,
@@ -462,60 +949,52 @@ class RecordingService:
                     'recording_fps': self.recording_fps,
                     'segment_duration_minutes': self.segment_duration_minutes
                 }
-            }
+            })
+            
+            return statistics
             
         except Exception as e:
             logger.error(f"Error getting recording statistics: {e}")
             return {}
     
+    def find_segments(self, camera_id: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Find the segments of a camera covering [start, end), with offsets into each"""
+        # Latest segment starting at or before the range, one index seek
+        floor = db.session.query(db.func.max(RecordingSegment.start_time)).filter(
+            RecordingSegment.camera_id == camera_id,
+            RecordingSegment.start_time <= start
+        ).scalar()
+        
+        segments = RecordingSegment.query.filter(
+            RecordingSegment.camera_id == camera_id,
+            RecordingSegment.start_time >= (floor or start),
+            RecordingSegment.start_time < end
+        ).order_by(RecordingSegment.start_time).all()
+        
+        results = []
+        for segment in segments:
+            if segment.end_time <= start:
+                continue
+            data = segment.to_dict()
+            data.update(segment.get_offsets(start, end))
+            results.append(data)
+        
+        return results
+    
     def cleanup_old_recordings(self) -> Dict[str, Any]:
-        """Clean up old recordings based on retention policy"""
-        try:
-            cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
-            
-            # Find old recordings
-            old_recordings = Recording.query.filter(Recording.created_at < cutoff_date).all()
-            
-            deleted_count = 0
-            freed_bytes = 0
-            
-            for recording in old_recordings:
-                try:
-                    # Delete file if it exists
-                    if recording.file_path and os.path.exists(recording.file_path):
-                        file_size = os.path.getsize(recording.file_path)
-                        os.remove(recording.file_path)
-                        freed_bytes += file_size
-                    
-                    # Delete database record
-                    db.session.delete(recording)
-                    deleted_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error deleting recording {recording.id}: {e}")
-            
-            db.session.commit()
-            
-            logger.info(f"Cleaned up {deleted_count} old recordings, freed {freed_bytes} bytes")
-            
-            return {
-                'success': True,
-                'deleted_recordings': deleted_count,
-                'freed_bytes': freed_bytes,
-                'cutoff_date': cutoff_date.isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Error cleaning up old recordings: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        """Start a background cleanup of recordings older than the retention period"""
+        return get_retention_cleaner().request_cleanup()
 
-# Global recording service instance
-recording_service = RecordingService()
+# Global recording service instance, created on first use
+recording_service: Optional[RecordingService] = None
+_recording_service_lock = threading.Lock()
 
 def get_recording_service() -> RecordingService:
     """Get the global recording service instance"""
+    global recording_service
+    if recording_service is None:
+        with _recording_service_lock:
+            if recording_service is None:
+                recording_service = RecordingService()
     return recording_service
 
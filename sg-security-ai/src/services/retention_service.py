@@ -0,0 +1,256 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from src.models.user import Recording, RecordingSegment, RecorderIntent, AIEvent, db
+from src.models.camera import SystemConfig
+from src.services.storage_service import get_accountant_for, get_storage_accountant, remove_thumbnails
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = 'retention_cleanup_state'
+
+
+def _remove_file(path: str) -> int:
+    """Delete a segment file and its thumbnails, returning the bytes freed (0 if it was already gone)"""
+    remove_thumbnails(path)
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.error(f"Error deleting recording file {path}: {e}")
+        return 0
+
+
+class RetentionCleaner:
+    """Deletes expired recordings in the background, in small batches that resume after a crash"""
+
+    def __init__(self):
+        self.interval_seconds = float(os.getenv('RETENTION_CLEANUP_INTERVAL_SECONDS', 3600))
+        self.batch_size = int(os.getenv('RETENTION_BATCH_SIZE', 200))
+        self.file_workers = int(os.getenv('RETENTION_FILE_WORKERS', 4))
+        self.batch_pause_seconds = float(os.getenv('RETENTION_BATCH_PAUSE_SECONDS', 0.05))
+
+        self.app = None
+        self.recording_service = None
+        self._progress: Dict[str, Any] = {'status': 'idle'}
+        self._progress_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def start(self, app, recording_service):
+        """Resume an interrupted cleanup, then clean up periodically"""
+        self.app = app
+        self.recording_service = recording_service
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='retention-cleaner', daemon=True)
+        self._thread.start()
+        logger.info(f"Started retention cleaner, interval={self.interval_seconds}s")
+
+    def stop(self):
+        """Stop after the current batch (the checkpoint lets the next start resume)"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        """Check that the background thread is there to pick up cleanup requests"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def request_cleanup(self) -> Dict[str, Any]:
+        """Ask the background thread to run a cleanup now"""
+        if not self.is_running():
+            return {
+                'success': False,
+                'error': 'Retention cleaner is not running in this process',
+                'progress': self.get_progress()
+            }
+
+        if self._run_lock.locked():
+            return {
+                'success': False,
+                'error': 'Cleanup already running',
+                'progress': self.get_progress()
+            }
+
+        self._wake_event.set()
+        return {
+            'success': True,
+            'message': 'Cleanup started',
+            'progress': self.get_progress()
+        }
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Get the state of the current or last cleanup"""
+        with self._progress_lock:
+            return dict(self._progress)
+
+    def _set_progress(self, state: Dict[str, Any]):
+        with self._progress_lock:
+            self._progress = dict(state)
+
+    def _worker(self):
+        try:
+            with self.app.app_context():
+                state = self._load_state()
+                if state and state.get('status') == 'running':
+                    logger.info(f"Resuming retention cleanup after recording {state.get('last_id')}")
+                    self.run(resume_state=state)
+        except Exception as e:
+            logger.error(f"Error resuming retention cleanup: {e}")
+
+        while True:
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+
+            try:
+                with self.app.app_context():
+                    self.run()
+            except Exception as e:
+                logger.error(f"Error in retention cleanup: {e}")
+
+    def run(self, resume_state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Delete all recordings older than the retention period (requires an app context)"""
+        if not self._run_lock.acquire(blocking=False):
+            return self.get_progress()
+
+        try:
+            if resume_state:
+                state = dict(resume_state)
+                cutoff = datetime.fromisoformat(state['cutoff'])
+            else:
+                cutoff = datetime.utcnow() - timedelta(days=self.recording_service.retention_days)
+                state = {
+                    'status': 'running',
+                    'cutoff': cutoff.isoformat(),
+                    'last_id': 0,
+                    'deleted_recordings': 0,
+                    'freed_bytes': 0,
+                    'started_at': datetime.utcnow().isoformat(),
+                    'finished_at': None,
+                    'error': None
+                }
+            self._set_progress(state)
+
+            try:
+                with ThreadPoolExecutor(max_workers=self.file_workers, thread_name_prefix='retention-io') as executor:
+                    while not self._stop_event.is_set():
+                        if not self._run_batch(state, cutoff, executor):
+                            state['status'] = 'completed'
+                            state['finished_at'] = datetime.utcnow().isoformat()
+                            break
+                        self._set_progress(state)
+
+                        # Give recording inserts a chance at the write lock
+                        self._stop_event.wait(self.batch_pause_seconds)
+
+                # When stopped the state stays 'running' so the next start resumes it
+                self._save_state(state)
+                db.session.commit()
+
+                if state['status'] == 'completed' and state['deleted_recordings']:
+                    logger.info(f"Cleaned up {state['deleted_recordings']} old recordings, "
+                                f"freed {state['freed_bytes']} bytes")
+
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error cleaning up old recordings: {e}")
+                state['status'] = 'failed'
+                state['error'] = str(e)
+                try:
+                    self._save_state(state)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+
+            self._set_progress(state)
+            return dict(state)
+
+        finally:
+            self._run_lock.release()
+
+    def _run_batch(self, state: Dict[str, Any], cutoff: datetime, executor: ThreadPoolExecutor) -> bool:
+        """Delete the next batch of expired recordings, returning False when none are left"""
+        active_ids = [
+            session['recording_id'] for session in list(self.recording_service.recording_sessions.values())
+        ]
+        active_ids += [recording_id for (recording_id,) in db.session.query(RecorderIntent.recording_id)]
+
+        # Keyset pagination on the primary key keeps each batch query cheap
+        query = db.session.query(Recording.id, Recording.camera_id, Recording.file_path, Recording.duration).filter(
+            Recording.created_at < cutoff,
+            Recording.id > state['last_id']
+        )
+        if active_ids:
+            query = query.filter(~Recording.id.in_(active_ids))
+        rows = query.order_by(Recording.id).limit(self.batch_size).all()
+        if not rows:
+            return False
+
+        ids = [row.id for row in rows]
+        files = {row.file_path: row.camera_id for row in rows if row.file_path}
+        files.update(
+            db.session.query(RecordingSegment.file_path, RecordingSegment.camera_id).filter(
+                RecordingSegment.recording_id.in_(ids)
+            ).all()
+        )
+
+        # Files are deleted first so a crash can at worst leave rows whose files are already gone
+        storage = get_storage_accountant()
+        freed = 0
+        for (path, camera_id), size in zip(files.items(), executor.map(_remove_file, list(files))):
+            if size:
+                get_accountant_for(path).release_segment(camera_id, size, path)
+                freed += size
+
+        AIEvent.query.filter(AIEvent.recording_id.in_(ids)).delete(synchronize_session=False)
+        RecordingSegment.query.filter(RecordingSegment.recording_id.in_(ids)).delete(synchronize_session=False)
+        Recording.query.filter(Recording.id.in_(ids)).delete(synchronize_session=False)
+
+        state['last_id'] = ids[-1]
+        state['deleted_recordings'] += len(ids)
+        state['freed_bytes'] += freed
+        state['updated_at'] = datetime.utcnow().isoformat()
+        self._save_state(state)
+        db.session.commit()
+
+        for row in rows:
+            storage.record_duration(row.camera_id, -(row.duration or 0))
+        return True
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        config = SystemConfig.query.filter_by(key=STATE_KEY).first()
+        return config.get_value() if config else None
+
+    def _save_state(self, state: Dict[str, Any]):
+        """Stage the checkpoint in the current transaction"""
+        config = SystemConfig.query.filter_by(key=STATE_KEY).first()
+        if not config:
+            config = SystemConfig(key=STATE_KEY, description='Progress of the retention cleanup job')
+            db.session.add(config)
+        config.set_value(dict(state))
+        config.updated_at = datetime.utcnow()
+
+
+# Global retention cleaner instance
+retention_cleaner = RetentionCleaner()
+
+def get_retention_cleaner() -> RetentionCleaner:
+    """Get the global retention cleaner instance"""
+    return retention_cleaner
@@ -0,0 +1,372 @@
+import os
+import json
+import glob
+import struct
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.models.user import Recording, RecordingSegment, RecorderIntent, db
+from src.services.storage_service import (
+    camera_id_from_segment_filename, start_time_from_segment_filename, get_storage_accountant
+)
+
+logger = logging.getLogger(__name__)
+
+# Each frame record: capture time (unix seconds, double) and JPEG length, then the JPEG bytes
+FRAME_HEADER = struct.Struct('<dI')
+
+
+class SegmentJournal:
+    """Write-ahead copy of the JPEG frames of the segment being recorded"""
+
+    def __init__(self, journal_dir: str, metadata: Dict[str, Any], fsync_seconds: float = 2.0):
+        stem = os.path.splitext(os.path.basename(metadata['file_path']))[0]
+        self.metadata_path = os.path.join(journal_dir, f'{stem}.json')
+        self.frames_path = os.path.join(journal_dir, f'{stem}.journal')
+        self.fsync_seconds = fsync_seconds
+        self._last_fsync = time.monotonic()
+
+        with open(self.metadata_path, 'w') as f:
+            json.dump(metadata, f)
+        self._file = open(self.frames_path, 'ab')
+
+    def append(self, timestamp: datetime, frame_bytes: bytes):
+        """Journal one frame, flushing it to the OS so a process crash cannot lose it"""
+        self._file.write(FRAME_HEADER.pack(timestamp.timestamp(), len(frame_bytes)))
+        self._file.write(frame_bytes)
+        self._file.flush()
+
+        # fsync is expensive, bound what a power loss can take instead
+        if time.monotonic() - self._last_fsync >= self.fsync_seconds:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    @staticmethod
+    def list_metadata(journal_dir: str) -> List[Dict[str, Any]]:
+        """Read the metadata of every journal in a directory, with its path under 'metadata_path'"""
+        journals = []
+        for metadata_path in glob.glob(os.path.join(journal_dir, '*.json')):
+            try:
+                with open(metadata_path) as f:
+                    journals.append(dict(json.load(f), metadata_path=metadata_path))
+            except (OSError, ValueError):
+                continue
+        return journals
+
+    def discard(self):
+        """Drop the journal once its segment is safely finalized"""
+        self._file.close()
+        for path in (self.frames_path, self.metadata_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_journal_frames(frames_path: str) -> Iterator[Tuple[float, bytes]]:
+    """Yield (timestamp, jpeg bytes) records, stopping at a torn final record"""
+    with open(frames_path, 'rb') as f:
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            timestamp, length = FRAME_HEADER.unpack(header)
+            frame_bytes = f.read(length)
+            if len(frame_bytes) < length:
+                return
+            yield timestamp, frame_bytes
+
+
+def rebuild_segment(metadata: Dict[str, Any], frames_path: str) -> Optional[Dict[str, Any]]:
+    """Re-encode a segment from its journal, replacing the unreadable partial file"""
+    import cv2
+    import numpy as np
+
+    file_path = metadata['file_path']
+    temp_path = file_path + '.recovering.mp4'
+    scale = (metadata.get('quality') or {}).get('scale', 1)  # The journal keeps frames as captured
+    writer = None
+    frame_count = 0
+    first_timestamp = last_timestamp = None
+
+    try:
+        for timestamp, frame_bytes in read_journal_frames(frames_path):
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            if scale != 1:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                         metadata.get('fps') or 10, (width, height))
+                if not writer.isOpened():
+                    raise Exception(f"Could not create video writer for {temp_path}")
+                first_timestamp = timestamp
+            elif frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height))
+
+            writer.write(frame)
+            frame_count += 1
+            last_timestamp = timestamp
+    finally:
+        if writer is not None:
+            writer.release()
+
+    if not frame_count:
+        return None
+
+    os.replace(temp_path, file_path)
+    return {
+        'file_path': file_path,
+        'start_time': datetime.utcfromtimestamp(first_timestamp),
+        'end_time': datetime.utcfromtimestamp(last_timestamp),
+        'frame_count': frame_count,
+        'file_size': os.path.getsize(file_path)
+    }
+
+
+class SegmentRecovery:
+    """Startup pass that repairs segments cut off by a crash and reconciles the database"""
+
+    def __init__(self):
+        self.workers = int(os.getenv('SEGMENT_RECOVERY_WORKERS', min(4, os.cpu_count() or 1)))
+        self.stale_seconds = float(os.getenv('RECORDER_STALE_SECONDS', 10))
+        self.process_started_at = datetime.utcnow()  # Recordings started later belong to this process
+        self.owner: Optional[str] = None  # Recorder owner token of this process
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, app, base_recording_path: str, owner: Optional[str] = None):
+        """Run recovery once in the background"""
+        self.owner = owner
+        if self._thread and self._thread.is_alive():
+            return
+
+        def worker():
+            try:
+                with app.app_context():
+                    result = self.recover(base_recording_path)
+                if result['deferred_journals']:
+                    # A process that just crashed still looks live until its heartbeat goes stale
+                    time.sleep(self.stale_seconds + 1)
+                    with app.app_context():
+                        self.recover(base_recording_path)
+            except Exception as e:
+                logger.error(f"Error recovering recording segments: {e}")
+
+        self._thread = threading.Thread(target=worker, name='segment-recovery', daemon=True)
+        self._thread.start()
+
+    def recover(self, base_recording_path: str) -> Dict[str, Any]:
+        """Recover journaled segments, index orphaned files and close interrupted recordings"""
+        journal_dir = os.path.join(base_recording_path, 'temp')
+        videos_dir = os.path.join(base_recording_path, 'videos')
+
+        journals = []
+        live_paths = set()
+        deferred = 0
+        live_owners = self._live_owners()
+        for metadata in SegmentJournal.list_metadata(journal_dir):
+            metadata_path = metadata.pop('metadata_path')
+
+            # Still being written by this or another live process (e.g. another worker). PIDs cannot tell:
+            # a restarted container reuses them, so liveness is the owner's recorder heartbeat
+            owner = metadata.get('owner')
+            if owner and owner in live_owners:
+                live_paths.add(metadata.get('file_path'))
+                if owner != self.owner:
+                    deferred += 1
+                continue
+            journals.append((metadata_path, metadata))
+
+        # Re-encoding is CPU bound in OpenCV, which releases the GIL
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='segment-recovery') as executor:
+            rebuilt = list(executor.map(self._rebuild, journals))
+
+        recovered = 0
+        for (metadata_path, metadata), (ok, segment) in zip(journals, rebuilt):
+            if not ok:
+                continue  # Keep the journal to retry on the next start
+            if segment:
+                recovered += self._index_segment(metadata, segment)
+            else:
+                self._remove_file(metadata['file_path'])  # Nothing was journaled, the partial file is empty
+            self._remove_journal(metadata_path)
+
+        indexed = self._index_orphaned_files(videos_dir, live_paths)
+        closed = self._close_interrupted_recordings()
+
+        self.last_result = {
+            'recovered_segments': recovered,
+            'indexed_orphans': indexed,
+            'closed_recordings': closed,
+            'deferred_journals': deferred,
+            'ran_at': datetime.utcnow().isoformat()
+        }
+        if recovered or indexed or closed:
+            get_storage_accountant().reconcile(base_recording_path)
+            logger.info(f"Segment recovery: rebuilt {recovered} segments from journals, "
+                        f"indexed {indexed} orphaned files, closed {closed} interrupted recordings")
+        return self.last_result
+
+    def _live_owners(self) -> set:
+        """Owner tokens of processes whose recorder heartbeat is fresh"""
+        fresh_after = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        owners = {owner for (owner,) in db.session.query(RecorderIntent.owner).filter(
+            RecorderIntent.heartbeat_at >= fresh_after
+        )}
+        if self.owner:
+            owners.add(self.owner)
+        return owners
+
+    def _rebuild(self, journal: Tuple[str, Dict[str, Any]]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        metadata_path, metadata = journal
+        frames_path = os.path.splitext(metadata_path)[0] + '.journal'
+        try:
+            if not os.path.exists(frames_path):
+                return True, None
+            return True, rebuild_segment(metadata, frames_path)
+        except Exception as e:
+            logger.error(f"Error rebuilding segment {metadata.get('file_path')}: {e}")
+            return False, None
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove_journal(self, metadata_path: str):
+        self._remove_file(os.path.splitext(metadata_path)[0] + '.journal')
+        self._remove_file(metadata_path)
+
+    def _index_segment(self, metadata: Dict[str, Any], segment: Dict[str, Any]) -> bool:
+        """Add or update the segment row for a rebuilt file"""
+        try:
+            row = RecordingSegment.query.filter_by(file_path=segment['file_path']).first()
+            if row is None:
+                row = RecordingSegment(
+                    recording_id=metadata['recording_id'],
+                    camera_id=metadata['camera_id'],
+                    segment_number=metadata['segment_number'],
+                    filename=os.path.basename(segment['file_path']),
+                    file_path=segment['file_path'],
+                    segment_metadata=metadata.get('quality')
+                )
+                db.session.add(row)
+
+            duration_seconds = (segment['end_time'] - segment['start_time']).total_seconds()
+            row.start_time = segment['start_time']
+            row.end_time = segment['end_time']
+            row.file_size = segment['file_size']
+            row.frame_count = segment['frame_count']
+            row.fps = segment['frame_count'] / duration_seconds if duration_seconds > 0 else None
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error indexing recovered segment {segment['file_path']}: {e}")
+            return False
+
+    def _index_orphaned_files(self, videos_dir: str, live_paths: set) -> int:
+        """Index segment files that never got a database row"""
+        if not os.path.isdir(videos_dir):
+            return 0
+
+        known = {path for (path,) in db.session.query(RecordingSegment.file_path)}
+        accountant = get_storage_accountant()
+        indexed = 0
+        for entry in sorted(os.scandir(videos_dir), key=lambda e: e.name):
+            camera_id = camera_id_from_segment_filename(entry.name)
+            if (camera_id is None or entry.path in known or entry.path in live_paths
+                    or accountant.is_open(entry.path) or not entry.is_file()):
+                continue
+            if entry.name.endswith('.recovering.mp4'):
+                self._remove_file(entry.path)  # Left over from a rebuild that was itself interrupted
+                continue
+
+            stat = entry.stat()
+            end_time = datetime.utcfromtimestamp(stat.st_mtime)
+            start_time = start_time_from_segment_filename(entry.name) or end_time
+            recording = self._find_recording(camera_id, start_time)
+            try:
+                db.session.add(RecordingSegment(
+                    recording_id=recording.id,
+                    camera_id=camera_id,
+                    segment_number=db.session.query(db.func.count(RecordingSegment.id)).filter(
+                        RecordingSegment.recording_id == recording.id
+                    ).scalar() + 1,
+                    filename=entry.name,
+                    file_path=entry.path,
+                    start_time=start_time,
+                    end_time=end_time,
+                    file_size=stat.st_size
+                ))
+                if not recording.file_path:
+                    recording.filename = entry.name
+                    recording.file_path = entry.path
+                db.session.commit()
+                indexed += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error indexing orphaned segment {entry.path}: {e}")
+        return indexed
+
+    def _find_recording(self, camera_id: str, start_time: datetime) -> Recording:
+        """Get the recording a segment belongs to, creating a placeholder if none matches"""
+        recording = Recording.query.filter(
+            Recording.camera_id == camera_id,
+            Recording.start_time <= start_time
+        ).order_by(Recording.start_time.desc()).first()
+
+        if recording is None or (recording.ended_at and recording.ended_at < start_time):
+            recording = Recording(
+                camera_id=camera_id,
+                start_time=start_time,
+                recording_type='recovered',
+                recording_metadata={'recovered': True}
+            )
+            db.session.add(recording)
+            db.session.flush()
+        return recording
+
+    def _close_interrupted_recordings(self) -> int:
+        """Fill in end time, duration and size of recordings whose process died"""
+        closed = 0
+        interrupted = Recording.query.filter(
+            Recording.ended_at.is_(None),
+            Recording.start_time < self.process_started_at,
+            ~Recording.id.in_(db.session.query(RecorderIntent.recording_id))  # Resumed, not ended
+        ).all()
+        for recording in interrupted:
+            totals = db.session.query(
+                db.func.max(RecordingSegment.end_time),
+                db.func.coalesce(db.func.sum(RecordingSegment.file_size), 0)
+            ).filter(RecordingSegment.recording_id == recording.id).one()
+
+            ended_at = totals[0] or recording.start_time
+            recording.ended_at = ended_at
+            recording.end_time = ended_at
+            recording.duration = int((ended_at - recording.start_time).total_seconds())
+            recording.file_size = totals[1]
+            metadata = dict(recording.get_metadata())
+            metadata['interrupted'] = True
+            recording.set_metadata(metadata)
+            closed += 1
+
+        db.session.commit()
+        return closed
+
+
+# Global segment recovery instance
+segment_recovery = SegmentRecovery()
+
+def get_segment_recovery() -> SegmentRecovery:
+    """Get the global segment recovery instance"""
+    return segment_recovery
@@ -0,0 +1,159 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from src.models.user import UserSession, db
+from src.models.camera import StreamSession
+from src.services.sync_service import prune_tombstones
+
+logger = logging.getLogger(__name__)
+
+
+class SessionJanitor:
+    """Background maintenance of the user and stream session tables"""
+
+    def __init__(self):
+        self.interval_seconds = float(os.getenv('SESSION_JANITOR_INTERVAL_SECONDS', 300))
+        self.batch_size = int(os.getenv('SESSION_JANITOR_BATCH_SIZE', 500))
+        self.stream_idle_seconds = int(os.getenv('STREAM_SESSION_IDLE_SECONDS', 3600))
+        self.stream_retention_days = int(os.getenv('STREAM_SESSION_RETENTION_DAYS', 30))
+
+        self.app = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, app):
+        """Start the janitor thread for the given Flask app"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self.app = app
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='session-janitor', daemon=True)
+        self._thread.start()
+        logger.info(f"Started session janitor, interval={self.interval_seconds}s")
+
+    def stop(self):
+        """Stop the janitor thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _worker(self):
+        """Run maintenance passes until stopped"""
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Error in session janitor: {e}")
+
+    def run_once(self) -> Dict[str, Any]:
+        """Run one maintenance pass (requires an app context)"""
+        now = datetime.utcnow()
+
+        expired_user_sessions = self._delete_in_batches(
+            UserSession,
+            UserSession.expires_at < now
+        )
+
+        idle_cutoff = now - timedelta(seconds=self.stream_idle_seconds)
+        stale_streams = self._end_stale_streams(idle_cutoff, now)
+
+        retention_cutoff = now - timedelta(days=self.stream_retention_days)
+        purged_streams = self._delete_in_batches(
+            StreamSession,
+            StreamSession.is_active == False,
+            StreamSession.ended_at < retention_cutoff
+        )
+
+        # Deltas older than the pruned tombstones fall back to full listings
+        pruned_tombstones = prune_tombstones(now)
+
+        if expired_user_sessions or stale_streams or purged_streams or pruned_tombstones:
+            logger.info(f"Session janitor: deleted {expired_user_sessions} expired user sessions, "
+                        f"ended {stale_streams} stale streams, purged {purged_streams} old streams, "
+                        f"pruned {pruned_tombstones} tombstones")
+
+        return {
+            'expired_user_sessions': expired_user_sessions,
+            'stale_streams_ended': stale_streams,
+            'old_streams_purged': purged_streams,
+            'tombstones_pruned': pruned_tombstones
+        }
+
+    def _delete_in_batches(self, model, *criteria) -> int:
+        """Delete matching rows in short transactions so writers are never blocked for long"""
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.session.query(model.id).filter(*criteria).limit(self.batch_size)]
+            if not ids:
+                break
+
+            model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+
+            if len(ids) < self.batch_size:
+                break
+        return deleted
+
+    def _end_stale_streams(self, idle_cutoff: datetime, now: datetime) -> int:
+        """End active stream sessions with no activity since the cutoff"""
+        last_activity = db.func.coalesce(StreamSession.last_activity_at, StreamSession.started_at)
+        ended = 0
+        while True:
+            ids = [
+                row.id for row in db.session.query(StreamSession.id).filter(
+                    StreamSession.is_active == True,
+                    last_activity < idle_cutoff
+                ).limit(self.batch_size)
+            ]
+            if not ids:
+                break
+
+            StreamSession.query.filter(StreamSession.id.in_(ids)).update(
+                {'is_active': False, 'ended_at': now},
+                synchronize_session=False
+            )
+            db.session.commit()
+            ended += len(ids)
+
+            if len(ids) < self.batch_size:
+                break
+        return ended
+
+
+# Global session janitor instance
+session_janitor = SessionJanitor()
+
+def get_session_janitor() -> SessionJanitor:
+    """Get the global session janitor instance"""
+    return session_janitor
+
+
+def touch_stream_session(session_id: str):
+    """Record activity on a long-running stream so the janitor keeps it open"""
+    try:
+        StreamSession.query.filter_by(session_id=session_id, is_active=True).update(
+            {'last_activity_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating stream session {session_id}: {e}")
+
+def close_stream_session(session_id: str):
+    """End a stream session when its client goes away"""
+    try:
+        stream_session = StreamSession.query.filter_by(session_id=session_id, is_active=True).first()
+        if stream_session:
+            stream_session.end_session()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error ending stream session {session_id}: {e}")
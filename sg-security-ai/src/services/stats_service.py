@@ -0,0 +1,167 @@
+import os
+import logging
+from typing import Dict, Iterable
+
+from sqlalchemy import case, event, func
+from sqlalchemy.orm import Session
+
+from src.models.user import User, Recording, db
+from src.models.camera import Camera, StreamSession
+from src.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Which cached stats depend on which tables
+STATS_DEPENDENCIES = {
+    'camera': ('cameras', 'health'),
+    'stream_session': ('cameras', 'health'),
+    'user': ('users', 'health'),
+    'recording': ('recordings',)
+}
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+class StatsService:
+    """Aggregate statistics computed in single queries and cached briefly"""
+
+    def __init__(self):
+        self.cache_ttl_seconds = float(os.getenv('STATS_CACHE_TTL_SECONDS', 10))
+        self._cache = TTLCache(self.cache_ttl_seconds)
+
+    def get_camera_stats(self) -> Dict[str, int]:
+        """Get camera counts and active streams"""
+        return self._cache.get_or_set('cameras', self._query_camera_stats)
+
+    def get_user_stats(self, include_super_admins: bool = True) -> Dict[str, int]:
+        """Get user counts by role and status"""
+        counts = self._cache.get_or_set('users', self._query_user_counts)
+
+        def total(roles: Iterable[str], is_active=None) -> int:
+            return sum(
+                count for (role, active), count in counts.items()
+                if role in roles and (is_active is None or bool(active) == is_active)
+            )
+
+        roles = ('super_admin', 'admin', 'user') if include_super_admins else ('admin', 'user')
+        stats = {
+            'total_users': total(roles),
+            'admins': total(('admin',)),
+            'users': total(('user',)),
+            'active_users': total(roles, True),
+            'inactive_users': total(roles, False)
+        }
+        if include_super_admins:
+            stats['super_admins'] = total(('super_admin',))
+        return stats
+
+    def get_health_stats(self) -> Dict[str, int]:
+        """Get basic counts for the health check"""
+        return self._cache.get_or_set('health', self._query_health_stats)
+
+    def get_recording_totals(self) -> Dict[str, int]:
+        """Get recording counts by type"""
+        return self._cache.get_or_set('recordings', self._query_recording_totals)
+
+    def invalidate(self, *keys: str):
+        """Drop cached stats"""
+        for key in keys:
+            self._cache.invalidate(key)
+
+    def invalidate_tables(self, table_names: Iterable[str]):
+        """Drop cached stats that depend on the given tables"""
+        for table_name in table_names:
+            self.invalidate(*STATS_DEPENDENCIES.get(table_name, ()))
+
+    def _query_camera_stats(self) -> Dict[str, int]:
+        active_streams = db.session.query(func.count(StreamSession.id)).filter(
+            StreamSession.is_active == True
+        ).scalar_subquery()
+
+        row = db.session.query(
+            func.count(Camera.id),
+            _count_if(Camera.is_active == True),
+            _count_if(Camera.is_active == False),
+            _count_if(Camera.recording_enabled == True),
+            _count_if(Camera.ai_analysis_enabled == True),
+            active_streams
+        ).one()
+
+        return {
+            'total_cameras': row[0],
+            'active_cameras': row[1],
+            'inactive_cameras': row[2],
+            'recording_enabled': row[3],
+            'ai_enabled': row[4],
+            'active_streams': row[5]
+        }
+
+    def _query_user_counts(self) -> Dict[tuple, int]:
+        rows = db.session.query(User.role, User.is_active, func.count(User.id)).group_by(
+            User.role, User.is_active
+        ).all()
+        return {(role, bool(is_active)): count for role, is_active, count in rows}
+
+    def _query_health_stats(self) -> Dict[str, int]:
+        row = db.session.query(
+            db.session.query(func.count(User.id)).scalar_subquery(),
+            db.session.query(func.count(Camera.id)).scalar_subquery(),
+            db.session.query(func.count(StreamSession.id)).filter(StreamSession.is_active == True).scalar_subquery()
+        ).one()
+
+        return {
+            'users': row[0],
+            'cameras': row[1],
+            'active_streams': row[2]
+        }
+
+    def _query_recording_totals(self) -> Dict[str, int]:
+        row = db.session.query(
+            func.count(Recording.id),
+            _count_if(Recording.recording_type == 'manual'),
+            _count_if(Recording.recording_type == 'continuous')
+        ).one()
+
+        return {
+            'total_recordings': row[0],
+            'manual_recordings': row[1],
+            'continuous_recordings': row[2]
+        }
+
+
+# Global stats service instance
+stats_service = StatsService()
+
+def get_stats_service() -> StatsService:
+    """Get the global stats service instance"""
+    return stats_service
+
+
+# Invalidate cached stats whenever a transaction touching their tables commits
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault('stats_changed_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            changed.add(table.name)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changed_tables(orm_execute_state):
+    # Query.update()/delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            orm_execute_state.session.info.setdefault('stats_changed_tables', set()).add(table.name)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_tables(session):
+    changed = session.info.pop('stats_changed_tables', None)
+    if changed:
+        stats_service.invalidate_tables(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('stats_changed_tables', None)
@@ -0,0 +1,544 @@
+import os
+import bisect
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from src.models.user import Recording, RecordingSegment, AIEvent, db
+from src.models.camera import Camera
+from src.services.config_service import CONFIG_OPTIONS, get_config_service
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MARKER = '_segment_'
+
+
+def camera_id_from_segment_filename(filename: str) -> Optional[str]:
+    """Get camera ID from a segment filename like camera-1_segment_001_20250101_120000.mp4"""
+    if SEGMENT_MARKER not in filename:
+        return None
+    return filename.rsplit(SEGMENT_MARKER, 1)[0]
+
+
+def start_time_from_segment_filename(filename: str) -> Optional[datetime]:
+    """Get the start time encoded at the end of a segment filename"""
+    try:
+        stem = os.path.splitext(filename)[0]
+        return datetime.strptime('_'.join(stem.rsplit('_', 2)[-2:]), '%Y%m%d_%H%M%S')
+    except ValueError:
+        return None
+
+
+def thumbnail_path_for(segment_path: str) -> str:
+    """Get the thumbnail sprite path of a segment (recordings/videos/x.mp4 -> recordings/thumbnails/x.jpg)"""
+    base_path = os.path.dirname(os.path.dirname(segment_path))
+    stem = os.path.splitext(os.path.basename(segment_path))[0]
+    return os.path.join(base_path, 'thumbnails', f'{stem}.jpg')
+
+
+def remove_thumbnails(segment_path: str):
+    """Delete a segment's thumbnail sprite if there is one"""
+    try:
+        os.remove(thumbnail_path_for(segment_path))
+    except OSError:
+        pass
+
+
+class SegmentInfo:
+    """A finalized segment file in the ordered storage index"""
+
+    __slots__ = ('path', 'camera_id', 'size_bytes', 'start_time', 'end_time', 'has_events')
+
+    def __init__(self, path: str, camera_id: str, size_bytes: int, start_time: datetime, end_time: datetime):
+        self.path = path
+        self.camera_id = camera_id
+        self.size_bytes = size_bytes
+        self.start_time = start_time
+        self.end_time = end_time
+        self.has_events: Optional[bool] = None  # Looked up lazily when eviction considers it
+
+    @classmethod
+    def from_path(cls, path: str, camera_id: str, size_bytes: Optional[int] = None) -> 'SegmentInfo':
+        stat = os.stat(path)
+        end_time = datetime.utcfromtimestamp(stat.st_mtime)
+        start_time = start_time_from_segment_filename(os.path.basename(path)) or end_time
+        return cls(path, camera_id, stat.st_size if size_bytes is None else size_bytes, start_time, end_time)
+
+    def sort_key(self):
+        return (self.start_time, self.path)
+
+
+class StorageAccountant:
+    """Running per-camera storage counters, reconciled periodically with the filesystem"""
+
+    def __init__(self):
+        self.reconcile_interval_seconds = float(os.getenv('STORAGE_RECONCILE_INTERVAL_SECONDS', 3600))
+        # Free space changes with every writer on the volume, so it is read from the disk and only briefly cached
+        self.disk_cache_seconds = float(os.getenv('STORAGE_DISK_CACHE_SECONDS', 5))
+
+        self.app = None
+        self.base_recording_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._camera_bytes: Dict[str, int] = {}
+        self._camera_files: Dict[str, int] = {}
+        self._camera_duration: Dict[str, int] = {}
+        self._segments: Dict[str, List[SegmentInfo]] = {}  # camera_id -> segments, oldest first
+        self._open_paths: Set[str] = set()  # Segments still being written
+        self._disk_usage: Dict[str, tuple] = {}  # path -> (read at, total bytes, free bytes)
+        self.last_reconciled_at: Optional[datetime] = None
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, app, base_recording_path: str):
+        """Reconcile now and then periodically in a background thread"""
+        self.app = app
+        self.base_recording_path = base_recording_path
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='storage-accountant', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the reconciliation thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _worker(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling storage counters: {e}")
+
+            if self._stop_event.wait(self.reconcile_interval_seconds):
+                break
+
+    def reconcile(self, base_recording_path: Optional[str] = None):
+        """Rebuild counters from the videos directory and the recording table"""
+        base_path = base_recording_path or self.base_recording_path
+        videos_path = os.path.join(base_path, 'videos')
+
+        with self._lock:
+            open_paths = set(self._open_paths)
+
+        camera_bytes: Dict[str, int] = {}
+        camera_files: Dict[str, int] = {}
+        segments: Dict[str, List[SegmentInfo]] = {}
+        if os.path.isdir(videos_path):
+            with os.scandir(videos_path) as entries:
+                for entry in entries:
+                    camera_id = camera_id_from_segment_filename(entry.name)
+                    if camera_id is None or entry.path in open_paths or not entry.is_file():
+                        continue
+                    segment = SegmentInfo.from_path(entry.path, camera_id)
+                    segments.setdefault(camera_id, []).append(segment)
+                    camera_bytes[camera_id] = camera_bytes.get(camera_id, 0) + segment.size_bytes
+                    camera_files[camera_id] = camera_files.get(camera_id, 0) + 1
+
+        for camera_segments in segments.values():
+            camera_segments.sort(key=SegmentInfo.sort_key)
+
+        camera_duration = {
+            camera_id: int(duration or 0)
+            for camera_id, duration in db.session.query(
+                Recording.camera_id, db.func.sum(Recording.duration)
+            ).group_by(Recording.camera_id)
+        }
+
+        with self._lock:
+            drift = sum(camera_bytes.values()) - sum(self._camera_bytes.values())
+            self._camera_bytes = camera_bytes
+            self._camera_files = camera_files
+            self._camera_duration = camera_duration
+            self._segments = segments
+            self.last_reconciled_at = datetime.utcnow()
+
+        logger.info(f"Reconciled storage counters: {sum(camera_bytes.values())} bytes in "
+                    f"{sum(camera_files.values())} segments (drift {drift} bytes)")
+
+    def open_segment(self, filepath: str):
+        """Mark a segment as being written so it is neither indexed nor evicted"""
+        with self._lock:
+            self._open_paths.add(filepath)
+
+    def close_segment(self, filepath: str):
+        """Forget a segment that was abandoned before anything was written to it"""
+        with self._lock:
+            self._open_paths.discard(filepath)
+
+    def is_open(self, filepath: str) -> bool:
+        """Check if a segment is still being written by this process"""
+        with self._lock:
+            return filepath in self._open_paths
+
+    def record_segment(self, camera_id: str, size_bytes: int, filepath: Optional[str] = None):
+        """Account for a finalized segment file"""
+        segment = None
+        if filepath:
+            try:
+                segment = SegmentInfo.from_path(filepath, camera_id, size_bytes)
+            except OSError:
+                pass
+
+        with self._lock:
+            self._camera_bytes[camera_id] = self._camera_bytes.get(camera_id, 0) + size_bytes
+            self._camera_files[camera_id] = self._camera_files.get(camera_id, 0) + 1
+            self._adjust_disk_free(-size_bytes)
+            if filepath:
+                self._open_paths.discard(filepath)
+            if segment:
+                camera_segments = self._segments.setdefault(camera_id, [])
+                if not camera_segments or segment.sort_key() >= camera_segments[-1].sort_key():
+                    camera_segments.append(segment)  # Usual case, newest segment
+                else:
+                    bisect.insort(camera_segments, segment, key=SegmentInfo.sort_key)
+
+    def release_segment(self, camera_id: str, size_bytes: int, filepath: Optional[str] = None):
+        """Account for a deleted segment file"""
+        with self._lock:
+            self._camera_bytes[camera_id] = max(0, self._camera_bytes.get(camera_id, 0) - size_bytes)
+            self._camera_files[camera_id] = max(0, self._camera_files.get(camera_id, 0) - 1)
+            self._adjust_disk_free(size_bytes)
+            if filepath:
+                camera_segments = self._segments.get(camera_id, [])
+                for index, segment in enumerate(camera_segments):
+                    if segment.path == filepath:
+                        del camera_segments[index]
+                        break
+
+    def get_segments(self, camera_id: str, limit: Optional[int] = None) -> List[SegmentInfo]:
+        """Get a snapshot of a camera's indexed segments, oldest first"""
+        with self._lock:
+            return list(self._segments.get(camera_id, [])[:limit])
+
+    def get_camera_ids(self) -> List[str]:
+        """Get cameras with indexed segments"""
+        with self._lock:
+            return [camera_id for camera_id, segments in self._segments.items() if segments]
+
+    def record_duration(self, camera_id: str, seconds: int):
+        """Account for recorded (positive) or deleted (negative) duration"""
+        with self._lock:
+            self._camera_duration[camera_id] = max(0, self._camera_duration.get(camera_id, 0) + seconds)
+
+    def get_camera_usage(self, camera_id: str) -> Dict[str, int]:
+        """Get storage used by one camera"""
+        with self._lock:
+            return {
+                'bytes': self._camera_bytes.get(camera_id, 0),
+                'segments': self._camera_files.get(camera_id, 0),
+                'duration_seconds': self._camera_duration.get(camera_id, 0)
+            }
+
+    def get_total_bytes(self) -> int:
+        """Get storage used by all cameras"""
+        with self._lock:
+            return sum(self._camera_bytes.values())
+
+    def get_total_duration(self) -> int:
+        """Get recorded duration of all cameras"""
+        with self._lock:
+            return sum(self._camera_duration.values())
+
+    def _adjust_disk_free(self, delta: int):
+        """Apply a segment this process wrote or deleted to the cached readings, until they are read again"""
+        for path, (read_at, total_bytes, free_bytes) in self._disk_usage.items():
+            self._disk_usage[path] = (read_at, total_bytes, max(0, free_bytes + delta))
+
+    def _read_disk(self, path: str) -> tuple:
+        """Get (total, free) bytes of the volume, calling statvfs at most every disk_cache_seconds"""
+        with self._lock:
+            cached = self._disk_usage.get(path)
+            if cached and time.monotonic() - cached[0] < self.disk_cache_seconds:
+                return cached[1], cached[2]
+
+        statvfs = os.statvfs(path)
+        total_bytes = statvfs.f_frsize * statvfs.f_blocks
+        free_bytes = statvfs.f_frsize * statvfs.f_bavail
+        with self._lock:
+            self._disk_usage[path] = (time.monotonic(), total_bytes, free_bytes)
+        return total_bytes, free_bytes
+
+    def get_free_bytes(self, base_recording_path: Optional[str] = None) -> int:
+        """Get free disk space, read from the disk at most every few seconds"""
+        return self._read_disk(base_recording_path or self.base_recording_path)[1]
+
+    def get_disk_usage(self, base_recording_path: Optional[str] = None) -> Dict[str, Any]:
+        """Get disk usage, read from the disk at most every few seconds"""
+        total_bytes, free_bytes = self._read_disk(base_recording_path or self.base_recording_path)
+        used_bytes = total_bytes - free_bytes
+        return {
+            'total_bytes': total_bytes,
+            'used_bytes': used_bytes,
+            'free_bytes': free_bytes,
+            'used_percentage': (used_bytes / total_bytes) * 100 if total_bytes > 0 else 0
+        }
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get all counters"""
+        disk_total_bytes, disk_free_bytes = (self._read_disk(self.base_recording_path)
+                                             if self.base_recording_path else (None, None))
+        with self._lock:
+            return {
+                'total_bytes': sum(self._camera_bytes.values()),
+                'total_segments': sum(self._camera_files.values()),
+                'total_duration_seconds': sum(self._camera_duration.values()),
+                'disk_total_bytes': disk_total_bytes,
+                'disk_free_bytes': disk_free_bytes,
+                'cameras': {
+                    camera_id: {
+                        'bytes': size,
+                        'segments': self._camera_files.get(camera_id, 0)
+                    }
+                    for camera_id, size in self._camera_bytes.items()
+                },
+                'last_reconciled_at': self.last_reconciled_at.isoformat() if self.last_reconciled_at else None
+            }
+
+
+# Global storage accountant instance
+storage_accountant = StorageAccountant()
+
+def get_storage_accountant() -> StorageAccountant:
+    """Get the global storage accountant instance"""
+    return storage_accountant
+
+# Global archive accountant instance, started by the tiering service when an archive path is configured
+archive_accountant = StorageAccountant()
+
+def get_archive_accountant() -> StorageAccountant:
+    """Get the global archive accountant instance"""
+    return archive_accountant
+
+def get_accountant_for(path: str) -> StorageAccountant:
+    """Get the accountant of the storage tier a segment file belongs to"""
+    archive_path = archive_accountant.base_recording_path
+    if archive_path:
+        archive_path = os.path.abspath(archive_path)
+        if os.path.commonpath([os.path.abspath(path), archive_path]) == archive_path:
+            return archive_accountant
+    return storage_accountant
+
+
+GB = 1024 ** 3
+
+
+class StorageManager:
+    """Enforces retention and storage quotas in the background by evicting the oldest segments"""
+
+    def __init__(self, accountant: StorageAccountant, archive_accountant: StorageAccountant):
+        self.accountant = accountant
+        self.archive_accountant = archive_accountant
+        self.interval_seconds = float(os.getenv('STORAGE_MANAGER_INTERVAL_SECONDS', 60))
+        self.low_watermark = float(os.getenv('STORAGE_QUOTA_LOW_WATERMARK', 0.9))
+        min_free_gb = os.getenv('STORAGE_MIN_FREE_GB')
+        self.min_free_gb = float(min_free_gb) if min_free_gb else None
+
+        self.app = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._enforce_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def start(self, app):
+        """Start enforcing the configured quota and retention settings"""
+        self.app = app
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='storage-manager', daemon=True)
+        self._thread.start()
+        logger.info(f"Started storage manager, interval={self.interval_seconds}s")
+
+    def stop(self):
+        """Stop the enforcement thread"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def request_enforcement(self):
+        """Run an enforcement pass as soon as possible (e.g. after a segment is written)"""
+        self._wake_event.set()
+
+    def _worker(self):
+        while True:
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+
+            try:
+                with self.app.app_context():
+                    self.enforce()
+            except Exception as e:
+                logger.error(f"Error enforcing storage quotas: {e}")
+
+    def get_min_free_bytes(self) -> int:
+        """Free space to keep on the recording disk (defaults to 10% of the recording quota)"""
+        if self.min_free_gb is not None:
+            return int(self.min_free_gb * GB)
+        return int(self._get_setting('max_recording_size_gb') * 0.1 * GB)
+
+    def _get_setting(self, key: str) -> Any:
+        """Read a setting from the config service, so enforcement does not depend on a started recorder"""
+        return get_config_service().get(key, CONFIG_OPTIONS[key][1])
+
+    def enforce(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Run one enforcement pass (requires an app context)"""
+        with self._enforce_lock:
+            now = now or datetime.utcnow()
+            result = {'retention': 0, 'camera_quota': 0, 'total_quota': 0, 'free_space': 0, 'freed_bytes': 0}
+            accountants = self._get_accountants()
+
+            # Retention applies to every segment of every tier, event or not
+            cutoff = now - timedelta(days=self._get_setting('retention_days'))
+            for accountant in accountants:
+                for camera_id in accountant.get_camera_ids():
+                    for segment in accountant.get_segments(camera_id):
+                        if segment.end_time >= cutoff:
+                            break
+                        result['freed_bytes'] += self._evict(segment)
+                        result['retention'] += 1
+
+            # Per-camera quotas count archived segments too, evicting down to the low watermark
+            for camera_id, quota_gb in self._get_camera_quotas().items():
+                limit = quota_gb * GB
+                if self._get_camera_bytes(camera_id) > limit:
+                    count, freed = self._evict_until(
+                        accountants, [camera_id],
+                        lambda: self._get_camera_bytes(camera_id) <= limit * self.low_watermark
+                    )
+                    result['camera_quota'] += count
+                    result['freed_bytes'] += freed
+
+            # Total recording quota
+            limit = self._get_setting('max_recording_size_gb') * GB
+            if self._get_total_bytes() > limit:
+                count, freed = self._evict_until(
+                    accountants, self._get_camera_ids(),
+                    lambda: self._get_total_bytes() <= limit * self.low_watermark
+                )
+                result['total_quota'] += count
+                result['freed_bytes'] += freed
+
+            # Free disk space on each tier's volume, which other data also consumes
+            min_free_bytes = self.get_min_free_bytes()
+            for accountant in accountants:
+                path = accountant.base_recording_path or self._get_setting('recording_path')
+                if accountant.get_free_bytes(path) < min_free_bytes:
+                    count, freed = self._evict_until(
+                        [accountant], accountant.get_camera_ids(),
+                        lambda: accountant.get_free_bytes(path) >= min_free_bytes
+                    )
+                    result['free_space'] += count
+                    result['freed_bytes'] += freed
+
+            evicted = result['retention'] + result['camera_quota'] + result['total_quota'] + result['free_space']
+            if evicted:
+                logger.info(f"Storage manager evicted {evicted} segments, freed {result['freed_bytes']} bytes "
+                            f"(retention={result['retention']}, camera_quota={result['camera_quota']}, "
+                            f"total_quota={result['total_quota']}, free_space={result['free_space']})")
+
+            result['ran_at'] = now.isoformat()
+            self.last_result = result
+            return result
+
+    def _get_accountants(self) -> List[StorageAccountant]:
+        """Accountants of the hot tier and, once tiering started it, the archive tier"""
+        if self.archive_accountant.base_recording_path:
+            return [self.accountant, self.archive_accountant]
+        return [self.accountant]
+
+    def _get_camera_bytes(self, camera_id: str) -> int:
+        return sum(accountant.get_camera_usage(camera_id)['bytes'] for accountant in self._get_accountants())
+
+    def _get_total_bytes(self) -> int:
+        return sum(accountant.get_total_bytes() for accountant in self._get_accountants())
+
+    def _get_camera_ids(self) -> List[str]:
+        return sorted({camera_id for accountant in self._get_accountants() for camera_id in accountant.get_camera_ids()})
+
+    def _get_camera_quotas(self) -> Dict[str, float]:
+        return dict(
+            db.session.query(Camera.id, Camera.storage_quota_gb).filter(Camera.storage_quota_gb.isnot(None)).all()
+        )
+
+    def _evict_until(self, accountants: List[StorageAccountant], camera_ids: List[str], done) -> tuple:
+        """Evict oldest segments of the given cameras until done() holds, sparing event segments if possible"""
+        count = 0
+        freed = 0
+        for spare_events in (True, False):
+            if done():
+                break
+            if not spare_events:
+                logger.warning(f"Storage quota still exceeded, evicting segments with AI events for {camera_ids}")
+
+            # Oldest first across cameras and tiers, each list being already ordered
+            oldest_first = heapq.merge(
+                *(accountant.get_segments(camera_id) for accountant in accountants for camera_id in camera_ids),
+                key=SegmentInfo.sort_key
+            )
+            for segment in oldest_first:
+                if done():
+                    break
+                if spare_events and self._has_events(segment):
+                    continue
+                freed += self._evict(segment)
+                count += 1
+        return count, freed
+
+    def _has_events(self, segment: SegmentInfo) -> bool:
+        """Check if any AI event falls within a segment's time range"""
+        if segment.has_events is None:
+            segment.has_events = db.session.query(AIEvent.id).join(
+                Recording, AIEvent.recording_id == Recording.id
+            ).filter(
+                Recording.camera_id == segment.camera_id,
+                AIEvent.timestamp >= segment.start_time,
+                AIEvent.timestamp <= segment.end_time
+            ).first() is not None
+        return segment.has_events
+
+    def _evict(self, segment: SegmentInfo) -> int:
+        """Delete a segment file, its database row, and drop it from the index"""
+        try:
+            os.remove(segment.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error evicting segment {segment.path}: {e}")
+            return 0
+
+        remove_thumbnails(segment.path)
+        try:
+            RecordingSegment.query.filter_by(file_path=segment.path).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error deleting segment row for {segment.path}: {e}")
+
+        get_accountant_for(segment.path).release_segment(segment.camera_id, segment.size_bytes, segment.path)
+        return segment.size_bytes
+
+
+# Global storage manager instance
+storage_manager = StorageManager(storage_accountant, archive_accountant)
+
+def get_storage_manager() -> StorageManager:
+    """Get the global storage manager instance"""
+    return storage_manager
@@ -0,0 +1,163 @@
+import os
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import Response, jsonify
+from sqlalchemy import event, insert, select, update
+
+from src.models.user import CollectionVersion, Tombstone, User, db
+from src.models.camera import Camera
+
+logger = logging.getLogger(__name__)
+
+# Listed collections and the model whose rows they contain
+COLLECTIONS = {'cameras': Camera, 'users': User}
+_COLLECTION_NAMES = {model: name for name, model in COLLECTIONS.items()}
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 7))
+
+# session.info key holding the versions this transaction bumped, so it bumps each collection once
+_VERSIONS_KEY = 'collection_versions'
+
+
+def bump_collection(session, name: str) -> int:
+    """Get the collection's version for the current transaction, bumping it on first use
+
+    The UPDATE locks the counter row until commit, so versions become visible in order and a client
+    that has seen version N has seen every change stamped N or lower.
+    """
+    versions = session.info.setdefault(_VERSIONS_KEY, {})
+    if name not in versions:
+        counter = CollectionVersion.__table__
+        result = session.execute(
+            update(counter).where(counter.c.name == name).values(version=counter.c.version + 1)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(counter).values(name=name, version=1, pruned_version=0))
+        versions[name] = session.execute(select(counter.c.version).where(counter.c.name == name)).scalar_one()
+    return versions[name]
+
+
+def touch_rows(session, name: str, ids: Iterable[Any]) -> Optional[int]:
+    """Stamp rows changed outside the ORM (bulk statements) with the collection's new version"""
+    ids = list(ids)
+    if not ids:
+        return None
+    model = COLLECTIONS[name]
+    version = bump_collection(session, name)
+    session.execute(
+        update(model).where(model.id.in_(ids)).values(row_version=version),
+        execution_options={'synchronize_session': False}
+    )
+    return version
+
+
+def record_deletions(session, name: str, ids: Iterable[Any]):
+    """Leave tombstones for rows deleted outside the ORM (bulk statements)"""
+    ids = [str(item_id) for item_id in ids]
+    if ids:
+        version = bump_collection(session, name)
+        session.execute(insert(Tombstone), [
+            {'collection': name, 'item_id': item_id, 'version': version, 'deleted_at': datetime.utcnow()}
+            for item_id in ids
+        ])
+
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_changed_rows(session, flush_context, instances):
+    """Stamp ORM changes to listed rows with their collection's version"""
+    for obj in list(session.new) + [obj for obj in session.dirty if session.is_modified(obj)]:
+        name = _COLLECTION_NAMES.get(type(obj))
+        if name:
+            obj.row_version = bump_collection(session, name)
+
+    for obj in list(session.deleted):
+        name = _COLLECTION_NAMES.get(type(obj))
+        if name:
+            record_deletions(session, name, [obj.id])
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget_versions(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_VERSIONS_KEY, None)
+
+
+def get_collection_state(name: str) -> Tuple[int, int]:
+    """Get a collection's current version and the oldest version deltas can start from"""
+    row = db.session.query(CollectionVersion.version, CollectionVersion.pruned_version).filter_by(name=name).first()
+    return (row.version, row.pruned_version) if row else (0, 0)
+
+
+def acl_fingerprint(camera_ids: Iterable[str]) -> str:
+    """Short hash of a camera set, so a token from before an assignment change forces a full listing"""
+    return format(zlib.crc32(','.join(sorted(camera_ids)).encode('utf-8')), 'x')
+
+
+def make_sync_token(version: int, scope: Optional[str] = None) -> str:
+    return f'{version}.{scope}' if scope else str(version)
+
+
+def parse_sync_token(token: Optional[str], scope: Optional[str], pruned_version: int) -> Optional[int]:
+    """Get the version a delta can start from, or None if the client needs the full listing"""
+    if not token:
+        return None
+    version, _, token_scope = token.partition('.')
+    if (token_scope or None) != scope or not version.isdigit():
+        return None
+    version = int(version)
+    return version if version >= pruned_version else None
+
+
+def get_deleted_ids(name: str, since: int) -> List[str]:
+    """IDs deleted from a collection after a version, except rows re-created since (listed as changed instead)"""
+    model = COLLECTIONS[name]
+    recreated = select(model.id).where(db.cast(model.id, db.String) == Tombstone.item_id).exists()
+    return list(dict.fromkeys(item_id for item_id, in db.session.query(Tombstone.item_id).filter(
+        Tombstone.collection == name, Tombstone.version > since, ~recreated
+    ).order_by(Tombstone.version)))
+
+
+def prune_tombstones(now: Optional[datetime] = None) -> int:
+    """Drop old tombstones, remembering which versions can no longer be synced from"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    deleted = 0
+    for name in COLLECTIONS:
+        newest = db.session.query(db.func.max(Tombstone.version)).filter(
+            Tombstone.collection == name, Tombstone.deleted_at < cutoff
+        ).scalar()
+        if newest is None:
+            continue
+        db.session.query(CollectionVersion).filter(
+            CollectionVersion.name == name, CollectionVersion.pruned_version < newest
+        ).update({'pruned_version': newest}, synchronize_session=False)
+        deleted += db.session.query(Tombstone).filter(
+            Tombstone.collection == name, Tombstone.version <= newest
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def listing_response(name: str, rows: List[Any], deleted: Optional[List[str]], token: str):
+    """Full listing (deleted is None) or delta since the client's token, tagged with the collection version"""
+    payload: Dict[str, Any] = {name: [row.to_dict() for row in rows], 'version': token}
+    if deleted is None:
+        payload.update({'total': len(rows), 'full': True})
+    else:
+        payload.update({'deleted': deleted, 'full': False})
+
+    response = jsonify(payload)
+    return _tag(response, f'{name}-{token}')
+
+
+def not_modified_response(etag: str):
+    """Empty 304 for a client that already has this version"""
+    return _tag(Response(status=304), etag)
+
+
+def _tag(response, etag: str):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'  # Always revalidate, the 304 is cheap
+    return response
@@ -0,0 +1,278 @@
+import os
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from src.models.user import RecordingSegment, db
+from src.services.storage_service import get_archive_accountant, get_storage_accountant, thumbnail_path_for
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_context():
+    """Start pool workers from a clean process instead of forking the threaded app"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# Worker functions run in the process pool, so they must stay importable without Flask
+def _lower_priority():
+    import cv2
+
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+    cv2.setNumThreads(1)
+
+
+def _transcode_segment(source_path: str, target_path: str, target_fps: float, scale: float) -> Dict[str, Any]:
+    """Re-encode a segment at a lower frame rate and resolution"""
+    import cv2
+
+    temp_path = target_path + '.tiering.mp4'
+    capture = cv2.VideoCapture(source_path)
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or target_fps
+    step = max(1, round(source_fps / target_fps))
+    output_fps = source_fps / step  # Keeps the original duration
+    writer = None
+    frame_index = 0
+    written = 0
+    width = height = 0
+
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frame_index += 1
+            if (frame_index - 1) % step:
+                continue
+
+            if scale != 1:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), output_fps, (width, height))
+                if not writer.isOpened():
+                    raise RuntimeError(f"Could not create video writer for {temp_path}")
+
+            writer.write(frame)
+            written += 1
+    finally:
+        capture.release()
+        if writer is not None:
+            writer.release()
+
+    if not written:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"No frames could be read from {source_path}")
+
+    os.replace(temp_path, target_path)
+    return {
+        'frame_count': written,
+        'file_size': os.path.getsize(target_path),
+        'fps': output_fps,
+        'resolution': f'{width}x{height}'
+    }
+
+
+class TieringService:
+    """Moves cold segments to a cheaper archive path at reduced frame rate and resolution"""
+
+    def __init__(self):
+        self.archive_path = os.getenv('ARCHIVE_RECORDING_PATH')
+        self.age_days = float(os.getenv('TIERING_AGE_DAYS', 7))
+        self.archive_fps = float(os.getenv('TIERING_FPS', 2))
+        self.archive_scale = float(os.getenv('TIERING_SCALE', 0.5))
+        self.workers = int(os.getenv('TIERING_WORKERS', 1))
+        self.batch_size = int(os.getenv('TIERING_BATCH_SIZE', 20))
+        self.interval_seconds = float(os.getenv('TIERING_INTERVAL_SECONDS', 3600))
+        # Claims older than this are left from a crashed worker and go back to the hot tier
+        self.claim_timeout_seconds = float(os.getenv('TIERING_CLAIM_TIMEOUT_SECONDS', 6 * 3600))
+
+        self.app = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.archive_path)
+
+    def start(self, app):
+        """Start archiving cold segments in the background (needs ARCHIVE_RECORDING_PATH)"""
+        if not self.enabled:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+
+        self.app = app
+        for directory in ('videos', 'thumbnails'):
+            os.makedirs(os.path.join(self.archive_path, directory), exist_ok=True)
+
+        # Archived segments count towards retention and quotas like hot ones
+        get_archive_accountant().start(app, self.archive_path)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name='storage-tiering', daemon=True)
+        self._thread.start()
+        logger.info(f"Started storage tiering to {self.archive_path}, age={self.age_days} days")
+
+    def stop(self):
+        """Stop the tiering thread and its worker processes"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        get_archive_accountant().stop()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max(1, self.workers), initializer=_lower_priority,
+                                                 mp_context=_pool_context())
+        return self._executor
+
+    def _worker(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                with self.app.app_context():
+                    while self.run_once()['archived'] and not self._stop_event.is_set():
+                        pass
+            except Exception as e:
+                logger.error(f"Error in storage tiering: {e}")
+
+    def run_once(self) -> Dict[str, Any]:
+        """Archive one batch of hot segments older than the tiering age (requires an app context)"""
+        now = datetime.utcnow()
+        self._release_stale_claims(now)
+
+        cutoff = now - timedelta(days=self.age_days)
+        candidates = RecordingSegment.query.filter(
+            RecordingSegment.storage_tier == 'hot',
+            RecordingSegment.end_time < cutoff
+        ).order_by(RecordingSegment.start_time).limit(self.batch_size).all()
+        segments = self._claim(candidates, now)
+
+        executor = self._get_executor()
+        futures = []
+        for segment in segments:
+            target_path = os.path.join(self.archive_path, 'videos', segment.filename)
+            futures.append((segment, target_path, executor.submit(
+                _transcode_segment, segment.file_path, target_path, self.archive_fps, self.archive_scale
+            )))
+
+        archived = 0
+        saved_bytes = 0
+        for segment, target_path, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error archiving segment {segment.file_path}: {e}")
+                # Do not retry it on every pass
+                RecordingSegment.query.filter_by(id=segment.id, storage_tier='archiving').update(
+                    {'storage_tier': 'failed', 'archive_claimed_at': None}, synchronize_session=False
+                )
+                db.session.commit()
+                continue
+
+            saved = self._move_to_archive(segment, target_path, result)
+            if saved is not None:
+                saved_bytes += saved
+                archived += 1
+
+        self.last_result = {
+            'archived': archived,
+            'saved_bytes': saved_bytes,
+            'ran_at': datetime.utcnow().isoformat()
+        }
+        if archived:
+            logger.info(f"Archived {archived} segments, saved {saved_bytes} bytes")
+        return self.last_result
+
+    def _claim(self, segments, now: datetime):
+        """Claim segments for this worker, so tiering threads of other workers skip them"""
+        claimed = []
+        for segment in segments:
+            updated = RecordingSegment.query.filter_by(id=segment.id, storage_tier='hot').update(
+                {'storage_tier': 'archiving', 'archive_claimed_at': now}, synchronize_session=False
+            )
+            if updated:
+                claimed.append(segment)
+        db.session.commit()
+        return claimed
+
+    def _release_stale_claims(self, now: datetime):
+        """Hand segments claimed by a worker that died while archiving back to the hot tier"""
+        released = RecordingSegment.query.filter(
+            RecordingSegment.storage_tier == 'archiving',
+            RecordingSegment.archive_claimed_at < now - timedelta(seconds=self.claim_timeout_seconds)
+        ).update({'storage_tier': 'hot', 'archive_claimed_at': None}, synchronize_session=False)
+        db.session.commit()
+        if released:
+            logger.warning(f"Released {released} stale archiving claims")
+
+    def _move_to_archive(self, segment: RecordingSegment, target_path: str,
+                         result: Dict[str, Any]) -> Optional[int]:
+        """Point the segment at its archived copy, then delete the original (None if it was evicted meanwhile)"""
+        source_path = segment.file_path
+        source_size = segment.file_size
+
+        # The storage manager may have evicted the segment while it was transcoded
+        current = RecordingSegment.query.filter_by(
+            id=segment.id, storage_tier='archiving', file_path=source_path
+        ).with_for_update().populate_existing().first()
+        if current is None or not os.path.exists(source_path):
+            db.session.rollback()
+            logger.info(f"Segment {source_path} was deleted while archiving, discarding the archived copy")
+            try:
+                os.remove(target_path)
+            except OSError:
+                pass
+            return None
+
+        source_thumbnails = thumbnail_path_for(source_path)
+        if os.path.exists(source_thumbnails):
+            shutil.move(source_thumbnails, thumbnail_path_for(target_path))
+
+        segment.file_path = target_path
+        segment.file_size = result['file_size']
+        segment.frame_count = result['frame_count']
+        segment.fps = result['fps']
+        # Exports compare these to decide whether segments can be joined without re-encoding
+        segment.segment_metadata = {**(segment.segment_metadata or {}), 'fps': result['fps'],
+                                    'resolution': result['resolution'], 'archived': True}
+        segment.storage_tier = 'archive'
+        segment.archive_claimed_at = None
+        if segment.recording and segment.recording.file_path == source_path:
+            segment.recording.file_path = target_path
+        db.session.commit()
+        get_archive_accountant().record_segment(segment.camera_id, result['file_size'], target_path)
+
+        try:
+            os.remove(source_path)
+        except FileNotFoundError:
+            return 0  # Evicted just after the check, the storage manager released it
+        except OSError as e:
+            logger.error(f"Error removing archived segment {source_path}: {e}")
+            return 0
+
+        get_storage_accountant().release_segment(segment.camera_id, source_size, source_path)
+        return source_size - result['file_size']
+
+
+# Global tiering service instance
+tiering_service = TieringService()
+
+def get_tiering_service() -> TieringService:
+    """Get the global tiering service instance"""
+    return tiering_service
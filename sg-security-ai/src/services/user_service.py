@@ -0,0 +1,224 @@
+import os
+import csv
+import io
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, insert, or_, tuple_, update
+
+from src.models.user import User, UserCamera, db
+from src.models.camera import Camera
+from src.services.password_service import get_password_service
+from src.services.sync_service import bump_collection
+
+logger = logging.getLogger(__name__)
+
+# Every imported password is a bcrypt hash (~0.25s at 12 rounds), a batch must finish well within the
+# worker timeout (gunicorn's default is 30s) even when only one hashing process is free
+BULK_MAX_ITEMS = int(os.getenv('USER_BULK_MAX_ITEMS', 50))
+# Assignments are plain rows, so they are limited separately
+BULK_MAX_ASSIGNMENTS = int(os.getenv('USER_BULK_MAX_ASSIGNMENTS', 50000))
+
+ROLES = ('super_admin', 'admin', 'user')
+
+
+def parse_users_csv(content: str) -> List[Dict[str, Any]]:
+    """Parse a CSV with a header row (username,email,password,role[,assigned_cameras][,is_active])
+
+    assigned_cameras lists camera IDs separated by ';'.
+    """
+    users = []
+    try:
+        rows = list(csv.DictReader(io.StringIO(content)))
+    except csv.Error as e:
+        raise ValueError(str(e))
+    for row in rows:
+        user: Dict[str, Any] = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        if 'assigned_cameras' in user:
+            user['assigned_cameras'] = [camera_id.strip() for camera_id in user['assigned_cameras'].split(';')
+                                        if camera_id.strip()]
+        if 'is_active' in user:
+            user['is_active'] = user['is_active'].lower() not in ('false', '0', 'no', '')
+        users.append(user)
+    return users
+
+
+def _validate_user(data: Any, actor_role: str) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise ValueError('User must be an object')
+    for field in ('username', 'email', 'password', 'role'):
+        if not data.get(field):
+            raise ValueError(f'{field} is required')
+        if not isinstance(data[field], str):
+            raise ValueError(f'{field} must be a string')
+    if len(data['username']) > 50 or len(data['email']) > 100:
+        raise ValueError('username or email is too long')
+    if data['role'] not in ROLES:
+        raise ValueError('Invalid role')
+    if data['role'] == 'super_admin' and actor_role != 'super_admin':
+        raise ValueError('Only super admin can create super admin users')
+    if len(data['password']) < 6:
+        raise ValueError('Password must be at least 6 characters')
+
+    cameras = data.get('assigned_cameras') or []
+    if not isinstance(cameras, list) or not all(isinstance(camera_id, str) for camera_id in cameras):
+        raise ValueError('assigned_cameras must be a list of camera IDs')
+    return {
+        'username': data['username'],
+        'email': data['email'],
+        'password': data['password'],
+        'role': data['role'],
+        'is_active': bool(data.get('is_active', True)),
+        'assigned_cameras': sorted(set(cameras))
+    }
+
+
+def bulk_import_users(items: List[Any], actor_role: str, atomic: bool = True) -> Dict[str, Any]:
+    """Create many users in one transaction, hashing their passwords in parallel
+
+    With atomic, one invalid item rejects the whole batch before any password is hashed.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('users must be a non-empty list')
+    if len(items) > BULK_MAX_ITEMS:
+        raise ValueError(f'At most {BULK_MAX_ITEMS} users per request')
+
+    results: List[Dict[str, Any]] = []
+    valid: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        result = {'index': index, 'username': item.get('username') if isinstance(item, dict) else None}
+        results.append(result)
+        try:
+            user = _validate_user(item, actor_role)
+            user['result'] = result
+            valid.append(user)
+        except ValueError as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+
+    # Check names, emails and cameras for the whole batch with one query each
+    usernames = [user['username'] for user in valid]
+    emails = [user['email'] for user in valid]
+    taken = set()
+    if valid:
+        for username, email in db.session.query(User.username, User.email).filter(
+            or_(User.username.in_(usernames), User.email.in_(emails))
+        ):
+            taken.update((('username', username), ('email', email)))
+    camera_ids = {camera_id for user in valid for camera_id in user['assigned_cameras']}
+    known_cameras = {camera_id for camera_id, in db.session.query(Camera.id).filter(
+        Camera.id.in_(camera_ids)
+    )} if camera_ids else set()
+
+    accepted = []
+    for user in valid:
+        result = user['result']
+        unknown = [camera_id for camera_id in user['assigned_cameras'] if camera_id not in known_cameras]
+        if ('username', user['username']) in taken or ('email', user['email']) in taken:
+            result['status'] = 'failed'
+            result['error'] = 'Username or email already exists'
+        elif unknown:
+            result['status'] = 'failed'
+            result['error'] = f'Unknown camera {unknown[0]}'
+        else:
+            # Later rows with the same username or email fail like existing users
+            taken.update((('username', user['username']), ('email', user['email'])))
+            accepted.append(user)
+
+    failed = len(results) - len(accepted)
+    if failed and atomic:
+        for user in accepted:
+            user['result']['status'] = 'rejected'
+        return {'results': results, 'created': 0, 'failed': failed, 'applied': False}
+
+    hashes = get_password_service().hash_passwords([user['password'] for user in accepted])
+
+    users = []
+    for user, password_hash in zip(accepted, hashes):
+        model = User(username=user['username'], email=user['email'], role=user['role'],
+                     is_active=user['is_active'], password_hash=password_hash)
+        model.camera_assignments = [UserCamera(camera_id=camera_id) for camera_id in user['assigned_cameras']]
+        users.append(model)
+
+    try:
+        # The flush sends the inserts as batches, fetching the new IDs in the same statements
+        db.session.add_all(users)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for user, model in zip(accepted, users):
+        user['result'].update({'status': 'created', 'id': model.id})
+
+    logger.info(f"Bulk user import: {len(users)} created, {failed} failed")
+    return {'results': results, 'created': len(users), 'failed': failed, 'applied': True}
+
+
+def bulk_set_camera_assignments(user_ids: List[Any], camera_ids: List[Any], actor_role: str,
+                                assign: bool) -> Dict[str, Any]:
+    """Assign or unassign a set of cameras for a group of users in one transaction
+
+    Returns the users whose assignments changed, so their cached permissions can be dropped.
+    """
+    if (not isinstance(user_ids, list) or not user_ids
+            or not all(isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids)):
+        raise ValueError('user_ids must be a non-empty list of user IDs')
+    if (not isinstance(camera_ids, list) or not camera_ids
+            or not all(isinstance(camera_id, str) for camera_id in camera_ids)):
+        raise ValueError('camera_ids must be a non-empty list of camera IDs')
+    if len(user_ids) * len(camera_ids) > BULK_MAX_ASSIGNMENTS:
+        raise ValueError('Too many assignments in one request')
+
+    user_ids, camera_ids = sorted(set(user_ids)), sorted(set(camera_ids))
+    roles = dict(db.session.query(User.id, User.role).filter(User.id.in_(user_ids)))
+    missing = [user_id for user_id in user_ids if user_id not in roles]
+    if missing:
+        raise ValueError(f'User {missing[0]} not found')
+    if actor_role != 'super_admin' and 'super_admin' in roles.values():
+        raise PermissionError('Admins cannot modify super admin users')
+    if assign:
+        known = {camera_id for camera_id, in db.session.query(Camera.id).filter(Camera.id.in_(camera_ids))}
+        unknown = [camera_id for camera_id in camera_ids if camera_id not in known]
+        if unknown:
+            raise ValueError(f'Camera {unknown[0]} not found')
+
+    try:
+        existing = set(db.session.query(UserCamera.user_id, UserCamera.camera_id).filter(
+            UserCamera.user_id.in_(user_ids), UserCamera.camera_id.in_(camera_ids)
+        ))
+        if assign:
+            pairs = [(user_id, camera_id) for user_id in user_ids for camera_id in camera_ids
+                     if (user_id, camera_id) not in existing]
+            if pairs:
+                db.session.execute(insert(UserCamera), [
+                    {'user_id': user_id, 'camera_id': camera_id} for user_id, camera_id in pairs
+                ])
+        else:
+            pairs = sorted(existing)
+            if pairs:
+                db.session.execute(
+                    delete(UserCamera).where(tuple_(UserCamera.user_id, UserCamera.camera_id).in_(pairs)),
+                    execution_options={'synchronize_session': False}
+                )
+
+        # Tokens with an embedded camera ACL must be re-validated against the database
+        changed_users = sorted({user_id for user_id, _ in pairs})
+        if changed_users:
+            db.session.execute(
+                update(User).where(User.id.in_(changed_users)).values(
+                    acl_version=User.acl_version + 1, row_version=bump_collection(db.session, 'users')
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'assigned' if assign else 'unassigned': len(pairs),
+        'users': len(user_ids),
+        'cameras': len(camera_ids),
+        'changed_user_ids': changed_users
+    }
@@ -1,18 +1,21 @@
 import asyncio
 import os
 import logging
-from typing import Dict, List, Optional, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
 from datetime import datetime
 import json
 import base64
 from io import BytesIO
 
-from viam.robot.client import RobotClient
-from viam.components.camera import Camera
-from viam.services.mlmodel import MLModelClient
-from viam.services.vision import VisionClient
-from viam.rpc.dial import DialOptions
-from viam.media.video import CameraMimeType
+from src.services.config_service import get_config_service
+from src.services.event_bus import get_event_bus
+
+# The VIAM SDK is slow to import, it is loaded on first connect instead of with the app
+if TYPE_CHECKING:
+    from viam.robot.client import RobotClient
+    from viam.components.camera import Camera
+    from viam.services.mlmodel import MLModelClient
+    from viam.services.vision import VisionClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,10 +25,10 @@ class ViamService:
     """Service for managing VIAM robot connections and camera operations"""
     
     def __init__(self):
-        self.robot_client: Optional[RobotClient] = None
-        self.cameras: Dict[str, Camera] = {}
-        self.vision_clients: Dict[str, VisionClient] = {}
-        self.ml_model_clients: Dict[str, MLModelClient] = {}
+        self.robot_client: Optional['RobotClient'] = None
+        self.cameras: Dict[str, 'Camera'] = {}
+        self.vision_clients: Dict[str, 'VisionClient'] = {}
+        self.ml_model_clients: Dict[str, 'MLModelClient'] = {}
         self.is_connected = False
         
         # Configuration from environment or defaults
@@ -36,6 +39,8 @@ class ViamService:
     async def connect(self) -> bool:
         """Connect to VIAM robot"""
         try:
+            from viam.robot.client import RobotClient
+            
             opts = RobotClient.Options.with_api_key(
                 api_key=self.api_key,
                 api_key_id=self.api_key_id
@@ -76,6 +81,10 @@ class ViamService:
         if not self.robot_client:
             return
         
+        from viam.components.camera import Camera
+        from viam.services.mlmodel import MLModelClient
+        from viam.services.vision import VisionClient
+        
         try:
             # Get all resource names
             resources = self.robot_client.resource_names
@@ -114,9 +123,12 @@ class ViamService:
         """Get image from camera"""
         if not self.is_connected or camera_id not in self.cameras:
             logger.error(f"Camera {camera_id} not available")
+            get_event_bus().report_camera_frame(camera_id, False)
             return None
         
         try:
+            from viam.media.video import CameraMimeType
+            
             camera = self.cameras[camera_id]
             
             # Convert mime type string to enum
@@ -128,10 +140,12 @@ class ViamService:
                 mime_enum = CameraMimeType.JPEG
             
             image = await camera.get_image(mime_enum)
+            get_event_bus().report_camera_frame(camera_id, True)
             return image
             
         except Exception as e:
             logger.error(f"Error getting image from camera {camera_id}: {e}")
+            get_event_bus().report_camera_frame(camera_id, False)
             return None
     
     async def get_camera_image_base64(self, camera_id: str) -> Optional[str]:
@@ -160,8 +174,12 @@ class ViamService:
             if camera_id in self.cameras:
                 detections = await vision_client.get_detections_from_camera(camera_id, "detector_1")
                 
+                # Read per call so threshold changes apply to the next frame
+                threshold = get_config_service().get('ai_confidence_threshold', 0)
                 results = []
                 for detection in detections:
+                    if detection.confidence < threshold:
+                        continue
                     results.append({
                         'class_name': detection.class_name,
                         'confidence': detection.confidence,
@@ -262,6 +280,16 @@ class ViamService:
         """Get list of available camera IDs"""
         return list(self.cameras.keys())
     
+    def list_camera_resources(self) -> List[Dict[str, Any]]:
+        """List the camera components configured on the connected robot"""
+        if not self.robot_client:
+            return []
+        return [
+            {'name': resource.name, 'namespace': resource.namespace}
+            for resource in self.robot_client.resource_names
+            if resource.type == 'component' and resource.subtype == 'camera'
+        ]
+    
     def get_connection_status(self) -> Dict[str, Any]:
         """Get overall connection status"""
         return {